@@ -0,0 +1,112 @@
+"""Benchmark: sequential admin notification loop vs. NotificationDispatcher.
+
+    python -m scripts.bench_admin_fanout [--admins 5 20 60] [--latency-ms 80]
+
+Starts a local fake Bot API server (tornado, already a dependency for
+webhook mode) that answers sendMessage after a fixed latency and returns
+429 "retry after" once a bot exceeds 30 sends/second, then points a real
+`telegram.Bot` at it and times one recharge-request fan-out both ways.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import tornado.web
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from src.notifications import NotificationDispatcher
+
+
+TOKEN = "123456:bench"
+GLOBAL_LIMIT_PER_SECOND = 30
+
+
+class FakeBotAPI(tornado.web.RequestHandler):
+    def initialize(self, state):
+        self.state = state
+
+    async def post(self, token, method):
+        await asyncio.sleep(self.state["latency"])
+        now = time.monotonic()
+        window = self.state["window"]
+        window[:] = [t for t in window if now - t < 1.0]
+        if len(window) >= GLOBAL_LIMIT_PER_SECOND:
+            self.state["throttled"] += 1
+            self.set_status(429)
+            self.write({
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            })
+            return
+        window.append(now)
+
+        chat_id = self.get_body_argument("chat_id", "0")
+        self.state["calls"] += 1
+        self.write({
+            "ok": True,
+            "result": {
+                "message_id": self.state["calls"],
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"},
+                "text": self.get_body_argument("text", ""),
+            },
+        })
+
+
+async def sequential(bot: Bot, chat_ids: list):
+    for chat_id in chat_ids:
+        try:
+            await bot.send_message(chat_id=chat_id, text="New recharge request")
+        except Exception:
+            pass
+
+
+async def concurrent(bot: Bot, chat_ids: list):
+    dispatcher = NotificationDispatcher()
+    results = await dispatcher.send_all(chat_ids, lambda chat_id: bot.send_message(chat_id=chat_id, text="New recharge request"))
+    return sum(1 for r in results if not r.ok)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--admins", type=int, nargs="+", default=[5, 20, 60])
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    args = parser.parse_args()
+
+    logging.getLogger("tornado.access").setLevel(logging.ERROR)
+    state = {"latency": args.latency_ms / 1000, "window": [], "calls": 0, "throttled": 0}
+    app = tornado.web.Application([(r"/bot([^/]+)/(\w+)", FakeBotAPI, {"state": state})])
+    server = app.listen(0, address="127.0.0.1")
+    port = next(iter(server._sockets.values())).getsockname()[1]
+
+    request = HTTPXRequest(connection_pool_size=64)
+    bot = Bot(TOKEN, base_url=f"http://127.0.0.1:{port}/bot", request=request)
+    try:
+        print(f"fake Bot API latency: {args.latency_ms:.0f} ms, limit {GLOBAL_LIMIT_PER_SECOND}/s")
+        for n in args.admins:
+            chat_ids = list(range(1000, 1000 + n))
+            await asyncio.sleep(1.1)  # let the server's rate window drain
+            start = time.perf_counter()
+            await sequential(bot, chat_ids)
+            seq = time.perf_counter() - start
+
+            await asyncio.sleep(1.1)
+            state["throttled"] = 0
+            start = time.perf_counter()
+            failed = await concurrent(bot, chat_ids)
+            conc = time.perf_counter() - start
+            print(
+                f"{n:4d} admins: sequential {seq * 1000:7.0f} ms | dispatcher {conc * 1000:7.0f} ms "
+                f"({seq / conc:4.1f}x, {failed} failed, {state['throttled']} throttled)"
+            )
+    finally:
+        await request.shutdown()
+        server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
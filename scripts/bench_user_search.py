@@ -0,0 +1,105 @@
+"""Micro-benchmark: UserSearchIndex vs. the old per-keystroke linear scan.
+
+    python -m scripts.bench_user_search [--users 50000] [--repeat 5]
+
+Replays admins typing a mix of exact-username, name, surname and no-match
+searches one keystroke at a time, and reports the one-off index build
+time plus the mean per-keystroke latency of both approaches — the first
+time a query is typed, and when it (or an overlapping one) is typed
+again by another admin. Also times what a recharge costs the next
+search: patching the balance into the cached list (the index carries
+over) against rebuilding the index from a fresh list.
+"""
+import argparse
+import asyncio
+import random
+import string
+import time
+
+from src.services import UserDirectoryCache, UserSearchIndex
+
+
+FIRST_NAMES = ["Ana", "Bruno", "Camila", "Diego", "Elena", "Felipe", "Gabriela", "Héctor", "Inés", "José", "Lucía", "Martín"]
+SURNAMES = ["Pérez", "Gómez", "Rodríguez", "Muñoz", "Rojas", "Díaz", "Soto", "Contreras", "Silva", "Martínez"]
+
+
+def make_users(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    users = []
+    for i in range(n):
+        name = rng.choice(FIRST_NAMES)
+        surname = rng.choice(SURNAMES)
+        suffix = "".join(rng.choices(string.ascii_lowercase, k=4))
+        users.append({"username": f"{name.lower()}_{suffix}{i}", "name": name, "surname": surname, "balance": 0.0})
+    return users
+
+
+def linear_scan(users: list, query: str) -> list:
+    """The pre-index BotHandlers._filter_users, kept verbatim for comparison."""
+    q = query.strip().lower()
+    if not q:
+        return users
+    return [
+        u for u in users
+        if q in f"{u.get('username', '')} {u.get('name', '')} {u.get('surname', '')}".lower()
+    ]
+
+
+def keystrokes(query: str) -> list:
+    """What the handler sees while an admin types `query` (>= 2 chars)."""
+    return [query[:i] for i in range(2, len(query) + 1)]
+
+
+def per_query(fn, queries: list) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    users = make_users(args.users)
+    targets = [users[args.users // 2]["username"], "camila", "rojas", "martinez", "zzqx", "ana_"]
+    typed = [q for target in targets for q in keystrokes(target)]
+    threshold = 10
+
+    start = time.perf_counter()
+    index = UserSearchIndex(users)
+    build = time.perf_counter() - start
+
+    scan = per_query(lambda q: linear_scan(users, q), typed * args.repeat)
+    cold = per_query(lambda q: index.search(q, rank_limit=threshold), typed)
+    warm = per_query(lambda q: index.search(q, rank_limit=threshold), typed * args.repeat)
+
+    cache = UserDirectoryCache()
+    asyncio.run(cache.get(1, lambda chat_id: asyncio.sleep(0, (200, users))))
+    cache.search_index(users)
+    first = typed[0]
+    start = time.perf_counter()
+    cache.apply_balance(users[0]["username"], 10.0)
+    after_patch = time.perf_counter() - start
+    _, patched = asyncio.run(cache.get(1, None))
+    start = time.perf_counter()
+    cache.search_index(patched).search(first, rank_limit=threshold)
+    after_patch += time.perf_counter() - start
+    start = time.perf_counter()
+    UserSearchIndex(patched).search(first, rank_limit=threshold)
+    after_rebuild = time.perf_counter() - start
+
+    print(f"users:                 {args.users}")
+    print(f"queries (keystrokes):  {len(typed)}")
+    print(f"index build:           {build * 1000:.1f} ms (once per fetched list)")
+    print(f"linear scan / query:   {scan * 1000:.3f} ms")
+    print(f"index, first typing:   {cold * 1000:.3f} ms")
+    print(f"index, repeat queries: {warm * 1000:.3f} ms")
+    print(f"speedup (first/repeat): {scan / cold:.1f}x / {scan / warm:.1f}x")
+    print(f"first search after a recharge: {after_patch * 1000:.1f} ms patched / {after_rebuild * 1000:.1f} ms rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,7 @@ echo "🐳 Starting new container..."
 docker run -d \
   --name $CONTAINER_NAME \
   --restart unless-stopped \
+  -v print-bot-data:/app/data \
   $IMAGE_NAME
 
 echo "✅ Bot deployed successfully!"
\ No newline at end of file
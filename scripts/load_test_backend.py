@@ -0,0 +1,124 @@
+"""Load test: backend call latency with httpx's default pool vs. the tuned,
+pre-warmed pool APIClient now builds from Config.
+
+    python -m scripts.load_test_backend [--concurrency 10] [--bursts 4] [--gap 5.5]
+
+Starts a local stub backend (a minimal keep-alive HTTP/1.1 server) that
+answers GET /api/telegram/users after `--latency-ms` and charges
+`--connect-ms` on every *new* connection, standing in for the TCP + TLS
+handshake a real deployment pays. Each scenario fires `--bursts` bursts
+of `--concurrency` concurrent GETs, `--gap` seconds apart (longer than
+httpx's default 5s keep-alive expiry, like admins working in bursts), and
+reports p50/p99 latency and how many connections were opened.
+
+Size API_MAX_KEEPALIVE to the real burst size rather than maxing it out:
+httpcore checks every idle pooled connection each time it hands one out,
+so at ~50 concurrent requests on a fully warm pool that bookkeeping costs
+more than the handshakes it saves (try --concurrency 50).
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from src.api_client import APIClient
+
+
+BODY = json.dumps([{"username": f"user{i}", "name": "Name", "surname": "Surname", "balance": 1.0} for i in range(200)]).encode()
+
+
+class StubBackend:
+    def __init__(self, latency: float, connect_cost: float):
+        self.latency = latency
+        self.connect_cost = connect_cost
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(self.connect_cost)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                await asyncio.sleep(self.latency)
+                body = b"" if head.startswith(b"HEAD") else BODY
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(BODY)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_scenario(name: str, client: APIClient, backend: StubBackend, args, warm: int = 0):
+    backend.connections = 0
+    if warm:
+        await client.warm_up(warm)
+    samples = []
+    chat_ids = iter(range(1_000_000))
+
+    async def one():
+        start = time.perf_counter()
+        # Distinct chat_ids so single-flight coalescing doesn't hide the load.
+        status, _ = await client.get_users(next(chat_ids))
+        samples.append(time.perf_counter() - start)
+        assert status == 200, status
+
+    for burst in range(args.bursts):
+        if burst:
+            await asyncio.sleep(args.gap)
+        await asyncio.gather(*(one() for _ in range(args.concurrency)))
+
+    await client.close()
+    print(
+        f"{name:>8}: p50 {statistics.median(samples) * 1000:6.1f} ms | "
+        f"p99 {percentile(samples, 99) * 1000:6.1f} ms | connections opened {backend.connections}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--bursts", type=int, default=4)
+    parser.add_argument("--gap", type=float, default=5.5)
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--connect-ms", type=float, default=30.0)
+    args = parser.parse_args()
+
+    backend = StubBackend(args.latency_ms / 1000, args.connect_ms / 1000)
+    server = await asyncio.start_server(backend.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/api"
+
+    try:
+        # httpx defaults, as APIClient was built before: 20 keep-alive
+        # connections expiring after 5s idle, nothing opened up front.
+        before = APIClient(base_url, "secret", max_keepalive_connections=20, keepalive_expiry=5.0)
+        await run_scenario("before", before, backend, args)
+
+        after = APIClient(
+            base_url, "secret", max_keepalive_connections=args.concurrency, keepalive_expiry=30.0,
+        )
+        await run_scenario("after", after, backend, args, warm=args.concurrency)
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,231 @@
 import asyncio
+import json as jsonlib
+import random
+import time
+import uuid
+from collections import OrderedDict
 import httpx
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
+from .deadline import OUT_OF_TIME, start_shared, time_remaining, wait_shared
 from .logger import get_logger
+from .metrics import BACKEND_LATENCY, BACKEND_RESPONSES, BACKEND_RETRIES, BACKEND_TIMEOUTS
 
 logger = get_logger(__name__)
 
 _RETRY_STATUS = (500, 502, 503, 504)
+_UNREACHABLE = {"detail": "Could not reach the server. Please try again later."}
+# Below this much of the update's deadline left, an attempt isn't started.
+MIN_ATTEMPT_BUDGET = 0.25
+# Failures where the request never reached the backend: always safe to retry.
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def _endpoint(path: str) -> str:
+    """Circuit key for a request path: the route without its trailing ID,
+    e.g. /telegram/user/alice -> /telegram/user."""
+    return "/".join(path.split("/")[:3])
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one backend endpoint.
+
+    closed: requests go through; `failure_threshold` failures in a row
+    (connection errors or 5xx) open it. open: requests fail fast until
+    `reset_timeout` seconds have passed, then it goes half-open. half-open:
+    exactly one probe request goes through — success closes the circuit,
+    failure opens it again for another `reset_timeout`.
+
+    allow() hands out a ticket (PASS, PROBE, or None: refused) that the
+    caller passes back with the outcome. Only the probe's outcome moves an
+    open circuit: a straggler sent before it opened may still count a
+    failure, but can't close it, restart its timer or free the probe slot.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    PASS = "pass"
+    PROBE = "probe"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> Optional[str]:
+        state = self.state
+        if state == self.CLOSED:
+            return self.PASS
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return self.PROBE
+        return None
+
+    def record_success(self, ticket: str):
+        if ticket == self.PROBE or self._state == self.CLOSED:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, ticket: str):
+        self._failures += 1
+        if ticket == self.PROBE or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def release(self, ticket: str):
+        """The request let through never finished (e.g. it was cancelled):
+        free the half-open probe slot, if it was the probe, without
+        judging the endpoint."""
+        if ticket == self.PROBE:
+            self._probe_in_flight = False
+
+
+class RetryBudget:
+    """Caps retries at `ratio` of requests across the whole client.
+
+    Every request deposits `ratio` of a retry; every retry withdraws one.
+    `min_per_second` keeps a trickle of retries available when traffic is
+    light, and the balance is capped at `max_balance` so a quiet spell
+    can't bank a retry storm for the next outage.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_per_second: float = 1.0,
+        max_balance: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._clock = clock
+        self._balance = max_balance
+        self._refilled_at = clock()
+
+    def _deposit(self, amount: float):
+        self._balance = min(self.max_balance, self._balance + amount)
+
+    def record_request(self):
+        now = self._clock()
+        self._deposit(self.ratio + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+
+    def try_spend(self) -> bool:
+        now = self._clock()
+        self._deposit((now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+        if self._balance < 1:
+            return False
+        self._balance -= 1
+        return True
+
+
+class RetryPolicy:
+    """Which failed attempts of one HTTP method get retried.
+
+    Failures before the request went out (connection refused, no pooled
+    connection) are always retried. Failures after it may have reached
+    the backend — timeouts, dropped connections, 5xx — are only retried
+    when `after_send` is set or the request carries an Idempotency-Key,
+    since repeating a mutation otherwise risks applying it twice.
+    `retries` overrides the client's default attempt count.
+    """
+
+    def __init__(self, after_send: bool, retries: Optional[int] = None):
+        self.after_send = after_send
+        self.retries = retries
+
+    def retries_after_send(self, headers: Optional[dict]) -> bool:
+        return self.after_send or bool(headers and IDEMPOTENCY_HEADER in headers)
+
+
+DEFAULT_RETRY_POLICIES = {
+    "GET": RetryPolicy(after_send=True),
+    "POST": RetryPolicy(after_send=False),
+    "PATCH": RetryPolicy(after_send=False),
+}
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class CachedResponse:
+    __slots__ = ("etag", "last_modified", "size", "body")
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], size: int, body):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.body = body
+
+
+class ResponseCache:
+    """Parsed GET bodies plus their validators, for conditional requests.
+
+    Keyed like coalescing — path and JSON body, so per chat — because the
+    backend still authorizes every request: a 304 is only ever served to
+    the chat whose own earlier 200 is cached. LRU-bounded by entry count
+    and by the summed size of the raw bodies (a rough proxy for the
+    parsed objects); a body bigger than a quarter of the cap isn't kept.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple, entry: CachedResponse):
+        self.discard(key)
+        if self.max_entries <= 0 or entry.size > self.max_bytes // 4:
+            return
+        self._entries[key] = entry
+        self.bytes += entry.size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+
+    def discard(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+
+def _idempotency(key: Optional[str]) -> Optional[dict]:
+    return {IDEMPOTENCY_HEADER: key} if key else None
 
 
 class APIClient:
@@ -14,18 +234,69 @@ class APIClient:
     Methods mirror the previous `api.py` functions and return (status_code, dict-like).
     """
 
-    def __init__(self, base_url: str, secret: str, timeout: int = 5, retries: int = 3, backoff: float = 0.3):
+    def __init__(
+        self,
+        base_url: str,
+        secret: str,
+        timeout: int = 5,
+        retries: int = 3,
+        backoff: float = 0.3,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_timeout: float = 30.0,
+        retry_budget_ratio: float = 0.2,
+        cache_max_entries: int = 128,
+        cache_max_bytes: int = 8 * 1024 * 1024,
+        retry_policies: Optional[dict] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
         self.retries = retries
         self.backoff = backoff
+        self.retry_policies = {**DEFAULT_RETRY_POLICIES, **(retry_policies or {})}
+        if http2 and not _h2_available():
+            logger.warning("API_HTTP2 is set but the 'h2' package isn't installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
         # Every backend /telegram/* route requires this shared secret — the
         # chat_id in each request body only identifies who's calling, it
         # doesn't prove the call actually came from this bot.
         self._client = httpx.AsyncClient(
             headers={"X-Telegram-Secret": secret},
             timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
         )
+        # Single-flight: identical GETs already on the wire share that
+        # call's result instead of sending their own. hits = callers that
+        # piggybacked, misses = calls that actually went out.
+        self._inflight: dict = {}
+        self.coalesce_hits = 0
+        self.coalesce_misses = 0
+        # Resilience: one breaker per endpoint so a broken route doesn't
+        # take the others down with it, and one retry budget for the whole
+        # client so retries can't multiply load during an outage.
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self._clock = clock
+        self._breakers: dict = {}
+        self.retry_budget = RetryBudget(ratio=retry_budget_ratio, clock=clock)
+        self.retries_sent = 0
+        self.retries_denied = 0
+        self.short_circuited = 0
+        self.past_deadline = 0
+        # Conditional GETs: bodies that came with an ETag/Last-Modified are
+        # kept, revalidated with If-None-Match/If-Modified-Since, and reused
+        # as-is (same parsed object) on a 304.
+        self.response_cache = ResponseCache(cache_max_entries, cache_max_bytes)
 
     def _safe_json(self, res: httpx.Response):
         try:
@@ -38,37 +309,223 @@ class APIClient:
                 logger.exception("Failed to read response text from %s", res.url)
                 return {"detail": "Invalid response from server"}
 
-    async def _request(self, method: str, path: str, json: Optional[dict] = None) -> Tuple[int, dict]:
+    def coalescing_stats(self) -> dict:
+        return {"hits": self.coalesce_hits, "misses": self.coalesce_misses, "in_flight": len(self._inflight)}
+
+    def cache_stats(self) -> dict:
+        cache = self.response_cache
+        return {"entries": len(cache), "bytes": cache.bytes, "not_modified": cache.hits, "evictions": cache.evictions}
+
+    def _breaker(self, path: str) -> CircuitBreaker:
+        key = _endpoint(path)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(
+                self.breaker_failure_threshold, self.breaker_reset_timeout, clock=self._clock
+            )
+        return breaker
+
+    def resilience_stats(self) -> dict:
+        return {
+            "circuits": {endpoint: breaker.state for endpoint, breaker in self._breakers.items()},
+            "retries": self.retries_sent,
+            "retries_denied": self.retries_denied,
+            "short_circuited": self.short_circuited,
+            "past_deadline": self.past_deadline,
+        }
+
+    def _may_retry(self, attempt: int, policy: Optional[RetryPolicy] = None) -> bool:
+        retries = policy.retries if policy is not None and policy.retries is not None else self.retries
+        if attempt >= retries:
+            return False
+        remaining = time_remaining()
+        if remaining is not None and remaining < MIN_ATTEMPT_BUDGET + self.backoff * (2 ** attempt):
+            # Not enough of the update's deadline left to back off and try again.
+            self.past_deadline += 1
+            return False
+        if not self.retry_budget.try_spend():
+            self.retries_denied += 1
+            return False
+        self.retries_sent += 1
+        return True
+
+    async def _backoff(self, attempt: int):
+        # Full jitter: concurrent callers that failed together don't all
+        # come back at the same instant.
+        await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    async def _request(self, method: str, path: str, json: Optional[dict] = None, headers: Optional[dict] = None) -> Tuple[int, dict]:
+        """Send a request, coalescing identical concurrent GETs.
+
+        The key includes the body, and so the caller's chat_id: the
+        backend authorizes per chat, so two admins never share a response.
+        Mutating calls always go out on their own. Coalesced callers get
+        the same parsed object back — treat it as read-only.
+
+        Within an update's deadline (see deadline.py), each attempt's
+        timeout is cut to the time left and no retry is started that
+        couldn't finish in it; once it's spent the call returns 504. A
+        shared GET runs free of any one caller's deadline instead: each
+        caller stops waiting (504) at its own, and the call goes on for
+        the rest.
+        """
+        if method != "GET":
+            return await self._send(method, path, json, headers=headers)
+
+        key = (method, path, jsonlib.dumps(json, sort_keys=True, default=str))
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesce_hits += 1
+        else:
+            self.coalesce_misses += 1
+            task = start_shared(self._send(method, path, json, cache_key=key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await wait_shared(task, lambda: self._out_of_time(method, path))
+
+    def _out_of_time(self, method: str, path: str) -> Tuple[int, dict]:
+        endpoint = _endpoint(path)
+        self.past_deadline += 1
+        BACKEND_RESPONSES.inc(method, endpoint, "deadline")
+        logger.warning(
+            "Update deadline reached waiting on a shared %s %s", method, path, extra={"method": method, "path": endpoint}
+        )
+        return 504, dict(OUT_OF_TIME)
+
+    def _conditional_headers(self, cached: Optional[CachedResponse]) -> Optional[dict]:
+        if cached is None:
+            return None
+        headers = {}
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def _cache_response(self, cache_key: Optional[tuple], res: httpx.Response, body):
+        if cache_key is None:
+            return
+        etag = res.headers.get("ETag")
+        last_modified = res.headers.get("Last-Modified")
+        if res.status_code == 200 and (etag or last_modified):
+            self.response_cache.put(cache_key, CachedResponse(etag, last_modified, len(res.content), body))
+        else:
+            self.response_cache.discard(cache_key)
+
+    async def _send(
+        self, method: str, path: str, json: Optional[dict] = None, cache_key: Optional[tuple] = None, headers: Optional[dict] = None
+    ) -> Tuple[int, dict]:
         url = f"{self.base_url}{path}"
+        endpoint = _endpoint(path)
+        breaker = self._breaker(path)
+        self.retry_budget.record_request()
+        cached = self.response_cache.get(cache_key) if cache_key is not None else None
+        # Built once: every retry carries the same headers (and so the same
+        # Idempotency-Key, if the caller set one).
+        headers = {**(headers or {}), **(self._conditional_headers(cached) or {})} or None
+        policy = self.retry_policies.get(method, DEFAULT_RETRY_POLICIES["POST"])
+        after_send = policy.retries_after_send(headers)
         attempt = 0
         while True:
+            if attempt:
+                BACKEND_RETRIES.inc(method, endpoint)
+            remaining = time_remaining()
+            if remaining is not None and remaining < MIN_ATTEMPT_BUDGET:
+                self.past_deadline += 1
+                BACKEND_RESPONSES.inc(method, endpoint, "deadline")
+                logger.warning(
+                    "Update deadline reached; not sending %s %s (attempt %d)", method, url, attempt + 1,
+                    extra={"method": method, "path": endpoint},
+                )
+                return 504, dict(OUT_OF_TIME)
+            # The attempt's timeout is cut down to what the deadline leaves.
+            truncated = remaining is not None and remaining < self.timeout
+            timeout = {"timeout": remaining} if truncated else {}
+            ticket = breaker.allow()
+            if ticket is None:
+                self.short_circuited += 1
+                BACKEND_RESPONSES.inc(method, endpoint, "short_circuit")
+                logger.warning(
+                    "Circuit for %s is %s; failing fast on %s %s", endpoint, breaker.state, method, url,
+                    extra={"method": method, "path": endpoint},
+                )
+                return 503, dict(_UNREACHABLE)
+            start = time.perf_counter()
             try:
-                res = await self._client.request(method, url, json=json)
-            except httpx.RequestError:
-                if attempt >= self.retries:
-                    logger.exception("%s %s failed after %d retries", method, url, attempt)
-                    return 503, {"detail": "Could not reach the server. Please try again later."}
-                await asyncio.sleep(self.backoff * (2 ** attempt))
+                res = await self._client.request(method, url, json=json, headers=headers, **timeout)
+            except httpx.RequestError as exc:
+                elapsed = time.perf_counter() - start
+                BACKEND_LATENCY.observe(elapsed, method, endpoint)
+                if isinstance(exc, httpx.TimeoutException):
+                    BACKEND_TIMEOUTS.inc(method, endpoint)
+                    BACKEND_RESPONSES.inc(method, endpoint, "timeout")
+                else:
+                    BACKEND_RESPONSES.inc(method, endpoint, "error")
+                if truncated and isinstance(exc, httpx.TimeoutException):
+                    # Our deadline ran out, not the endpoint's normal
+                    # timeout: no verdict on its health.
+                    breaker.release(ticket)
+                    self.past_deadline += 1
+                    logger.warning(
+                        "%s %s timed out at the update deadline", method, url,
+                        extra={"method": method, "path": endpoint, "latency_ms": round(elapsed * 1000, 1)},
+                    )
+                    return 504, dict(OUT_OF_TIME)
+                breaker.record_failure(ticket)
+                if not (after_send or isinstance(exc, _UNSENT_ERRORS)) or not self._may_retry(attempt, policy):
+                    logger.exception(
+                        "%s %s failed after %d retries", method, url, attempt,
+                        extra={"method": method, "path": endpoint, "latency_ms": round(elapsed * 1000, 1)},
+                    )
+                    return 503, dict(_UNREACHABLE)
+                await self._backoff(attempt)
                 attempt += 1
                 continue
+            except BaseException:
+                # Cancelled, or failed before a request was even built
+                # (e.g. httpx.InvalidURL): no verdict on the endpoint, but
+                # a half-open probe slot must not stay taken.
+                breaker.release(ticket)
+                raise
 
-            if res.status_code in _RETRY_STATUS and attempt < self.retries:
-                await asyncio.sleep(self.backoff * (2 ** attempt))
-                attempt += 1
-                continue
+            elapsed = time.perf_counter() - start
+            BACKEND_LATENCY.observe(elapsed, method, endpoint)
+            BACKEND_RESPONSES.inc(method, endpoint, str(res.status_code))
+            logger.debug(
+                "%s %s -> %s in %.1fms", method, path, res.status_code, elapsed * 1000,
+                extra={"method": method, "path": endpoint, "status": res.status_code, "latency_ms": round(elapsed * 1000, 1)},
+            )
+            if res.status_code in _RETRY_STATUS:
+                breaker.record_failure(ticket)
+                if after_send and self._may_retry(attempt, policy):
+                    await self._backoff(attempt)
+                    attempt += 1
+                    continue
+            else:
+                breaker.record_success(ticket)
+
+            if res.status_code == 304:
+                if cached is not None:
+                    self.response_cache.hits += 1
+                    return 200, cached.body
+                # Nothing to reuse (we sent no validators) — shouldn't
+                # happen, but treat it as the backend's answer.
+                return 304, {}
 
             if method == "PATCH":
                 return res.status_code, (self._safe_json(res) if res.content else {})
-            return res.status_code, self._safe_json(res)
+            body = self._safe_json(res)
+            self._cache_response(cache_key, res, body)
+            return res.status_code, body
 
     async def _get(self, path: str, json: Optional[dict] = None) -> Tuple[int, dict]:
         return await self._request("GET", path, json)
 
-    async def _post(self, path: str, json: Optional[dict] = None) -> Tuple[int, dict]:
-        return await self._request("POST", path, json)
+    async def _post(self, path: str, json: Optional[dict] = None, headers: Optional[dict] = None) -> Tuple[int, dict]:
+        return await self._request("POST", path, json, headers=headers)
 
-    async def _patch(self, path: str, json: Optional[dict] = None) -> Tuple[int, dict]:
-        return await self._request("PATCH", path, json)
+    async def _patch(self, path: str, json: Optional[dict] = None, headers: Optional[dict] = None) -> Tuple[int, dict]:
+        return await self._request("PATCH", path, json, headers=headers)
 
     # Public API methods
     async def get_users(self, chat_id: int):
@@ -80,13 +537,16 @@ class APIClient:
     async def get_user(self, chat_id: int, username: str):
         return await self._get(f"/telegram/user/{username}", json={"chat_id": str(chat_id)})
 
-    async def recharge_user(self, chat_id: int, username: str, amount: float):
+    # Mutations take the caller's per-operation idempotency key: with one,
+    # every retry of the call is recognizably the same operation; without,
+    # only attempts that never reached the backend are retried.
+    async def recharge_user(self, chat_id: int, username: str, amount: float, idempotency_key: str | None = None):
         payload = {"chat_id": str(chat_id), "username": username, "amount": amount}
-        return await self._patch("/telegram/recharge", json=payload)
+        return await self._patch("/telegram/recharge", json=payload, headers=_idempotency(idempotency_key))
 
-    async def adjust_balance(self, chat_id: int, username: str, amount: float):
+    async def adjust_balance(self, chat_id: int, username: str, amount: float, idempotency_key: str | None = None):
         payload = {"chat_id": str(chat_id), "username": username, "amount": amount}
-        return await self._patch("/telegram/balance-adjust", json=payload)
+        return await self._patch("/telegram/balance-adjust", json=payload, headers=_idempotency(idempotency_key))
 
     async def create_recharge_request(
         self,
@@ -97,7 +557,11 @@ class APIClient:
         telegram_username: str | None = None,
         telegram_first_name: str | None = None,
         telegram_last_name: str | None = None,
+        idempotency_key: str | None = None,
     ):
+        """POST a recharge request. The Idempotency-Key (generated unless
+        given) is sent on every retry, so a retry after a timeout can't
+        create a second request; pass the same key to resubmit safely."""
         payload = {
             "chat_id": str(chat_id),
             "username": username,
@@ -107,7 +571,7 @@ class APIClient:
             "telegram_first_name": telegram_first_name,
             "telegram_last_name": telegram_last_name,
         }
-        return await self._post("/telegram/recharge-requests", json=payload)
+        return await self._post("/telegram/recharge-requests", json=payload, headers=_idempotency(idempotency_key or uuid.uuid4().hex))
 
     async def resolve_recharge_request(self, chat_id: int, request_id: str, action: str):
         payload = {"chat_id": str(chat_id), "action": action}
@@ -120,13 +584,31 @@ class APIClient:
     async def get_inventory(self, chat_id: int):
         return await self._get("/telegram/inventory", json={"chat_id": str(chat_id)})
 
-    async def adjust_stock(self, chat_id: int, item_name: str, delta: float):
+    async def adjust_stock(self, chat_id: int, item_name: str, delta: float, idempotency_key: str | None = None):
         payload = {"chat_id": str(chat_id), "item_name": item_name, "delta": delta}
-        return await self._patch("/telegram/stock-adjust", json=payload)
+        return await self._patch("/telegram/stock-adjust", json=payload, headers=_idempotency(idempotency_key))
 
-    async def create_expense(self, chat_id: int, category: str, amount: float, description: str | None = None):
+    async def create_expense(
+        self, chat_id: int, category: str, amount: float, description: str | None = None, idempotency_key: str | None = None
+    ):
         payload = {"chat_id": str(chat_id), "category": category, "amount": amount, "description": description}
-        return await self._post("/telegram/expenses", json=payload)
+        return await self._post("/telegram/expenses", json=payload, headers=_idempotency(idempotency_key))
+
+    async def warm_up(self, connections: int = 1):
+        """Open `connections` pooled keep-alive connections to the backend
+        ahead of the first real request. Any HTTP response counts (the
+        base URL itself may well 404); failures are only logged, since
+        the bot works fine with a cold pool."""
+        if connections <= 0:
+            return
+
+        async def _open():
+            try:
+                await self._client.request("HEAD", self.base_url)
+            except httpx.HTTPError as exc:
+                logger.warning("Backend connection warm-up failed: %s", exc)
+
+        await asyncio.gather(*(_open() for _ in range(connections)))
 
     async def close(self):
         try:
@@ -1,20 +1,24 @@
-from typing import Optional, Callable
+from typing import TYPE_CHECKING, Optional, Callable
 import asyncio
 import logging
 
-from telegram import BotCommand
+from telegram import BotCommand, Update
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     ConversationHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters,
 )
 
 from .config import get_config
 from .logger import get_logger
+from .metrics import REGISTRY, InstrumentedHTTPXRequest, MetricsServer
+from .notifications import NotificationDispatcher
 from .services import create_services
+from .update_processor import FairUpdateProcessor
 from .bot_handlers import (
     BotHandlers,
     STOCK_CHOOSE_ITEM,
@@ -29,6 +33,14 @@ from .bot_handlers import (
     ADJUST_AWAIT_AMOUNT,
 )
 
+if TYPE_CHECKING:
+    from .low_stock import LowStockMonitor
+
+
+# Seconds of inactivity before a guided flow (/stock, /expense, /recharge,
+# /adjust) is dropped — also how long a persisted flow survives a restart.
+CONVERSATION_TIMEOUT = 300
+
 
 class BotApp:
     """Encapsulates the lifecycle of the Telegram bot application.
@@ -41,7 +53,12 @@ class BotApp:
 
     def __init__(self, token: Optional[str] = None, *, logger_name: str = "bot", post_init: Optional[Callable] = None):
         cfg = get_config()
+        self.cfg = cfg
         self.token = token or cfg.TELEGRAM_TOKEN
+        # Checked before building services (HTTP clients, SQLite stores),
+        # so a misconfigured container fails fast on every restart.
+        if not self.token:
+            raise ValueError("TELEGRAM_TOKEN is required")
         self.logger = get_logger(logger_name)
 
         logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -49,6 +66,28 @@ class BotApp:
         self._app: Optional[Application] = None
         self.services = create_services()
         self.post_init = post_init
+        self.metrics_server: Optional[MetricsServer] = None
+        self.low_stock_monitor: Optional["LowStockMonitor"] = None
+        self.update_processor = FairUpdateProcessor(
+            concurrency=getattr(cfg, "UPDATE_CONCURRENCY", 32),
+            chat_rate=getattr(cfg, "UPDATE_CHAT_RATE", 2.0),
+            chat_burst=getattr(cfg, "UPDATE_CHAT_BURST", 10),
+            max_chat_queue=getattr(cfg, "UPDATE_CHAT_QUEUE", 20),
+        )
+        # In-progress flows and their chat_data survive a restart when
+        # PERSISTENCE_PATH is set.
+        persistence_path = getattr(cfg, "PERSISTENCE_PATH", None)
+        self.persistence = None
+        if persistence_path:
+            # Imported here so the persistence layer (not sqlite3, which the
+            # notification store needs anyway) is skipped when it's off.
+            from .persistence import SQLitePersistence
+
+            self.persistence = SQLitePersistence(
+                persistence_path,
+                update_interval=getattr(cfg, "PERSISTENCE_UPDATE_INTERVAL", 5.0),
+                max_age=CONVERSATION_TIMEOUT,
+            )
         # seconds to wait for pending tasks during shutdown
         self.shutdown_timeout = getattr(cfg, "SHUTDOWN_TIMEOUT", 10)
 
@@ -64,18 +103,98 @@ class BotApp:
         except Exception:
             self.logger.exception("Failed to set bot commands")
 
+    async def _warm_backend_pool(self):
+        client = self.services.get("client")
+        if client is None or not hasattr(client, "warm_up"):
+            return
+        await client.warm_up(getattr(self.cfg, "API_POOL_WARM", 0))
+
+    async def _start_metrics(self):
+        port = getattr(self.cfg, "METRICS_PORT", None)
+        if port is None or self.metrics_server is not None:
+            return
+        client = self.services.get("client")
+        if client is not None and hasattr(client, "resilience_stats"):
+            circuit_values = {"closed": 0, "half_open": 1, "open": 2}
+            REGISTRY.gauge(
+                "printbot_backend_circuit_state",
+                "Backend circuit breaker state per endpoint: 0 closed, 1 half-open, 2 open.",
+                ["endpoint"],
+                lambda: {(endpoint,): circuit_values[state] for endpoint, state in client.resilience_stats()["circuits"].items()},
+            )
+        processor = self.update_processor
+        REGISTRY.gauge(
+            "printbot_update_queue_depth",
+            "Incoming updates waiting for their chat's turn or a free handler slot.",
+            [],
+            lambda: {(): processor.stats()["queued"]},
+        )
+        REGISTRY.gauge(
+            "printbot_updates_in_progress", "Updates whose handlers are running.", [], lambda: {(): processor.running}
+        )
+        server = MetricsServer(REGISTRY, host=self.cfg.METRICS_LISTEN, port=port)
+        try:
+            await server.start()
+        except OSError:
+            self.logger.exception("Failed to start the metrics endpoint on %s:%s", self.cfg.METRICS_LISTEN, port)
+            return
+        self.metrics_server = server
+
+    def _start_low_stock_alerts(self, app: Application):
+        chat_ids = getattr(self.cfg, "LOW_STOCK_ALERT_CHAT_IDS", ())
+        store = self.services.get("notification_store")
+        if not chat_ids or store is None:
+            return
+        if app.job_queue is None:
+            self.logger.warning('Low-stock alerts need the JobQueue: pip install "python-telegram-bot[job-queue]"')
+            return
+        # Imported here: most deployments don't configure alert chats.
+        from .low_stock import LowStockMonitor
+
+        self.low_stock_monitor = LowStockMonitor(
+            self.services["user"],
+            store,
+            self.services.get("notifier") or NotificationDispatcher(),
+            chat_ids,
+            interval=self.cfg.LOW_STOCK_CHECK_INTERVAL,
+        )
+        self.low_stock_monitor.start(app.job_queue)
+
+    async def _post_init(self, app: Application):
+        await self._start_metrics()
+        self._start_low_stock_alerts(app)
+        if self.post_init is not None:
+            await self.post_init(app)
+            return
+        await asyncio.gather(self._setup_commands(app), self._warm_backend_pool())
+
+    async def _post_shutdown(self, app: Application):
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+            self.metrics_server = None
+        store = self.services.get("notification_store")
+        if store is not None:
+            store.close()
+
     def build(self) -> Application:
         if self._app is not None:
             return self._app
 
         self.logger.info("Building Telegram Application")
 
-        builder = Application.builder().token(self.token).concurrent_updates(True)
-        # if a post_init was provided, use it; otherwise use the internal commands setup
-        if self.post_init is not None:
-            builder = builder.post_init(self.post_init)
-        else:
-            builder = builder.post_init(self._setup_commands)
+        builder = (
+            Application.builder()
+            .token(self.token)
+            # Concurrent across chats, serialized and rate-limited per chat.
+            .concurrent_updates(self.update_processor)
+            # PTB's default request backend (same pool size), timed per Bot API method
+            .request(InstrumentedHTTPXRequest(connection_pool_size=256))
+        )
+        if self.persistence is not None:
+            builder = builder.persistence(self.persistence)
+        # the metrics endpoint always starts here; a provided post_init
+        # replaces the internal commands setup + backend connection pool warm-up
+        builder = builder.post_init(self._post_init).post_shutdown(self._post_shutdown)
 
         self._app = builder.build()
 
@@ -85,13 +204,24 @@ class BotApp:
         self._app.add_handler(CommandHandler("start", handlers.start))
         self._app.add_handler(CommandHandler("myid", handlers.myid))
         self._app.add_handler(CommandHandler("users", handlers.list_users))
+        self._app.add_handler(CallbackQueryHandler(handlers.users_page_callback, pattern="^users:"))
         self._app.add_handler(CommandHandler("user", handlers.get_user_info))
         self._app.add_handler(CommandHandler("request_recharge", handlers.request_recharge))
+        self._app.add_handler(CommandHandler("bulk_recharge", handlers.bulk_recharge))
+        # A CSV upload captioned /bulk_recharge (captions never reach CommandHandler).
+        self._app.add_handler(MessageHandler(
+            filters.Document.FileExtension("csv") & filters.CaptionRegex(r"^/bulk_recharge(@\w+)?(\s|$)"),
+            handlers.bulk_recharge,
+        ))
+
+        self._app.add_handler(InlineQueryHandler(handlers.inline_user_lookup))
 
         # Guided, button-driven flows — one-shot command args still work as
         # a fallback (see each entry point), but the default path is
         # buttons + prompts rather than memorized command syntax.
         stock_conv = ConversationHandler(
+            name="stock",
+            persistent=self.persistence is not None,
             entry_points=[CommandHandler("stock", handlers.stock_entry)],
             states={
                 STOCK_CHOOSE_ITEM: [
@@ -100,6 +230,7 @@ class BotApp:
                 ],
                 STOCK_ADJUST_DELTA: [
                     CallbackQueryHandler(handlers.stock_step, pattern="^stock:step:"),
+                    CallbackQueryHandler(handlers.stock_add_more, pattern="^stock:more$"),
                     CallbackQueryHandler(handlers.stock_confirm, pattern="^stock:confirm$"),
                     CallbackQueryHandler(handlers.stock_cancel, pattern="^stock:cancel$"),
                 ],
@@ -108,9 +239,11 @@ class BotApp:
                 CallbackQueryHandler(handlers.stock_cancel, pattern="^stock:cancel$"),
                 CommandHandler("cancel", handlers.cancel_command),
             ],
-            conversation_timeout=300,
+            conversation_timeout=CONVERSATION_TIMEOUT,
         )
         expense_conv = ConversationHandler(
+            name="expense",
+            persistent=self.persistence is not None,
             entry_points=[CommandHandler("expense", handlers.expense_entry)],
             states={
                 EXPENSE_CHOOSE_CATEGORY: [
@@ -133,9 +266,11 @@ class BotApp:
                 CallbackQueryHandler(handlers.expense_cancel, pattern="^expense:cancel$"),
                 CommandHandler("cancel", handlers.cancel_command),
             ],
-            conversation_timeout=300,
+            conversation_timeout=CONVERSATION_TIMEOUT,
         )
         recharge_conv = ConversationHandler(
+            name="recharge",
+            persistent=self.persistence is not None,
             entry_points=[CommandHandler("recharge", handlers.recharge_entry)],
             states={
                 RECHARGE_SEARCH: [
@@ -151,9 +286,11 @@ class BotApp:
                 CallbackQueryHandler(handlers.recharge_cancel, pattern="^recharge:cancel$"),
                 CommandHandler("cancel", handlers.cancel_command),
             ],
-            conversation_timeout=300,
+            conversation_timeout=CONVERSATION_TIMEOUT,
         )
         adjust_conv = ConversationHandler(
+            name="adjust",
+            persistent=self.persistence is not None,
             entry_points=[CommandHandler("adjust", handlers.adjust_entry)],
             states={
                 ADJUST_SEARCH: [
@@ -169,7 +306,7 @@ class BotApp:
                 CallbackQueryHandler(handlers.adjust_cancel, pattern="^adjust:cancel$"),
                 CommandHandler("cancel", handlers.cancel_command),
             ],
-            conversation_timeout=300,
+            conversation_timeout=CONVERSATION_TIMEOUT,
         )
 
         self._app.add_handler(stock_conv)
@@ -208,13 +345,59 @@ class BotApp:
 
         return self._app
 
+    def webhook_options(self) -> dict:
+        """Keyword arguments for `Application.run_webhook` /
+        `Updater.start_webhook`, derived from Config.
+
+        Telegram only accepts a single webhook URL per bot, so running
+        several replicas means pointing WEBHOOK_URL at a load balancer
+        and letting each replica listen on its own WEBHOOK_LISTEN/PORT.
+        """
+        cfg = self.cfg
+        url_path = cfg.WEBHOOK_PATH.strip("/")
+        return {
+            "listen": cfg.WEBHOOK_LISTEN,
+            "port": cfg.WEBHOOK_PORT,
+            "url_path": url_path,
+            "webhook_url": cfg.WEBHOOK_URL,
+            "secret_token": cfg.WEBHOOK_SECRET_TOKEN,
+            "cert": cfg.WEBHOOK_CERT,
+            "key": cfg.WEBHOOK_KEY,
+            "allowed_updates": Update.ALL_TYPES,
+        }
+
     def run(self):
+        if self.cfg.BOT_MODE == "webhook":
+            self.run_webhook()
+            return
         app = self.build()
         self.logger.info("Starting bot application")
         app.run_polling()
 
+    def run_webhook(self):
+        """Run the bot behind a webhook instead of long-polling.
+
+        PTB's embedded tornado server accepts the POSTed updates, checks
+        the `X-Telegram-Bot-Api-Secret-Token` header when a secret is
+        configured, and feeds them into the same `Application` (and so the
+        same handlers) that polling would. `set_webhook` is called on
+        startup and the signal handling is identical to `run_polling()`.
+        """
+        app = self.build()
+        options = self.webhook_options()
+        self.logger.info(
+            "Starting bot application (webhook) on %s:%s/%s",
+            options["listen"],
+            options["port"],
+            options["url_path"],
+        )
+        try:
+            app.run_webhook(**options)
+        except KeyboardInterrupt:
+            self.logger.info("KeyboardInterrupt received; exiting")
+
     def run_forever(self):
-        """Run the bot using long-polling.
+        """Run the bot using long-polling (or a webhook when BOT_MODE=webhook).
 
         Using `Application.run_polling()` is simpler and more robust in
         environments where managing the event loop and signal handlers
@@ -223,6 +406,10 @@ class BotApp:
         shutdown (handling SIGINT/SIGTERM internally).
         """
 
+        if self.cfg.BOT_MODE == "webhook":
+            self.run_webhook()
+            return
+
         app = self.build()
         self.logger.info("Starting bot application (polling)")
         try:
@@ -1,9 +1,21 @@
 from html import escape
 
-from telegram import BotCommand, BotCommandScopeChat, InlineKeyboardMarkup, InlineKeyboardButton
+import csv
+import io
+
+from telegram import (
+    BotCommand,
+    BotCommandScopeChat,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
 from telegram.ext import ContextTypes, ConversationHandler
 
-from .services import create_services, validate_expense_input, EXPENSE_CATEGORIES
+from .services import create_services, parse_bulk_recharge, validate_expense_input, EXPENSE_CATEGORIES
+from .notifications import NotificationDispatcher
+from .notification_store import NotificationStore
 from .logger import LOGGER_MANAGER
 from .config import get_config
 from .utilities import safe_handler
@@ -24,13 +36,64 @@ EXPENSE_CATEGORY_LABELS = {
 }
 
 
+class UserListPages:
+    """/users output for one fetched user list: the lines sorted once and
+    cut into pages that each fit in a Telegram message.
+
+    Built per list identity (the user directory hands out one shared list
+    per fetch), so paging through it never re-sorts or re-formats.
+    """
+
+    # Telegram rejects messages over 4096 characters; leave room for the
+    # header.
+    MAX_PAGE_CHARS = 3500
+
+    def __init__(self, users: list, page_size: int = 50):
+        self.users = users
+        self.lines = sorted(
+            (f"{u.get('name')} {u.get('surname')} ({u.get('username')})" for u in users),
+            key=str.lower,
+        )
+        # (start, end) line ranges, closed early when a page would get too long.
+        self.pages: list[tuple[int, int]] = []
+        start, size = 0, 0
+        for i, line in enumerate(self.lines):
+            if i > start and (i - start >= page_size or size + len(line) + 1 > self.MAX_PAGE_CHARS):
+                self.pages.append((start, i))
+                start, size = i, 0
+            size += len(line) + 1
+        if self.lines:
+            self.pages.append((start, len(self.lines)))
+
+    def page_text(self, page: int) -> str:
+        start, end = self.pages[page]
+        header = f"👥 Users ({len(self.lines)})"
+        if len(self.pages) > 1:
+            header += f" — page {page + 1}/{len(self.pages)}"
+        return header + "\n\n" + "\n".join(self.lines[start:end])
+
+    def to_csv(self) -> bytes:
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["username", "name", "surname", "balance"])
+        for u in sorted(self.users, key=lambda u: str(u.get("username", "")).lower()):
+            writer.writerow([u.get("username"), u.get("name"), u.get("surname"), u.get("balance")])
+        return out.getvalue().encode("utf-8")
+
+
 class BotHandlers:
     def __init__(self, services=None, logger=None):
         self.services = services or create_services()
         self.user_service = self.services["user"]
+        self.notifier = self.services.get("notifier") or NotificationDispatcher()
         self.logger = logger or LOGGER_MANAGER.get_logger(self.__class__.__name__)
         self.cfg = get_config()
-        self.recharge_request_notifications = {}
+        # request_id -> admin messages announcing it; persistent when
+        # create_services() supplies a file-backed store.
+        store = self.services.get("notification_store")
+        self.recharge_request_notifications = store if store is not None else NotificationStore()
+        # Sorted, paginated /users output for the most recent user list.
+        self._users_pages: UserListPages | None = None
 
     def _admin_commands(self) -> list[BotCommand]:
         return [
@@ -39,6 +102,7 @@ class BotHandlers:
             BotCommand("users", "List all users"),
             BotCommand("user", "Get user info by username"),
             BotCommand("recharge", "Search a user, then recharge their balance"),
+            BotCommand("bulk_recharge", "Recharge many users from a list or CSV"),
             BotCommand("adjust", "Search a user, then set their balance"),
             BotCommand("request_recharge", "Request a balance recharge"),
             BotCommand("stock", "View or adjust inventory stock"),
@@ -57,10 +121,17 @@ class BotHandlers:
             return
 
         commands = self._admin_commands() if is_admin else self._user_commands()
+        # Skip the push when this chat already has exactly this menu.
+        digest = hash(tuple((command.command, command.description) for command in commands))
+        roles = self.user_service.roles
+        if roles.commands_pushed(chat_id, digest):
+            return
         try:
             await context.bot.set_my_commands(commands, scope=BotCommandScopeChat(chat_id=chat_id))
         except Exception:
             self.logger.exception("Failed to set chat-specific commands for chat_id=%s", chat_id)
+            return
+        roles.mark_commands_pushed(chat_id, digest)
 
     def _format_telegram_identity(self, user) -> str:
         if user is None:
@@ -146,17 +217,25 @@ class BotHandlers:
         buttons = self._build_request_buttons(request_id)
         notifications = []
 
-        for admin_chat_id in payload.get("admin_chat_ids", []):
-            try:
-                sent = await context.bot.send_message(
-                    chat_id=int(admin_chat_id),
-                    text=text,
-                    reply_markup=buttons,
-                    parse_mode="HTML",
+        results = await self.notifier.send_all(
+            payload.get("admin_chat_ids", []),
+            lambda admin_chat_id: context.bot.send_message(
+                chat_id=int(admin_chat_id),
+                text=text,
+                reply_markup=buttons,
+                parse_mode="HTML",
+            ),
+        )
+        for result in results:
+            if result.ok:
+                notifications.append({"chat_id": int(result.target), "message_id": result.value.message_id})
+            else:
+                self.logger.error(
+                    "Failed to notify admin chat_id=%s about recharge request %s",
+                    result.target,
+                    request_id,
+                    exc_info=result.error,
                 )
-                notifications.append({"chat_id": int(admin_chat_id), "message_id": sent.message_id})
-            except Exception:
-                self.logger.exception("Failed to notify admin chat_id=%s about recharge request %s", admin_chat_id, request_id)
 
         if request_id:
             self.recharge_request_notifications[request_id] = notifications
@@ -171,29 +250,32 @@ class BotHandlers:
         notifications = self.recharge_request_notifications.pop(request_id, [])
 
         # Requests created from the web app were never announced by this
-        # bot process (the backend messaged the target admin directly), so
-        # they're never in the in-memory map above — but the backend
-        # persists the one message it sent on the request row itself,
-        # which survives a bot restart unlike the in-memory map.
+        # bot (the backend messaged the target admin directly), so they're
+        # never in the store above — but the backend persists the one
+        # message it sent on the request row itself.
         if not notifications and request.get("notified_chat_id") and request.get("notified_message_id"):
             notifications = [{
                 "chat_id": int(request["notified_chat_id"]),
                 "message_id": request["notified_message_id"],
             }]
 
-        for notification in notifications:
-            try:
-                await context.bot.edit_message_text(
-                    chat_id=notification["chat_id"],
-                    message_id=notification["message_id"],
-                    text=text,
-                    parse_mode="HTML",
-                )
-            except Exception:
-                self.logger.exception(
+        results = await self.notifier.send_all(
+            notifications,
+            lambda notification: context.bot.edit_message_text(
+                chat_id=notification["chat_id"],
+                message_id=notification["message_id"],
+                text=text,
+                parse_mode="HTML",
+            ),
+            chat_key=lambda notification: str(notification["chat_id"]),
+        )
+        for result in results:
+            if not result.ok:
+                self.logger.error(
                     "Failed to update admin notification for recharge request %s in chat_id=%s",
                     request_id,
-                    notification["chat_id"],
+                    result.target["chat_id"],
+                    exc_info=result.error,
                 )
 
     def _build_purchase_resolution_text(self, payload: dict) -> str:
@@ -223,19 +305,23 @@ class BotHandlers:
         target admin), so resolving it has to edit every one of those
         messages, not just one."""
         text = self._build_purchase_resolution_text(payload)
-        for notification in payload.get("notifications", []):
-            try:
-                await context.bot.edit_message_text(
-                    chat_id=int(notification["chat_id"]),
-                    message_id=notification["message_id"],
-                    text=text,
-                    parse_mode="HTML",
-                )
-            except Exception:
-                self.logger.exception(
+        results = await self.notifier.send_all(
+            payload.get("notifications", []),
+            lambda notification: context.bot.edit_message_text(
+                chat_id=int(notification["chat_id"]),
+                message_id=notification["message_id"],
+                text=text,
+                parse_mode="HTML",
+            ),
+            chat_key=lambda notification: str(notification.get("chat_id")),
+        )
+        for result in results:
+            if not result.ok:
+                self.logger.error(
                     "Failed to update admin notification for purchase %s in chat_id=%s",
                     payload.get("purchase", {}).get("id"),
-                    notification.get("chat_id"),
+                    result.target.get("chat_id"),
+                    exc_info=result.error,
                 )
 
     async def _notify_requester_of_resolution(self, context: ContextTypes.DEFAULT_TYPE, payload: dict):
@@ -284,6 +370,7 @@ class BotHandlers:
 
                 "💳 <b>Balance</b>\n"
                 "/recharge – Search for a user, then enter an amount to add\n"
+                "/bulk_recharge – Recharge many users: one <code>username,amount</code> per line, or a .csv file with this as its caption\n"
                 "/adjust – Search for a user, then set their balance directly\n\n"
 
                 "📩 <b>Recharge Requests</b>\n"
@@ -439,25 +526,76 @@ class BotHandlers:
         status_code, res = await self.user_service.list_users(chat_id)
 
         if status_code == 200:
+            message = getattr(update, "message", None)
             if not res:
-                message = getattr(update, "message", None)
                 if message is not None:
                     await message.reply_text("No users found.")
                 return
 
-            msg_lines = []
-            for u in res:
-                msg_lines.append(f"{u.get('name')} {u.get('surname')} ({u.get('username')})")
-            message = getattr(update, "message", None)
             if message is not None:
-                msg_lines.sort(key=lambda x: x.lower())
-                msg_lines.insert(0, "👥 Users:\n")
-                await message.reply_text("\n".join(msg_lines))
+                pages = self._user_list_pages(res)
+                await message.reply_text(pages.page_text(0), reply_markup=self._build_user_list_buttons(pages, 0))
         elif status_code == 403:
             await update.message.reply_text("❌ You are not authorized to view users.")
         else:
             await update.message.reply_text(f"⚠️ Error: {res.get('detail', 'Unknown error')}")
 
+    USERS_PAGE_SIZE = 50
+
+    def _user_list_pages(self, users: list) -> UserListPages:
+        pages = self._users_pages
+        if pages is None or pages.users is not users:
+            pages = self._users_pages = UserListPages(users, self.USERS_PAGE_SIZE)
+        return pages
+
+    def _build_user_list_buttons(self, pages: UserListPages, page: int) -> InlineKeyboardMarkup | None:
+        if len(pages.pages) <= 1:
+            return None
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton("◀️ Prev", callback_data=f"users:page:{page - 1}"))
+        if page < len(pages.pages) - 1:
+            nav.append(InlineKeyboardButton("Next ▶️", callback_data=f"users:page:{page + 1}"))
+        return InlineKeyboardMarkup([nav, [InlineKeyboardButton("📄 Export as CSV", callback_data="users:export")]])
+
+    @safe_handler
+    async def users_page_callback(self, update, context: ContextTypes.DEFAULT_TYPE):
+        """Prev/Next and Export on a /users message. The list comes from
+        the shared user directory cache (which also re-checks that this
+        chat may see it), and the message is edited in place."""
+        query = getattr(update, "callback_query", None)
+        if query is None:
+            return
+        msg = getattr(query, "message", None)
+        chat_id = getattr(getattr(msg, "chat", None), "id", None)
+
+        status_code, res = await self.user_service.list_users(chat_id)
+        if status_code != 200 or not isinstance(res, list) or not res:
+            await query.answer("⚠️ Couldn't load the user list. Run /users again.", show_alert=True)
+            return
+        pages = self._user_list_pages(res)
+
+        data = getattr(query, "data", "") or ""
+        if data == "users:export":
+            await query.answer()
+            await context.bot.send_document(
+                chat_id=chat_id,
+                document=pages.to_csv(),
+                filename="users.csv",
+                caption=f"👥 {len(pages.users)} users",
+            )
+            return
+
+        try:
+            page = int(data.rsplit(":", 1)[-1])
+        except ValueError:
+            page = 0
+        # The list may have changed size since the buttons were drawn.
+        page = min(max(page, 0), len(pages.pages) - 1)
+        await query.answer()
+        if msg is not None:
+            await msg.edit_text(pages.page_text(page), reply_markup=self._build_user_list_buttons(pages, page))
+
     @safe_handler
     async def request_recharge(self, update, context: ContextTypes.DEFAULT_TYPE):
         chat = getattr(update, "effective_chat", None)
@@ -499,6 +637,8 @@ class BotHandlers:
             await update.message.reply_text(f"❌ {res.get('detail', 'Invalid amount')}")
         elif status_code == 404:
             await update.message.reply_text("⚠️ User not found.")
+        elif status_code == 409:
+            await update.message.reply_text(f"ℹ️ {res.get('detail', 'This request was already sent.')}")
         else:
             await update.message.reply_text(f"⚠️ Error: {res.get('detail', 'Unknown error')}")
 
@@ -517,15 +657,9 @@ class BotHandlers:
         status_code, res = await self.user_service.get_user(chat_id, username)
 
         if status_code == 200:
-            msg = (
-                f"👤 User Info\n"
-                f"Name: {res.get('name')} {res.get('surname')}\n"
-                f"Username: {res.get('username')}\n"
-                f"Balance: {res.get('balance'):.2f}€"
-            )
             message = getattr(update, "message", None)
             if message is not None:
-                await message.reply_text(msg)
+                await message.reply_text(self._format_user_info(res))
         elif status_code == 403:
             await update.message.reply_text("❌ You are not authorized to view users.")
         elif status_code == 404:
@@ -533,6 +667,69 @@ class BotHandlers:
         else:
             await update.message.reply_text(f"⚠️ Error: {res.get('detail', 'Unknown error')}")
 
+    def _format_user_info(self, user: dict) -> str:
+        return (
+            f"👤 User Info\n"
+            f"Name: {user.get('name')} {user.get('surname')}\n"
+            f"Username: {user.get('username')}\n"
+            f"Balance: {user.get('balance'):.2f}€"
+        )
+
+    # ---- inline mode: "@bot <partial name>" from any chat ----
+
+    # Results per answer; Telegram allows up to 50 and asks for the next
+    # page (via next_offset) as the admin scrolls.
+    INLINE_PAGE_SIZE = 20
+
+    @safe_handler
+    async def inline_user_lookup(self, update, context: ContextTypes.DEFAULT_TYPE):
+        """Answer an inline query with ranked matching users.
+
+        Served from the shared user directory cache (keyed on the admin's
+        user ID, which is their private chat ID), so typing costs at most
+        one backend call per refresh window. Telegram caches each answer
+        for as long as the directory stays fresh; answers are personal
+        because only admins get results. A refused user is remembered in
+        the role cache, so their keystrokes don't each cost a fetch.
+        """
+        inline_query = getattr(update, "inline_query", None)
+        if inline_query is None:
+            return
+        user_id = getattr(getattr(inline_query, "from_user", None), "id", None)
+        cache_time = int(self.user_service.user_directory.ttl)
+
+        roles = self.user_service.roles
+        role = roles.get(user_id)
+        if role is not None and role[0] != 200:
+            await inline_query.answer([], cache_time=cache_time, is_personal=True)
+            return
+
+        status_code, res = await self.user_service.list_users(user_id)
+        if status_code in (401, 403):
+            roles.put(user_id, 403, res)
+        if status_code != 200 or not isinstance(res, list):
+            await inline_query.answer([], cache_time=cache_time, is_personal=True)
+            return
+
+        try:
+            offset = max(int(inline_query.offset or 0), 0)
+        except ValueError:
+            offset = 0
+        matches = self.user_service.user_directory.search_index(res).search(inline_query.query or "")
+        page = matches[offset:offset + self.INLINE_PAGE_SIZE]
+        next_offset = str(offset + self.INLINE_PAGE_SIZE) if offset + self.INLINE_PAGE_SIZE < len(matches) else ""
+
+        results = [
+            InlineQueryResultArticle(
+                id=str(u.get("username"))[:64],
+                title=f"{u.get('name')} {u.get('surname')}",
+                description=f"{u.get('username')} · Balance: {u.get('balance', 0):.2f}€",
+                input_message_content=InputTextMessageContent(self._format_user_info(u)),
+            )
+            for u in page
+        ]
+        await inline_query.answer(results, cache_time=cache_time, is_personal=True, next_offset=next_offset)
+
     # ---- /recharge and /adjust: guided user search + picker, one-shot args as fallback ----
 
     # Buttons only render when a search narrows the result to this many or
@@ -547,13 +744,8 @@ class BotHandlers:
         return f"{name} (@{username})" if name else f"@{username}"
 
     def _filter_users(self, users: list[dict], query: str) -> list[dict]:
-        q = query.strip().lower()
-        if not q:
-            return users
-        return [
-            u for u in users
-            if q in f"{u.get('username', '')} {u.get('name', '')} {u.get('surname', '')}".lower()
-        ]
+        index = self.user_service.user_directory.search_index(users)
+        return index.search(query, rank_limit=self.USER_PICKER_THRESHOLD)
 
     def _build_user_picker_buttons(self, users: list[dict], prefix: str) -> InlineKeyboardMarkup:
         buttons = [
@@ -637,6 +829,20 @@ class BotHandlers:
                 )
         return next_state
 
+    async def _cached_user_list(self, update, context: ContextTypes.DEFAULT_TYPE, prefix: str) -> list[dict]:
+        """The user list _start_user_search cached in chat_data, re-fetched
+        (through the shared user directory cache) when it's missing — a
+        flow restored from persistence comes back without it."""
+        all_users = context.chat_data.get(f"{prefix}_all_users")
+        if all_users is not None:
+            return all_users
+        chat = getattr(update, "effective_chat", None)
+        status_code, res = await self.user_service.list_users(getattr(chat, "id", None))
+        if status_code != 200 or not isinstance(res, list):
+            return []
+        context.chat_data[f"{prefix}_all_users"] = res
+        return res
+
     async def _prompt_for_amount(
         self, update, context: ContextTypes.DEFAULT_TYPE, user: dict, prefix: str,
         prompt_text: str, next_state, *, edit: bool,
@@ -660,13 +866,13 @@ class BotHandlers:
         message = getattr(update, "message", None)
         text = getattr(message, "text", "") if message is not None else ""
         query = text.strip()
-        all_users = context.chat_data.get(f"{prefix}_all_users") or []
 
         if len(query) < self.MIN_USER_SEARCH_CHARS:
             if message is not None:
                 await message.reply_text(f"Type at least {self.MIN_USER_SEARCH_CHARS} characters to search.")
             return search_state
 
+        all_users = await self._cached_user_list(update, context, prefix)
         matches = self._filter_users(all_users, query)
 
         if not matches:
@@ -698,7 +904,7 @@ class BotHandlers:
             return ConversationHandler.END
         data = getattr(query, "data", None) or ""
         username = data.split(":", 2)[-1]
-        all_users = context.chat_data.get(f"{prefix}_all_users") or []
+        all_users = await self._cached_user_list(update, context, prefix)
         user = next((u for u in all_users if u.get("username") == username), None)
 
         await query.answer()
@@ -779,6 +985,92 @@ class BotHandlers:
     async def recharge_cancel(self, update, context: ContextTypes.DEFAULT_TYPE):
         return await self._cancel_user_flow(update, context, "recharge")
 
+    BULK_RECHARGE_USAGE = (
+        "Usage: /bulk_recharge followed by one `username,amount` per line, "
+        "or send a .csv file with /bulk_recharge as its caption."
+    )
+    # CSV uploads above this size are refused before downloading.
+    BULK_RECHARGE_MAX_BYTES = 64 * 1024
+    # Error/failure lines shown before the rest is summarized as "… and N more".
+    BULK_RECHARGE_MAX_LINES = 20
+
+    # Up to BULK_RECHARGE_MAX_ROWS recharges, reported by editing a progress
+    # message rather than answering a spinner: no per-update deadline.
+    @safe_handler.with_deadline(None)
+    async def bulk_recharge(self, update, context: ContextTypes.DEFAULT_TYPE):
+        """Recharge many users at once from a pasted list or a CSV document.
+
+        Every row is validated before anything is sent; if any row is bad,
+        nothing is recharged and the bad rows are listed. Otherwise the
+        recharges run concurrently and one summary message reports them.
+        """
+        chat = getattr(update, "effective_chat", None)
+        chat_id = getattr(chat, "id", None)
+        message = getattr(update, "message", None)
+        if message is None:
+            return
+
+        # Admins only — checked up front (through the role cache) so nobody
+        # else can make the bot send a refused PATCH per row.
+        status_code, res = await self.user_service.get_me(chat_id)
+        if status_code in (401, 403):
+            await message.reply_text("❌ You are not authorized to recharge users.")
+            return
+        if status_code != 200:
+            await message.reply_text(f"⚠️ Error: {res.get('detail', 'Unknown error')}")
+            return
+
+        document = getattr(message, "document", None)
+        if document is not None:
+            if (getattr(document, "file_size", None) or 0) > self.BULK_RECHARGE_MAX_BYTES:
+                await message.reply_text(f"❌ File too large (max {self.BULK_RECHARGE_MAX_BYTES // 1024} KB).")
+                return
+            file = await document.get_file()
+            payload = await file.download_as_bytearray()
+            try:
+                text = bytes(payload).decode("utf-8-sig")
+            except UnicodeDecodeError:
+                await message.reply_text("❌ The file must be UTF-8 text.")
+                return
+        else:
+            # Everything after the command itself (which may span lines).
+            parts = (getattr(message, "text", None) or "").split(maxsplit=1)
+            text = parts[1] if len(parts) > 1 else ""
+
+        rows, errors = parse_bulk_recharge(text)
+        if errors:
+            await message.reply_text(
+                "❌ Nothing was recharged — fix these rows and resend:\n" + self._format_bulk_lines(errors)
+            )
+            return
+        if not rows:
+            await message.reply_text(self.BULK_RECHARGE_USAGE)
+            return
+
+        progress = await message.reply_text(f"⏳ Recharging {len(rows)} users…")
+        results = await self.user_service.recharge_many(chat_id, rows)
+        await progress.edit_text(self._format_bulk_recharge_summary(results))
+
+    def _format_bulk_lines(self, lines: list) -> str:
+        shown = [f"• {line}" for line in lines[:self.BULK_RECHARGE_MAX_LINES]]
+        if len(lines) > self.BULK_RECHARGE_MAX_LINES:
+            shown.append(f"… and {len(lines) - self.BULK_RECHARGE_MAX_LINES} more")
+        return "\n".join(shown)
+
+    def _format_bulk_recharge_summary(self, results: list) -> str:
+        succeeded = [(username, amount) for username, amount, status_code, _ in results if status_code == 200]
+        failures = [
+            f"{username}: {self._format_recharge_result(username, amount, status_code, res)}"
+            for username, amount, status_code, res in results
+            if status_code != 200
+        ]
+        total = sum(amount for _, amount in succeeded)
+        lines = [f"💰 Recharged {len(succeeded)} of {len(results)} users, {total:.2f}€ in total."]
+        if failures:
+            lines.append(f"\n{len(failures)} failed:")
+            lines.append(self._format_bulk_lines(failures))
+        return "\n".join(lines)
+
     @safe_handler
     async def adjust_entry(self, update, context: ContextTypes.DEFAULT_TYPE):
         chat = getattr(update, "effective_chat", None)
@@ -841,7 +1133,7 @@ class BotHandlers:
         """Shared /cancel fallback for the /stock, /expense, /recharge, and
         /adjust guided flows."""
         for key in (
-            "stock_target", "stock_items", "stock_delta", "pending_expense",
+            "stock_target", "stock_delta", "stock_batch", "pending_expense",
             "recharge_target", "recharge_all_users", "adjust_target", "adjust_all_users",
         ):
             context.chat_data.pop(key, None)
@@ -866,32 +1158,70 @@ class BotHandlers:
     def _format_delta(self, delta: float) -> str:
         return f"+{delta:g}" if delta > 0 else f"{delta:g}"
 
-    def _format_stock_stepper_text(self, item: dict, delta: float) -> str:
+    def _format_stock_batch(self, batch: dict) -> str:
+        """Header listing the adjustments already queued in this /stock
+        session (empty when there are none)."""
+        if not batch:
+            return ""
+        lines = ["🧾 <b>Pending changes</b>"]
+        for entry in batch.values():
+            item = entry["item"]
+            lines.append(f"• {self._escape_html(item.get('name'))}: {self._format_delta(entry['delta'])} {item.get('unit', '')}")
+        return "\n".join(lines) + "\n\n"
+
+    def _format_stock_stepper_text(self, item: dict, delta: float, batch: dict | None = None) -> str:
         current = item.get("current_stock", 0)
         unit = item.get("unit", "")
         new_stock = current + delta
         change = self._format_delta(delta) if delta else "0"
         return (
+            f"{self._format_stock_batch(batch)}"
             f"📦 <b>{self._escape_html(item.get('name'))}</b>\n"
             f"Current stock: {current:g} {unit}\n"
             f"Change: {change}\n"
             f"New stock: {new_stock:g} {unit}\n\n"
-            "Use the buttons below, then Confirm."
+            "Use the buttons below, then Confirm — or add another item first."
         )
 
-    def _build_stock_stepper_buttons(self, delta: float) -> InlineKeyboardMarkup:
+    def _build_stock_stepper_buttons(self, delta: float, batch_size: int = 0) -> InlineKeyboardMarkup:
         step_row = [
             InlineKeyboardButton(self._format_delta(step), callback_data=f"stock:step:{step}")
             for step in self.STOCK_STEPS
         ]
+        pending = batch_size + (1 if delta else 0)
+        confirm_label = f"✅ Confirm all ({pending})" if batch_size else "✅ Confirm"
         return InlineKeyboardMarkup([
             step_row,
+            [InlineKeyboardButton("➕ Add another item", callback_data="stock:more")],
             [
-                InlineKeyboardButton("✅ Confirm", callback_data="stock:confirm"),
+                InlineKeyboardButton(confirm_label, callback_data="stock:confirm"),
                 InlineKeyboardButton("❌ Cancel", callback_data="stock:cancel"),
             ],
         ])
 
+    def _format_stock_batch_result_text(self, results: list) -> str:
+        failed = sum(1 for _, _, status_code, _ in results if status_code != 200)
+        if failed:
+            header = f"⚠️ {failed} of {len(results)} adjustments failed"
+        else:
+            header = f"✅ {len(results)} adjustments applied"
+        lines = [header, ""]
+        lines.extend(self._format_stock_result_text(name, delta, status_code, res) for name, delta, status_code, res in results)
+        return "\n".join(lines)
+
+    async def _stock_inventory(self, update) -> list:
+        """The shared inventory list (see InventoryCache) for this chat,
+        or [] when it can't be loaded."""
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            chat = getattr(getattr(getattr(update, "callback_query", None), "message", None), "chat", None)
+        status_code, res = await self.user_service.list_inventory(getattr(chat, "id", None))
+        return res if status_code == 200 and isinstance(res, list) else []
+
+    def _stock_item_keyboard(self, items: list) -> InlineKeyboardMarkup:
+        # Rebuilt only when the inventory changes, not per /stock.
+        return self.user_service.inventory.derived("stock_keyboard", items, self._build_stock_item_buttons)
+
     def _format_stock_result_text(self, item_name: str, delta, status_code: int, res: dict) -> str:
         if status_code == 200:
             name = res.get("name") or item_name
@@ -925,6 +1255,10 @@ class BotHandlers:
         chat_id = getattr(chat, "id", None)
         args = getattr(context, "args", None) or []
         message = getattr(update, "message", None)
+        # A fresh /stock starts from nothing: a batch left by an abandoned
+        # or timed-out session must not be shown, let alone confirmed.
+        for key in ("stock_target", "stock_delta", "stock_batch"):
+            context.chat_data.pop(key, None)
 
         if len(args) >= 2:
             # Fallback one-shot form: /stock <delta> <item name...>
@@ -948,9 +1282,12 @@ class BotHandlers:
                 await message.reply_text("No inventory items found.")
             return ConversationHandler.END
 
-        context.chat_data["stock_items"] = {str(item["id"]): item for item in res}
         if message is not None:
-            await message.reply_text("📦 Select an item to adjust:", reply_markup=self._build_stock_item_buttons(res))
+            prompt = "📦 Select an item to adjust:"
+            low_stock = self.user_service.inventory.low_stock(res)
+            if low_stock:
+                prompt = f"⚠️ {len(low_stock)} item(s) low on stock.\n{prompt}"
+            await message.reply_text(prompt, reply_markup=self._stock_item_keyboard(res))
         return STOCK_CHOOSE_ITEM
 
     @safe_handler
@@ -961,8 +1298,7 @@ class BotHandlers:
 
         data = getattr(query, "data", None) or ""
         item_id = data.split(":", 2)[-1]
-        items = context.chat_data.get("stock_items") or {}
-        item = items.get(item_id)
+        item = self.user_service.inventory.by_id(await self._stock_inventory(update)).get(item_id)
 
         await query.answer()
         msg = getattr(query, "message", None)
@@ -971,16 +1307,49 @@ class BotHandlers:
                 await msg.edit_text("⚠️ That item is no longer available. Run /stock again.")
             return ConversationHandler.END
 
+        # Picking an item that's already in the batch reopens it for editing.
+        batch = context.chat_data.get("stock_batch") or {}
+        delta = batch.pop(str(item_id), {}).get("delta", 0.0)
         context.chat_data["stock_target"] = item
-        context.chat_data["stock_delta"] = 0.0
+        context.chat_data["stock_delta"] = delta
         if msg is not None:
             await msg.edit_text(
-                self._format_stock_stepper_text(item, 0.0),
-                reply_markup=self._build_stock_stepper_buttons(0.0),
+                self._format_stock_stepper_text(item, delta, batch),
+                reply_markup=self._build_stock_stepper_buttons(delta, len(batch)),
                 parse_mode="HTML",
             )
         return STOCK_ADJUST_DELTA
 
+    @safe_handler
+    async def stock_add_more(self, update, context: ContextTypes.DEFAULT_TYPE):
+        """Park the item being adjusted in the session's batch and go back
+        to the item list, so one confirm can apply several adjustments."""
+        query = getattr(update, "callback_query", None)
+        if query is None:
+            return ConversationHandler.END
+
+        item = context.chat_data.get("stock_target")
+        if item is None:
+            await query.answer("Session expired. Run /stock again.", show_alert=True)
+            return ConversationHandler.END
+
+        batch = context.chat_data.setdefault("stock_batch", {})
+        delta = context.chat_data.pop("stock_delta", 0.0)
+        context.chat_data.pop("stock_target", None)
+        if delta:
+            batch[str(item.get("id"))] = {"item": item, "delta": delta}
+
+        items = await self._stock_inventory(update)
+        await query.answer()
+        msg = getattr(query, "message", None)
+        if msg is not None:
+            await msg.edit_text(
+                f"{self._format_stock_batch(batch)}📦 Select another item to adjust:",
+                reply_markup=self._stock_item_keyboard(items),
+                parse_mode="HTML",
+            )
+        return STOCK_CHOOSE_ITEM
+
     @safe_handler
     async def stock_step(self, update, context: ContextTypes.DEFAULT_TYPE):
         query = getattr(update, "callback_query", None)
@@ -1000,13 +1369,14 @@ class BotHandlers:
 
         delta = context.chat_data.get("stock_delta", 0.0) + step
         context.chat_data["stock_delta"] = delta
+        batch = context.chat_data.get("stock_batch") or {}
 
         await query.answer()
         msg = getattr(query, "message", None)
         if msg is not None:
             await msg.edit_text(
-                self._format_stock_stepper_text(item, delta),
-                reply_markup=self._build_stock_stepper_buttons(delta),
+                self._format_stock_stepper_text(item, delta, batch),
+                reply_markup=self._build_stock_stepper_buttons(delta, len(batch)),
                 parse_mode="HTML",
             )
         return STOCK_ADJUST_DELTA
@@ -1019,39 +1389,52 @@ class BotHandlers:
 
         item = context.chat_data.get("stock_target")
         delta = context.chat_data.get("stock_delta", 0.0)
+        batch = context.chat_data.get("stock_batch") or {}
         if item is None:
             await query.answer("Session expired. Run /stock again.", show_alert=True)
             return ConversationHandler.END
 
-        if delta == 0:
+        adjustments = [(entry["item"].get("name"), entry["delta"]) for entry in batch.values()]
+        if delta:
+            adjustments.append((item.get("name"), delta))
+        if not adjustments:
             await query.answer("Change the amount before confirming.", show_alert=True)
             return STOCK_ADJUST_DELTA
 
         msg = getattr(query, "message", None)
         chat = getattr(msg, "chat", None)
         chat_id = getattr(chat, "id", None)
-        status_code, res = await self.user_service.adjust_stock(chat_id, item.get("name"), delta)
 
-        if status_code == 200:
-            await query.answer("Stock updated")
-        elif status_code == 403:
-            await query.answer("You are not authorized to manage inventory.", show_alert=True)
-        else:
-            await query.answer(res.get("detail", "Unknown error"), show_alert=True)
+        if len(adjustments) == 1:
+            item_name, delta = adjustments[0]
+            status_code, res = await self.user_service.adjust_stock(chat_id, item_name, delta)
 
-        await self._edit_stock_result(msg, item.get("name"), delta, status_code, res)
+            if status_code == 200:
+                await query.answer("Stock updated")
+            elif status_code == 403:
+                await query.answer("You are not authorized to manage inventory.", show_alert=True)
+            else:
+                await query.answer(res.get("detail", "Unknown error"), show_alert=True)
 
-        context.chat_data.pop("stock_target", None)
-        context.chat_data.pop("stock_items", None)
-        context.chat_data.pop("stock_delta", None)
+            await self._edit_stock_result(msg, item_name, delta, status_code, res)
+        else:
+            results = await self.user_service.adjust_stock_many(chat_id, adjustments)
+            if all(status_code == 200 for _, _, status_code, _ in results):
+                await query.answer("Stock updated")
+            else:
+                await query.answer("Some adjustments failed — see the summary.", show_alert=True)
+            if msg is not None:
+                await msg.edit_text(self._format_stock_batch_result_text(results))
+
+        for key in ("stock_target", "stock_delta", "stock_batch"):
+            context.chat_data.pop(key, None)
         return ConversationHandler.END
 
     @safe_handler
     async def stock_cancel(self, update, context: ContextTypes.DEFAULT_TYPE):
         query = getattr(update, "callback_query", None)
-        context.chat_data.pop("stock_target", None)
-        context.chat_data.pop("stock_items", None)
-        context.chat_data.pop("stock_delta", None)
+        for key in ("stock_target", "stock_delta", "stock_batch"):
+            context.chat_data.pop(key, None)
         if query is not None:
             await query.answer("Cancelled")
             msg = getattr(query, "message", None)
@@ -13,13 +13,83 @@ class Config:
 	TELEGRAM_SECRET: str
 	API_BASE_URL: str = "http://localhost:8000"
 	API_TIMEOUT: int = 5
+	# Backend connection pool. API_POOL_WARM connections are opened at
+	# startup so the first admin command doesn't pay for TCP/TLS setup.
+	# API_HTTP2 needs the optional `h2` package (pip install "httpx[http2]").
+	API_MAX_CONNECTIONS: int = 100
+	API_MAX_KEEPALIVE: int = 20
+	API_KEEPALIVE_EXPIRY: float = 30.0
+	API_HTTP2: bool = False
+	API_POOL_WARM: int = 2
+	# Per-endpoint circuit breaker and the cap on retries as a share of requests.
+	API_BREAKER_FAILURES: int = 5
+	API_BREAKER_RESET: float = 30.0
+	API_RETRY_BUDGET: float = 0.2
+	# Conditional-GET response cache (ETag / Last-Modified); 0 entries disables it.
+	API_CACHE_MAX_ENTRIES: int = 128
+	API_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
 	ADMIN_CHAT_ID: Optional[int] = None
+	# "polling" (default) or "webhook". Webhook mode needs WEBHOOK_URL — the
+	# public HTTPS URL Telegram will POST updates to (usually a reverse
+	# proxy / load balancer in front of WEBHOOK_LISTEN:WEBHOOK_PORT).
+	BOT_MODE: str = "polling"
+	WEBHOOK_LISTEN: str = "0.0.0.0"
+	WEBHOOK_PORT: int = 8443
+	WEBHOOK_PATH: str = "telegram"
+	WEBHOOK_URL: Optional[str] = None
+	WEBHOOK_SECRET_TOKEN: Optional[str] = None
+	WEBHOOK_CERT: Optional[str] = None
+	WEBHOOK_KEY: Optional[str] = None
+	# Shared /telegram/users cache: fresh for USER_CACHE_TTL seconds, then
+	# served stale for up to USER_CACHE_STALE_TTL more while it refreshes.
+	USER_CACHE_TTL: float = 60.0
+	USER_CACHE_STALE_TTL: float = 300.0
+	# Shared /telegram/inventory cache; stock adjustments made through the
+	# bot update it in place, so this only bounds outside changes.
+	INVENTORY_CACHE_TTL: float = 60.0
+	# How long /start trusts a chat's last /telegram/me answer (0 disables).
+	ROLE_CACHE_TTL: float = 300.0
+	# Seconds a repeated /request_recharge (same user and amount) from the
+	# same chat is treated as a duplicate of the first.
+	RECHARGE_REQUEST_DEDUP_WINDOW: float = 60.0
+	# Admin messages announcing each recharge request, kept across restarts
+	# so resolving it edits all of them; entries expire after NOTIFICATION_TTL seconds.
+	NOTIFICATION_STORE_PATH: str = "data/notifications.sqlite3"
+	NOTIFICATION_TTL: float = 30 * 24 * 3600.0
+	# ConversationHandler states + chat_data, written every
+	# PERSISTENCE_UPDATE_INTERVAL seconds. Empty path disables persistence.
+	PERSISTENCE_PATH: Optional[str] = "data/persistence.sqlite3"
+	PERSISTENCE_UPDATE_INTERVAL: float = 5.0
+	# Prometheus /metrics endpoint; off unless METRICS_PORT is set.
+	METRICS_LISTEN: str = "127.0.0.1"
+	METRICS_PORT: Optional[int] = None
+	# Chats that get proactive low-stock alerts (the first one is also used
+	# to read the inventory, so it must be an admin). Falls back to
+	# ADMIN_CHAT_ID; no chats means no alerts.
+	LOW_STOCK_ALERT_CHAT_IDS: tuple = ()
+	LOW_STOCK_CHECK_INTERVAL: float = 300.0
+	# Incoming updates: handlers running at once across all chats, and each
+	# chat's rate (updates/second, burst) and backlog before drops.
+	UPDATE_CONCURRENCY: int = 32
+	UPDATE_CHAT_RATE: float = 2.0
+	UPDATE_CHAT_BURST: int = 10
+	UPDATE_CHAT_QUEUE: int = 20
+	# Seconds from an update's arrival (queue wait included) that its handler's
+	# backend calls may take in total (timeouts shrink and retries stop to
+	# fit); 0 disables. Bulk operations are exempt.
+	UPDATE_DEADLINE: float = 10.0
 
 	def validate(self):
 		if not self.TELEGRAM_TOKEN:
 			raise ValueError("TELEGRAM_TOKEN is required")
 		if not self.TELEGRAM_SECRET:
 			raise ValueError("TELEGRAM_SECRET is required")
+		if self.BOT_MODE not in ("polling", "webhook"):
+			raise ValueError("BOT_MODE must be 'polling' or 'webhook'")
+		if self.BOT_MODE == "webhook" and not self.WEBHOOK_URL:
+			raise ValueError("WEBHOOK_URL is required when BOT_MODE=webhook")
+		if bool(self.WEBHOOK_CERT) != bool(self.WEBHOOK_KEY):
+			raise ValueError("WEBHOOK_CERT and WEBHOOK_KEY must be set together")
 
 
 _CONFIG: Optional[Config] = None
@@ -34,12 +104,55 @@ def get_config() -> Config:
 		timeout = int(os.getenv("API_TIMEOUT", "5"))
 		admin = os.getenv("ADMIN_CHAT_ID")
 		admin_id = int(admin) if admin and admin.isdigit() else None
+		metrics_port = os.getenv("METRICS_PORT")
+		alert_chats = tuple(
+			int(chat_id) for chat_id in os.getenv("LOW_STOCK_ALERT_CHAT_IDS", "").replace(" ", "").split(",")
+			if chat_id.lstrip("-").isdigit()
+		)
+		if not alert_chats and admin_id is not None:
+			alert_chats = (admin_id,)
 		_CONFIG = Config(
 			TELEGRAM_TOKEN=token,
 			TELEGRAM_SECRET=secret,
 			API_BASE_URL=base,
 			API_TIMEOUT=timeout,
 			ADMIN_CHAT_ID=admin_id,
+			API_MAX_CONNECTIONS=int(os.getenv("API_MAX_CONNECTIONS", "100")),
+			API_MAX_KEEPALIVE=int(os.getenv("API_MAX_KEEPALIVE", "20")),
+			API_KEEPALIVE_EXPIRY=float(os.getenv("API_KEEPALIVE_EXPIRY", "30")),
+			API_HTTP2=os.getenv("API_HTTP2", "").strip().lower() in ("1", "true", "yes"),
+			API_POOL_WARM=int(os.getenv("API_POOL_WARM", "2")),
+			API_BREAKER_FAILURES=int(os.getenv("API_BREAKER_FAILURES", "5")),
+			API_BREAKER_RESET=float(os.getenv("API_BREAKER_RESET", "30")),
+			API_RETRY_BUDGET=float(os.getenv("API_RETRY_BUDGET", "0.2")),
+			API_CACHE_MAX_ENTRIES=int(os.getenv("API_CACHE_MAX_ENTRIES", "128")),
+			API_CACHE_MAX_BYTES=int(os.getenv("API_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+			BOT_MODE=os.getenv("BOT_MODE", "polling").strip().lower(),
+			WEBHOOK_LISTEN=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+			WEBHOOK_PORT=int(os.getenv("WEBHOOK_PORT", "8443")),
+			WEBHOOK_PATH=os.getenv("WEBHOOK_PATH", "telegram"),
+			WEBHOOK_URL=os.getenv("WEBHOOK_URL") or None,
+			WEBHOOK_SECRET_TOKEN=os.getenv("WEBHOOK_SECRET_TOKEN") or None,
+			WEBHOOK_CERT=os.getenv("WEBHOOK_CERT") or None,
+			WEBHOOK_KEY=os.getenv("WEBHOOK_KEY") or None,
+			USER_CACHE_TTL=float(os.getenv("USER_CACHE_TTL", "60")),
+			USER_CACHE_STALE_TTL=float(os.getenv("USER_CACHE_STALE_TTL", "300")),
+			INVENTORY_CACHE_TTL=float(os.getenv("INVENTORY_CACHE_TTL", "60")),
+			ROLE_CACHE_TTL=float(os.getenv("ROLE_CACHE_TTL", "300")),
+			RECHARGE_REQUEST_DEDUP_WINDOW=float(os.getenv("RECHARGE_REQUEST_DEDUP_WINDOW", "60")),
+			NOTIFICATION_STORE_PATH=os.getenv("NOTIFICATION_STORE_PATH", "data/notifications.sqlite3"),
+			NOTIFICATION_TTL=float(os.getenv("NOTIFICATION_TTL", str(30 * 24 * 3600))),
+			PERSISTENCE_PATH=os.getenv("PERSISTENCE_PATH", "data/persistence.sqlite3") or None,
+			PERSISTENCE_UPDATE_INTERVAL=float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "5")),
+			METRICS_LISTEN=os.getenv("METRICS_LISTEN", "127.0.0.1"),
+			METRICS_PORT=int(metrics_port) if metrics_port and metrics_port.isdigit() else None,
+			LOW_STOCK_ALERT_CHAT_IDS=alert_chats,
+			LOW_STOCK_CHECK_INTERVAL=float(os.getenv("LOW_STOCK_CHECK_INTERVAL", "300")),
+			UPDATE_CONCURRENCY=int(os.getenv("UPDATE_CONCURRENCY", "32")),
+			UPDATE_CHAT_RATE=float(os.getenv("UPDATE_CHAT_RATE", "2")),
+			UPDATE_CHAT_BURST=int(os.getenv("UPDATE_CHAT_BURST", "10")),
+			UPDATE_CHAT_QUEUE=int(os.getenv("UPDATE_CHAT_QUEUE", "20")),
+			UPDATE_DEADLINE=float(os.getenv("UPDATE_DEADLINE", "10")),
 		)
 	return _CONFIG
 
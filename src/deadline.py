@@ -0,0 +1,85 @@
+"""Per-update time budget.
+
+safe_handler sets a deadline when it starts handling an update, counted
+from the update's arrival (recorded by the update processor before it
+waits for a free slot); anything awaited from there (services, the API
+client) sees it through a contextvar and can size its own timeouts to
+fit, instead of spending retries on an answer nobody is waiting for any
+more.
+
+Work shared between updates (a coalesced GET, a shared list fetch) must
+not run on whichever update happened to start it: start_shared() runs
+it with no deadline, and each caller waits for it with wait_shared(),
+which gives up at that caller's own deadline.
+"""
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+# What a call that ran out of time returns, with status 504.
+OUT_OF_TIME = {"detail": "The server is taking too long. Please try again."}
+
+# Absolute time.monotonic() value, or None for "no deadline".
+_DEADLINE: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+# time.monotonic() at which the update being handled arrived, or None
+# when nothing recorded it (a handler called directly).
+_ARRIVED: contextvars.ContextVar = contextvars.ContextVar("update_arrived", default=None)
+
+
+def mark_arrival(at: Optional[float] = None) -> contextvars.Token:
+    """Record that the current update arrived `at` (default: now)."""
+    return _ARRIVED.set(time.monotonic() if at is None else at)
+
+
+def reset_arrival(token: contextvars.Token):
+    _ARRIVED.reset(token)
+
+
+def arrived_at() -> Optional[float]:
+    return _ARRIVED.get()
+
+
+def set_deadline(seconds: Optional[float], since: Optional[float] = None) -> contextvars.Token:
+    """Give the current task `seconds` from `since` (a time.monotonic()
+    value, default now; None or <= 0 seconds: no deadline); pass the
+    returned token to reset_deadline when done."""
+    if not seconds or seconds <= 0:
+        return _DEADLINE.set(None)
+    return _DEADLINE.set((time.monotonic() if since is None else since) + seconds)
+
+
+def reset_deadline(token: contextvars.Token):
+    _DEADLINE.reset(token)
+
+
+def time_remaining() -> Optional[float]:
+    """Seconds left before the current deadline (may be negative), or
+    None when there is none."""
+    deadline = _DEADLINE.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def _without_deadline(coroutine: Awaitable):
+    # The task runs in a copy of its starter's context; clear it there.
+    _DEADLINE.set(None)
+    return await coroutine
+
+
+def start_shared(coroutine: Awaitable) -> asyncio.Task:
+    """Start `coroutine` as a task free of the current deadline, for work
+    other updates may end up waiting on too."""
+    return asyncio.ensure_future(_without_deadline(coroutine))
+
+
+async def wait_shared(task: asyncio.Future, on_timeout: Callable[[], Any]):
+    """Wait for a shared task until the current deadline, then return
+    on_timeout() and leave the task running for anyone else. Shielded:
+    a waiter that goes away doesn't cancel it either."""
+    remaining = time_remaining()
+    if remaining is None:
+        return await asyncio.shield(task)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), max(remaining, 0))
+    except asyncio.TimeoutError:
+        return on_timeout()
@@ -1,19 +1,166 @@
+import atexit
+import contextvars
+import copy
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 
-def setup_logging(level=logging.INFO, logfile=None):
+# Extra fields (passed via `extra=`) the JSON formatter lifts to top level.
+STRUCTURED_FIELDS = ("chat_id", "correlation_id", "handler", "path", "method", "status", "latency_ms", "suppressed")
+
+# Fields bound once per update (see bind_log_context) and stamped on every
+# record logged while handling it, from any module.
+_LOG_CONTEXT: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+
+def bind_log_context(**fields) -> contextvars.Token:
+    """Bind fields (chat_id, correlation_id, ...) for the current task;
+    pass the returned token to reset_log_context when done."""
+    return _LOG_CONTEXT.set({**_LOG_CONTEXT.get(), **fields})
+
+
+def reset_log_context(token: contextvars.Token):
+    _LOG_CONTEXT.reset(token)
+
+
+def get_log_context() -> dict:
+    return _LOG_CONTEXT.get()
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound log context onto each record (without overriding
+    an explicit `extra=`), defaulting to "-" so text formats always work."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _LOG_CONTEXT.get()
+        for field in ("chat_id", "correlation_id"):
+            if getattr(record, field, None) is None:
+                setattr(record, field, context.get(field, "-"))
+        return True
+
+
+class SuccessLogSampler:
+    """Decides which routine success lines get logged.
+
+    Each message template gets at most `per_minute` lines per minute (0 =
+    no cap), and of those a `rate` fraction is kept. The next line that
+    does get through carries how many were dropped in between, as the
+    `suppressed` field. Only used through log_success — warnings and
+    errors never pass through here.
+    """
+
+    def __init__(self, rate: float = 1.0, per_minute: int = 0, clock=time.monotonic, rand=random.random):
+        self.rate = rate
+        self.per_minute = per_minute
+        self._clock = clock
+        self._random = rand
+        self._windows: dict = {}
+        self._suppressed: dict = {}
+
+    def allow(self, key) -> bool:
+        if self.per_minute:
+            now = self._clock()
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 60:
+                if len(self._windows) > 1024:
+                    self._windows.clear()
+                window = self._windows[key] = [now, 0]
+            if window[1] >= self.per_minute:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            window[1] += 1
+        if self.rate < 1 and self._random() >= self.rate:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        return True
+
+    def take_suppressed(self, key) -> int:
+        return self._suppressed.pop(key, 0)
+
+
+SUCCESS_SAMPLER = SuccessLogSampler()
+
+
+def log_success(logger, msg, *args, **kwargs):
+    """Log a routine success line at INFO, subject to SUCCESS_SAMPLER."""
+    if not logger.isEnabledFor(logging.INFO) or not SUCCESS_SAMPLER.allow(msg):
+        return
+    suppressed = SUCCESS_SAMPLER.take_suppressed(msg)
+    if suppressed:
+        kwargs["extra"] = {**kwargs.get("extra", {}), "suppressed": suppressed}
+    logger.info(msg, *args, **kwargs)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, any of
+    STRUCTURED_FIELDS set on the record, and the traceback if there is one."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _BackgroundQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock `prepare()` formats the whole record — traceback included —
+    on the calling thread. Here only `msg % args` is resolved up front (so
+    later mutation of an argument can't change the message); exc_info is
+    passed through for the listener's handlers to format.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_LISTENER = None
+_QUEUE_HANDLER = None
+
+
+def setup_logging(level=logging.INFO, logfile=None, fmt=None):
+    """Route all logging through a queue to a background thread.
+
+    The root logger only gets a QueueHandler, so a log call from the event
+    loop is a queue put; a QueueListener thread does the formatting, the
+    console write and the file write/rotation. `fmt` is "text" (default)
+    or "json" (see JsonFormatter); LOG_FORMAT sets it from the environment.
+    LOG_SUCCESS_SAMPLE_RATE / LOG_SUCCESS_PER_MINUTE configure
+    SUCCESS_SAMPLER.
+    """
+    global _LISTENER, _QUEUE_HANDLER
     root = logging.getLogger()
     root.setLevel(level)
 
-    fmt = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
-    formatter = logging.Formatter(fmt)
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).strip().lower()
+    if fmt == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s [%(name)s] [%(correlation_id)s] %(message)s")
 
+    handlers = []
     ch = logging.StreamHandler()
     ch.setLevel(level)
     ch.setFormatter(formatter)
-    root.addHandler(ch)
+    handlers.append(ch)
 
     if logfile is None:
         logdir = os.getenv("LOG_DIR")
@@ -25,7 +172,36 @@ def setup_logging(level=logging.INFO, logfile=None):
         fh = RotatingFileHandler(logfile, maxBytes=10 * 1024 * 1024, backupCount=3)
         fh.setFormatter(formatter)
         fh.setLevel(level)
-        root.addHandler(fh)
+        handlers.append(fh)
+
+    SUCCESS_SAMPLER.rate = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "1"))
+    SUCCESS_SAMPLER.per_minute = int(os.getenv("LOG_SUCCESS_PER_MINUTE", "0"))
+
+    # Reconfiguring replaces the previous pipeline rather than stacking a second one.
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    _QUEUE_HANDLER = _BackgroundQueueHandler(log_queue)
+    # Filters run on the calling thread, where the update's context is visible.
+    _QUEUE_HANDLER.addFilter(ContextFilter())
+    root.addHandler(_QUEUE_HANDLER)
+    _LISTENER = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _LISTENER.start()
+    return _LISTENER
+
+
+def stop_logging():
+    """Detach the queue from the root logger, drain it and stop the
+    background thread."""
+    global _LISTENER, _QUEUE_HANDLER
+    if _QUEUE_HANDLER is not None:
+        logging.getLogger().removeHandler(_QUEUE_HANDLER)
+        _QUEUE_HANDLER = None
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
+
+atexit.register(stop_logging)
 
 
 def get_logger(name):
@@ -55,11 +231,24 @@ class LoggerManager:
         return get_logger(name)
 
     def get_context_logger(self, name: str, **extra):
-        """Return a LoggerAdapter that injects `extra` into log records."""
+        """Return a ContextLogger that injects `extra` into log records."""
         logger = get_logger(name)
-        return logging.LoggerAdapter(logger, extra)
+        return ContextLogger(logger, extra)
+
+
+class ContextLogger(logging.LoggerAdapter):
+    """LoggerAdapter that merges its fixed `extra` with any per-call
+    `extra=` (instead of replacing it) and adds `success()` for sampled
+    routine lines. The per-update chat_id/correlation_id come from
+    bind_log_context, not from here."""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+    def success(self, msg, *args, **kwargs):
+        log_success(self, msg, *args, **kwargs)
 
 
 # module-level convenience
 LOGGER_MANAGER = LoggerManager()
-
@@ -0,0 +1,116 @@
+import html
+from typing import Optional
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class LowStockMonitor:
+    """Polls the inventory on PTB's JobQueue and tells admins when items
+    newly go low on stock.
+
+    - One consolidated message per poll, listing every item that crossed
+      the threshold since the last one — never a message per item.
+    - Which items have been alerted on lives in the NotificationStore, so
+      a restart neither repeats an alert nor loses one; an item drops out
+      of that set once it's back above the threshold, and alerts again if
+      it crosses a second time.
+    - Each poll diffs only the low-stock set against the alerted set, and
+      skips even that when the shared inventory cache hasn't changed.
+    - The interval adapts: it snaps back to `interval` whenever stock
+      levels moved, and doubles (up to `max_interval`) while they don't or
+      while the backend is failing.
+
+    The inventory is fetched as `chat_ids[0]`, which must be an admin
+    chat; the alert goes to all of `chat_ids`.
+    """
+
+    JOB_NAME = "low_stock_alerts"
+
+    def __init__(self, user_service, store, notifier, chat_ids, interval: float = 300.0, max_interval: Optional[float] = None):
+        self.user_service = user_service
+        self.store = store
+        self.notifier = notifier
+        self.chat_ids = [int(chat_id) for chat_id in chat_ids]
+        self.interval = interval
+        self.max_interval = max_interval if max_interval is not None else interval * 6
+        self.next_interval = interval
+        self._alerted: Optional[set] = None
+        self._levels: Optional[dict] = None
+        self._generation: Optional[int] = None
+        self._settled = False
+
+    def start(self, job_queue, first: float = 10.0):
+        job_queue.run_once(self._run_job, when=first, name=self.JOB_NAME)
+
+    async def _run_job(self, context):
+        try:
+            await self.check(context.bot)
+        except Exception:
+            logger.exception("Low-stock check failed")
+            self._back_off()
+        context.job_queue.run_once(self._run_job, when=self.next_interval, name=self.JOB_NAME)
+
+    def _back_off(self):
+        self.next_interval = min(self.next_interval * 2, self.max_interval)
+
+    async def check(self, bot) -> list:
+        """One poll: returns the items alerted on (usually none)."""
+        if self._alerted is None:
+            self._alerted = self.store.low_stock_alerted()
+
+        status, items = await self.user_service.list_inventory(self.chat_ids[0])
+        if status != 200 or not isinstance(items, list):
+            logger.warning("Low-stock check got status=%s from the inventory", status)
+            self._back_off()
+            return []
+
+        inventory = self.user_service.inventory
+        if self._generation == inventory.generation and self._settled:
+            self._back_off()
+            return []
+        self._generation = inventory.generation
+
+        levels = {str(item.get("id")): item.get("current_stock") for item in items}
+        if levels == self._levels:
+            self._back_off()
+        else:
+            self.next_interval = self.interval
+        self._levels = levels
+
+        low = {str(item.get("id")): item for item in inventory.low_stock(items)}
+        newly_low = [item for item_id, item in low.items() if item_id not in self._alerted]
+        recovered = self._alerted - low.keys()
+
+        sent = []
+        if newly_low and await self._send_alert(bot, newly_low):
+            sent = newly_low
+        # An alert nobody received is retried even if nothing changes.
+        self._settled = bool(sent) or not newly_low
+        if sent or recovered:
+            added = [str(item.get("id")) for item in sent]
+            self.store.update_low_stock_alerted(added=added, removed=recovered)
+            self._alerted = (self._alerted - recovered) | set(added)
+        return sent
+
+    def _format_alert(self, items: list) -> str:
+        lines = [f"⚠️ <b>Low stock</b> — {len(items)} item(s) just went low:"]
+        for item in sorted(items, key=lambda item: str(item.get("name")).lower()):
+            lines.append(
+                f"• {html.escape(str(item.get('name')))}: {item.get('current_stock', 0):g} {html.escape(str(item.get('unit', '')))}"
+            )
+        lines.append("\nUse /stock to restock.")
+        return "\n".join(lines)
+
+    async def _send_alert(self, bot, items: list) -> bool:
+        text = self._format_alert(items)
+        results = await self.notifier.send_all(
+            self.chat_ids,
+            lambda chat_id: bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML"),
+        )
+        for result in results:
+            if not result.ok:
+                logger.error("Failed to send low-stock alert to chat_id=%s", result.target, exc_info=result.error)
+        # Counts as sent if anyone got it; otherwise the next poll retries.
+        return any(result.ok for result in results)
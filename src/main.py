@@ -1,13 +1,19 @@
 from .logger import setup_logging, get_logger
 from .config import get_config
-from .bot_app import BotApp
 import sys
 
 
 logger = get_logger(__name__)
 
 
-def main():
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if "--profile-startup" in argv:
+        from .startup_profile import profile_startup
+
+        profile_startup()
+        return
+
     # Setup logging
     setup_logging()
 
@@ -17,6 +23,10 @@ def main():
         logger.error(f"Invalid configuration: {e}. Exiting.")
         sys.exit(1)
 
+    # Imported only after the config checks out: telegram.ext and httpx
+    # are most of the cold start, and a bad config shouldn't wait on them.
+    from .bot_app import BotApp
+
     # Build and run using BotApp
     app = BotApp()
     logger.info("Starting bot (run_forever)...")
@@ -24,4 +34,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,249 @@
+import asyncio
+import bisect
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+from telegram.request import HTTPXRequest
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds. Handler and backend latencies sit in the tens-to-hundreds of ms.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter. `inc` is a dict update — cheap enough for the
+    hot path, and safe without locks since everything runs on one loop."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format.
+
+    Observations only bump one bucket; the cumulative counts are summed
+    at scrape time.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # per-bucket counts (+Inf last), sum
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _labels(self.labelnames, labels, f'le="{_number(bound)}"'), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _labels(self.labelnames, labels), cumulative
+
+
+class CallbackGauge:
+    """Gauge read at scrape time from `fn`, which returns {label tuple: value}.
+
+    For state that already lives somewhere else (circuit breakers, cache
+    sizes) so nothing has to be kept in sync on the hot path.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str], fn: Callable[[], dict]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            logger.exception("Failed to collect gauge %s", self.name)
+            return
+        for labels, value in values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Re-registering (e.g. a second BotApp in tests) replaces
+            # callback gauges but keeps accumulated counters.
+            if isinstance(metric, CallbackGauge):
+                self._metrics[metric.name] = metric
+                return metric
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str], fn: Callable[[], dict]) -> CallbackGauge:
+        return self._register(CallbackGauge(name, help, labelnames, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    "printbot_handler_duration_seconds", "Time spent in a bot handler.", ["handler"]
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    "printbot_handler_errors_total", "Handlers that raised an unhandled exception.", ["handler"]
+)
+BACKEND_LATENCY = REGISTRY.histogram(
+    "printbot_backend_request_duration_seconds", "Backend API round-trip time, per attempt.", ["method", "endpoint"]
+)
+BACKEND_RESPONSES = REGISTRY.counter(
+    "printbot_backend_requests_total",
+    "Backend API attempts by outcome: HTTP status, 'timeout', 'error', 'short_circuit' or 'deadline'.",
+    ["method", "endpoint", "status"],
+)
+BACKEND_RETRIES = REGISTRY.counter("printbot_backend_retries_total", "Backend API retries sent.", ["method", "endpoint"])
+BACKEND_TIMEOUTS = REGISTRY.counter("printbot_backend_timeouts_total", "Backend API attempts that timed out.", ["method", "endpoint"])
+UPDATE_QUEUE_WAIT = REGISTRY.histogram(
+    "printbot_update_queue_wait_seconds", "Time an update waited for its chat's turn and a free handler slot."
+)
+UPDATES_DROPPED = REGISTRY.counter(
+    "printbot_updates_dropped_total", "Updates dropped because their chat already had too many waiting."
+)
+TELEGRAM_LATENCY = REGISTRY.histogram(
+    "printbot_telegram_request_duration_seconds", "Bot API call round-trip time.", ["method"]
+)
+TELEGRAM_REQUESTS = REGISTRY.counter(
+    "printbot_telegram_requests_total", "Bot API calls by HTTP status ('error' if none came back).", ["method", "status"]
+)
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """PTB's default request backend, timing every Bot API call.
+
+    Sits under `context.bot`, so send_message, edit_message_text and every
+    other call the handlers make are counted without touching them.
+    """
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        status = "error"
+        try:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+            return status, payload
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - start, api_method)
+            TELEGRAM_REQUESTS.inc(api_method, str(status))
+
+
+class MetricsServer:
+    """Minimal HTTP server answering `GET /metrics` with `registry.render()`.
+
+    Plain asyncio streams so it runs on the bot's own event loop with no
+    extra dependency; anything other than /metrics gets a 404.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port 0 asks the OS for a free one; report what we actually got
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            parts = head.split(b"\r\n", 1)[0].split()
+            path = parts[1].split(b"?", 1)[0] if len(parts) > 1 else b""
+            if parts[:1] == [b"GET"] and path == b"/metrics":
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception("Failed to serve metrics request")
+        finally:
+            writer.close()
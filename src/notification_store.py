@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Callable, Optional
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class NotificationStore:
+    """Recharge request ID -> the admin messages announcing it, on disk.
+
+    Backed by one SQLite table in WAL mode, keyed by request_id, so a
+    lookup is a primary-key hit and memory stays flat however many
+    requests pile up unresolved. Rows older than `ttl` seconds are
+    ignored on read and purged every `EVICT_EVERY` writes (and on open).
+
+    Behaves like the dict it replaces (`store[request_id] = [...]`,
+    `store.pop(request_id, [])`, `request_id in store`), so the handlers
+    don't care where the mapping lives. `path=":memory:"` gives a
+    throwaway store for tests and for running without a data directory.
+
+    A second table records which inventory items a low-stock alert has
+    gone out for (see LowStockMonitor), so a restart doesn't repeat it.
+    """
+
+    EVICT_EVERY = 256
+
+    def __init__(self, path: str = ":memory:", ttl: float = 30 * 24 * 3600, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl = ttl
+        self._clock = clock
+        self._writes = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: commits survive a process crash; only an OS
+            # crash can lose the last few, which costs at most a stale message.
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS recharge_notifications ("
+            " request_id TEXT PRIMARY KEY,"
+            " messages TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS recharge_notifications_created_at ON recharge_notifications (created_at)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS low_stock_alerts (item_id TEXT PRIMARY KEY, alerted_at REAL NOT NULL)"
+        )
+        self.evict_expired()
+
+    def _cutoff(self) -> float:
+        return self._clock() - self.ttl
+
+    def evict_expired(self) -> int:
+        cur = self._db.execute("DELETE FROM recharge_notifications WHERE created_at < ?", (self._cutoff(),))
+        if cur.rowcount:
+            logger.info("Evicted %d expired recharge request notification entries", cur.rowcount)
+        return cur.rowcount
+
+    def get(self, request_id: str, default: Optional[list] = None) -> Optional[list]:
+        row = self._db.execute(
+            "SELECT messages FROM recharge_notifications WHERE request_id = ? AND created_at >= ?",
+            (str(request_id), self._cutoff()),
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def pop(self, request_id: str, default: Optional[list] = None) -> Optional[list]:
+        row = self._db.execute(
+            "DELETE FROM recharge_notifications WHERE request_id = ? RETURNING messages, created_at",
+            (str(request_id),),
+        ).fetchone()
+        if row is None or row[1] < self._cutoff():
+            return default
+        return json.loads(row[0])
+
+    def __getitem__(self, request_id: str) -> list:
+        messages = self.get(request_id)
+        if messages is None:
+            raise KeyError(request_id)
+        return messages
+
+    def __setitem__(self, request_id: str, messages: list):
+        self._db.execute(
+            "INSERT OR REPLACE INTO recharge_notifications (request_id, messages, created_at) VALUES (?, ?, ?)",
+            (str(request_id), json.dumps(messages, separators=(",", ":")), self._clock()),
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict_expired()
+
+    def __delitem__(self, request_id: str):
+        if self.pop(request_id) is None:
+            raise KeyError(request_id)
+
+    def __contains__(self, request_id) -> bool:
+        return self.get(request_id) is not None
+
+    def __len__(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM recharge_notifications WHERE created_at >= ?", (self._cutoff(),)
+        ).fetchone()[0]
+
+    # -- low-stock alerts ----------------------------------------------
+    def low_stock_alerted(self) -> set:
+        """IDs of the items currently covered by a sent low-stock alert."""
+        return {row[0] for row in self._db.execute("SELECT item_id FROM low_stock_alerts")}
+
+    def update_low_stock_alerted(self, added=(), removed=()):
+        """Record items just alerted on and forget ones back above the
+        threshold, in one transaction."""
+        now = self._clock()
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO low_stock_alerts (item_id, alerted_at) VALUES (?, ?)",
+                [(str(item_id), now) for item_id in added],
+            )
+            self._db.executemany("DELETE FROM low_stock_alerts WHERE item_id = ?", [(str(item_id),) for item_id in removed])
+
+    def close(self):
+        try:
+            self._db.close()
+        except Exception:
+            logger.exception("Failed to close the notification store cleanly")
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from telegram.error import RetryAfter
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class DeliveryResult:
+    """Outcome of one recipient's send/edit in a fan-out."""
+
+    target: Any
+    ok: bool
+    value: Any = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+
+
+class NotificationDispatcher:
+    """Sends the same Bot API call to many chats concurrently, within
+    Telegram's flood limits.
+
+    - at most `max_concurrency` calls in flight at once;
+    - a global token bucket refilling at `global_rate` calls/second with
+      room for `global_burst`, shared by every fan-out in the process —
+      burst + rate stays under Telegram's ~30 messages/second per bot in
+      any one-second window;
+    - at least `per_chat_interval` seconds between calls to the same chat
+      (~1/s per chat);
+    - `RetryAfter` pauses *all* sends for the requested time and retries
+      that recipient, up to `max_retries` times. Anything else is reported
+      for that recipient and never retried, since a send that timed out
+      may still have been delivered.
+
+    One instance should be shared per bot so the limits are global.
+    """
+
+    # Keep per-chat bookkeeping bounded; entries older than the interval
+    # carry no information anyway.
+    MAX_TRACKED_CHATS = 1024
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        global_rate: float = 25.0,
+        global_burst: int = 5,
+        per_chat_interval: float = 1.0,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+    ):
+        self.max_concurrency = max_concurrency
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._clock = clock
+        self._sleep = sleep
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tokens = float(global_burst)
+        self._refilled_at = clock()
+        self._paused_until = 0.0
+        self._chat_next_slot: dict = {}
+
+    def _reserve_global(self) -> float:
+        """Take one token from the global bucket; return how long to wait for it."""
+        now = self._clock()
+        self._tokens = min(self.global_burst, self._tokens + (now - self._refilled_at) * self.global_rate)
+        self._refilled_at = now
+        self._tokens -= 1
+        wait = 0.0 if self._tokens >= 0 else -self._tokens / self.global_rate
+        return max(wait, self._paused_until - now)
+
+    def _reserve_chat(self, chat_id) -> float:
+        now = self._clock()
+        slot = max(now, self._chat_next_slot.get(chat_id, 0.0))
+        self._chat_next_slot[chat_id] = slot + self.per_chat_interval
+        if len(self._chat_next_slot) > self.MAX_TRACKED_CHATS:
+            self._chat_next_slot = {c: t for c, t in self._chat_next_slot.items() if t > now}
+        return slot - now
+
+    async def _deliver(self, target, call: Callable[[Any], Awaitable], chat_id) -> DeliveryResult:
+        result = DeliveryResult(target=target, ok=False)
+        async with self._semaphore:
+            while True:
+                wait = max(self._reserve_chat(chat_id), self._reserve_global())
+                if wait > 0:
+                    await self._sleep(wait)
+                result.attempts += 1
+                try:
+                    result.value = await call(target)
+                    result.ok = True
+                    return result
+                except RetryAfter as exc:
+                    retry_after = float(exc.retry_after)
+                    self._paused_until = max(self._paused_until, self._clock() + retry_after)
+                    if result.attempts > self.max_retries:
+                        result.error = exc
+                        return result
+                    logger.warning("Flood limit hit sending to chat_id=%s; retrying in %ss", chat_id, retry_after)
+                except Exception as exc:
+                    result.error = exc
+                    return result
+
+    async def send_all(
+        self,
+        targets: Iterable,
+        call: Callable[[Any], Awaitable],
+        chat_key: Callable[[Any], Any] = str,
+    ) -> list[DeliveryResult]:
+        """Run `call(target)` for every target and return one DeliveryResult
+        per target, in the same order as `targets`.
+
+        `chat_key(target)` names the chat each call goes to, for the
+        per-chat limit — targets are plain chat IDs by default.
+        """
+        return list(await asyncio.gather(*(self._deliver(target, call, chat_key(target)) for target in targets)))
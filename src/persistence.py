@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import Callable, Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """Keeps ConversationHandler states and chat_data across restarts, in
+    one SQLite file (WAL mode).
+
+    - Writes are batched twice over: PTB only hands over changed chats and
+      conversations every `update_interval` seconds, and every change from
+      one such round is committed in a single transaction.
+    - chat_data is stored without the re-fetchable caches (keys ending in
+      `CACHE_SUFFIXES`, e.g. `recharge_all_users`) — only the small bits
+      of flow state. Handlers re-fetch a missing cache on demand.
+    - chat_data is loaded lazily: nothing at startup, each chat's row on
+      that chat's first update (`refresh_chat_data`).
+    - Anything older than `max_age` seconds is ignored and purged, so a
+      flow that would have timed out while the bot was down doesn't
+      resume hours later.
+
+    bot_data, user_data and callback_data aren't used by the bot and
+    aren't stored.
+    """
+
+    CACHE_SUFFIXES = ("_all_users", "_items")
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        update_interval: float = 5.0,
+        max_age: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.max_age = max_age
+        self._clock = clock
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (name, key))"
+        )
+        cutoff = self._cutoff()
+        self._db.execute("DELETE FROM chat_data WHERE updated_at < ?", (cutoff,))
+        self._db.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,))
+        self._loaded_chats: set = set()
+        # Pending writes for the next transaction: chat_id -> serialized
+        # data (None = delete), (name, key) -> serialized state (None = delete).
+        self._pending_chats: Dict[int, Optional[str]] = {}
+        self._pending_conversations: Dict[tuple, Optional[str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _cutoff(self) -> float:
+        return self._clock() - self.max_age
+
+    def _slim(self, data: dict) -> str:
+        return json.dumps(
+            {key: value for key, value in data.items() if not key.endswith(self.CACHE_SUFFIXES)},
+            separators=(",", ":"),
+            default=str,
+        )
+
+    def _schedule_write(self):
+        # PTB gathers one round's update_* calls together; a task created
+        # now runs after all of them, so the round becomes one transaction.
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self):
+        self._write()
+
+    def _write(self):
+        if not self._pending_chats and not self._pending_conversations:
+            return
+        chats, self._pending_chats = self._pending_chats, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        now = self._clock()
+        try:
+            with self._db:
+                self._db.execute("BEGIN")
+                for chat_id, data in chats.items():
+                    if data is None:
+                        self._db.execute("DELETE FROM chat_data WHERE chat_id = ?", (chat_id,))
+                    else:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO chat_data (chat_id, data, updated_at) VALUES (?, ?, ?)", (chat_id, data, now)
+                        )
+                for (name, key), state in conversations.items():
+                    if state is None:
+                        self._db.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+                    else:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO conversations (name, key, state, updated_at) VALUES (?, ?, ?, ?)",
+                            (name, key, state, now),
+                        )
+        except sqlite3.Error:
+            logger.exception("Failed to write %d chat_data and %d conversation changes", len(chats), len(conversations))
+
+    # -- chat_data -----------------------------------------------------
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        if chat_id in self._loaded_chats:
+            return
+        self._loaded_chats.add(chat_id)
+        row = self._db.execute(
+            "SELECT data FROM chat_data WHERE chat_id = ? AND updated_at >= ?", (chat_id, self._cutoff())
+        ).fetchone()
+        if row:
+            for key, value in json.loads(row[0]).items():
+                chat_data.setdefault(key, value)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._loaded_chats.add(chat_id)
+        self._pending_chats[chat_id] = self._slim(data)
+        self._schedule_write()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._pending_chats[chat_id] = None
+        self._schedule_write()
+
+    # -- conversations -------------------------------------------------
+    async def get_conversations(self, name: str) -> dict:
+        rows = self._db.execute(
+            "SELECT key, state FROM conversations WHERE name = ? AND updated_at >= ?", (name, self._cutoff())
+        ).fetchall()
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        state = None if new_state is None else json.dumps(new_state)
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_write()
+
+    # -- unused --------------------------------------------------------
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Called once on shutdown: write whatever is pending and close."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._write()
+        try:
+            self._db.close()
+        except Exception:
+            logger.exception("Failed to close the persistence database cleanly")
@@ -1,12 +1,24 @@
-from typing import Tuple, Optional, Any, Union
+import asyncio
+import csv
+import re
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Tuple, Optional, Any, Union
 
 from .api_client import APIClient
-from .logger import LOGGER_MANAGER
+from .notifications import NotificationDispatcher
+from .notification_store import NotificationStore
+from .logger import LOGGER_MANAGER, log_success
 from .config import get_config
+from .deadline import OUT_OF_TIME, start_shared, wait_shared
 
 
 EXPENSE_CATEGORIES = ("toner", "paper", "maintenance", "other")
 
+DUPLICATE_RECHARGE_REQUEST = "You already sent this request a moment ago; the admins have it."
+
 
 def validate_expense_input(category, amount) -> Tuple[bool, str, float, Optional[str]]:
     """Shared by UserService.create_expense (before hitting the backend)
@@ -28,41 +40,650 @@ def validate_expense_input(category, amount) -> Tuple[bool, str, float, Optional
     return True, normalized_category, a, None
 
 
+def validate_recharge_amount(amount) -> Tuple[bool, float, Optional[str]]:
+    """What counts as a valid recharge amount — shared by
+    UserService.recharge and parse_bulk_recharge."""
+    try:
+        a = float(amount)
+    except Exception:
+        return False, 0.0, "Amount must be a number"
+
+    if a <= 0:
+        return False, a, "Amount must be positive"
+
+    return True, a, None
+
+
+BULK_RECHARGE_MAX_ROWS = 500
+
+
+def parse_bulk_recharge(text: str) -> Tuple[list, list]:
+    """Parse a pasted list or CSV of `username,amount` rows.
+
+    Rows may be separated by commas, semicolons, tabs or spaces; blank
+    lines and a leading `username,amount` header are skipped. Every row
+    is checked up front — amount rules as in validate_recharge_amount, no
+    username twice — and returns ([(username, amount)], [error lines]).
+    Callers should only go ahead when the error list is empty.
+    """
+    rows, errors, seen = [], [], {}
+    lines = (line.replace(";", ",").replace("\t", ",") for line in str(text or "").splitlines())
+    for lineno, fields in enumerate(csv.reader(lines), start=1):
+        fields = [field.strip() for field in fields if field.strip()]
+        if len(fields) == 1:
+            fields = fields[0].split()
+        if not fields:
+            continue
+        if not rows and not errors and [f.lower() for f in fields] == ["username", "amount"]:
+            continue
+        if len(fields) != 2:
+            errors.append(f"Line {lineno}: expected `username,amount`")
+            continue
+
+        username, amount = fields
+        valid, a, error = validate_recharge_amount(amount)
+        if not valid:
+            errors.append(f"Line {lineno} ({username}): {error}")
+        elif username in seen:
+            errors.append(f"Line {lineno} ({username}): duplicate of line {seen[username]}")
+        else:
+            seen[username] = lineno
+            rows.append((username, a))
+
+    if len(rows) > BULK_RECHARGE_MAX_ROWS:
+        errors.append(f"At most {BULK_RECHARGE_MAX_ROWS} rows per bulk recharge (got {len(rows)})")
+    return rows, errors
+
+
+def normalize_search_text(value) -> str:
+    """Lower-case and strip accents, so "José" and "jose" compare equal."""
+    decomposed = unicodedata.normalize("NFKD", str(value or ""))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+_TOKEN_SPLIT = re.compile(r"[\s_.\-@]+")
+
+
+class UserSearchIndex:
+    """Precomputed search structure over a user list for the /recharge and
+    /adjust pickers.
+
+    Matching keeps the old semantics — the query is a substring of
+    "username name surname" — but the accent-folded haystacks and name
+    tokens are built once per fetched list, not per keystroke. Match
+    lists are memoized per n-gram/query (LRU-bounded), and a new query is
+    narrowed from the cached matches of its one-character-shorter prefix
+    rather than rescanning everyone, so typing a name one key at a time
+    only ever filters a shrinking set.
+
+    Results are ranked: exact username, then a username or name-token
+    prefix, then any other substring.
+    """
+
+    RANK_EXACT, RANK_PREFIX, RANK_SUBSTRING = range(3)
+    MAX_CACHED_QUERIES = 2048
+
+    def __init__(self, users: list):
+        self.users = users
+        self._usernames = []
+        self._haystacks = []
+        self._tokens = []
+        self._matches: "OrderedDict[str, list]" = OrderedDict()
+        # Names and surnames repeat a lot; fold each distinct one once.
+        folded: dict = {}
+
+        def fold(value) -> str:
+            key = value or ""
+            result = folded.get(key)
+            if result is None:
+                result = folded[key] = normalize_search_text(key)
+            return result
+
+        for user in users:
+            username = normalize_search_text(user.get("username", ""))
+            haystack = f"{username} {fold(user.get('name'))} {fold(user.get('surname'))}"
+            self._usernames.append(username)
+            self._haystacks.append(haystack)
+            self._tokens.append(tuple(t for t in _TOKEN_SPLIT.split(haystack) if t))
+
+    def rebind(self, users: list) -> "UserSearchIndex":
+        """Index over `users`, which must be the same users in the same
+        order with only non-searched fields (e.g. balances) changed; shares
+        this index's haystacks and memoized matches instead of rebuilding."""
+        index = UserSearchIndex.__new__(UserSearchIndex)
+        index.users = users
+        index._usernames = self._usernames
+        index._haystacks = self._haystacks
+        index._tokens = self._tokens
+        index._matches = self._matches
+        return index
+
+    def _cached(self, q: str):
+        matches = self._matches.get(q)
+        if matches is not None:
+            self._matches.move_to_end(q)
+        return matches
+
+    def _remember(self, q: str, matches: list):
+        self._matches[q] = matches
+        while len(self._matches) > self.MAX_CACHED_QUERIES:
+            self._matches.popitem(last=False)
+
+    def _matching(self, q: str) -> list:
+        """Indexes of users whose haystack contains `q` (len(q) >= 2)."""
+        matches = self._cached(q)
+        if matches is not None:
+            return matches
+
+        # Every user matching q also matches any prefix of q, so start from
+        # the longest prefix we already know the answer for.
+        start = len(q) - 1
+        while start >= 2 and self._cached(q[:start]) is None:
+            start -= 1
+        if start >= 2:
+            matches = self._matches[q[:start]]
+        else:
+            start = 2
+            haystacks = self._haystacks
+            gram = q[:2]
+            matches = [idx for idx, haystack in enumerate(haystacks) if gram in haystack]
+            self._remember(gram, matches)
+
+        haystacks = self._haystacks
+        for end in range(start + 1, len(q) + 1):
+            prefix = q[:end]
+            matches = [idx for idx in matches if prefix in haystacks[idx]]
+            self._remember(prefix, matches)
+            if not matches:
+                break
+        return matches
+
+    def _rank(self, idx: int, q: str) -> int:
+        username = self._usernames[idx]
+        if username == q:
+            return self.RANK_EXACT
+        if username.startswith(q) or any(token.startswith(q) for token in self._tokens[idx]):
+            return self.RANK_PREFIX
+        return self.RANK_SUBSTRING
+
+    def search(self, query: str, rank_limit: Optional[int] = None) -> list:
+        """Users matching `query`, best first.
+
+        Ranking is the only per-match cost left, so when there are more
+        than `rank_limit` matches they come back in directory order —
+        callers that only render a picker for small result sets don't need
+        thousands of them sorted.
+        """
+        q = normalize_search_text(query.strip())
+        if not q:
+            return self.users
+        if len(q) < 2:
+            matches = [idx for idx, haystack in enumerate(self._haystacks) if q in haystack]
+        else:
+            matches = self._matching(q)
+        if rank_limit is None or len(matches) <= rank_limit:
+            matches = sorted(matches, key=lambda idx: (self._rank(idx, q), self._usernames[idx]))
+        return [self.users[idx] for idx in matches]
+
+
+class SharedListCache:
+    """Process-wide cache of one backend list endpoint.
+
+    Every admin sees the same list, so one fetch can serve all of them:
+    it's fresh for `ttl` seconds, then served stale for up to `stale_ttl`
+    more while a single background refresh runs. Concurrent misses from
+    known admins share one in-flight fetch.
+
+    The backend is still the only thing that decides who's an admin, so a
+    chat is only served from the cache after one of its own fetches came
+    back 200 within the last `ttl` seconds — that bookkeeping is an LRU
+    capped at `max_chats` entries — and `revoke()` forgets a chat as soon
+    as any of its calls is refused. The returned list is shared; treat it
+    as read-only.
+
+    `generation` changes whenever the cached list is replaced or patched
+    (see _replace_item); `derived()` caches anything computed from it
+    until then.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        stale_ttl: float = 300.0,
+        max_chats: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+        logger=None,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_chats = max_chats
+        self._clock = clock
+        self.logger = logger or LOGGER_MANAGER.get_logger(self.__class__.__name__)
+        self._items: Optional[list] = None
+        self._fetched_at = 0.0
+        self._version = 0
+        self.generation = 0
+        self._memo: dict = {}
+        self._memo_generation = 0
+        self._authorized: "OrderedDict[Any, float]" = OrderedDict()
+        self._refresh: Optional[asyncio.Task] = None
+
+    def derived(self, key, items: list, build: Callable[[list], Any]):
+        """`build(items)`, computed once per generation when `items` is the
+        cached list (a list handed back uncached is just built)."""
+        if items is not self._items:
+            return build(items)
+        if self._memo_generation != self.generation:
+            self._memo = {}
+            self._memo_generation = self.generation
+        if key not in self._memo:
+            self._memo[key] = build(items)
+        return self._memo[key]
+
+    def _is_authorized(self, chat_id, now: float) -> bool:
+        authorized_at = self._authorized.get(chat_id)
+        if authorized_at is None or now - authorized_at >= self.ttl:
+            return False
+        self._authorized.move_to_end(chat_id)
+        return True
+
+    def revoke(self, chat_id):
+        """Stop serving `chat_id` from the cache until its own fetch
+        succeeds again."""
+        self._authorized.pop(chat_id, None)
+
+    def _authorize(self, chat_id, now: float):
+        self._authorized[chat_id] = now
+        self._authorized.move_to_end(chat_id)
+        while len(self._authorized) > self.max_chats:
+            self._authorized.popitem(last=False)
+
+    async def _load(self, chat_id, fetch) -> Tuple[int, Any]:
+        version = self._version
+        status, res = await fetch(chat_id)
+        now = self._clock()
+        if status == 200 and isinstance(res, list):
+            self._authorize(chat_id, now)
+            # An invalidation while this was in flight means the response
+            # may predate the change — hand it back, don't keep it.
+            if version == self._version:
+                # A 304 from the backend hands back the very list we hold;
+                # keep the generation so derived views stay memoized.
+                if res is not self._items:
+                    self.generation += 1
+                self._items = res
+                self._fetched_at = now
+        elif status in (401, 403):
+            self.revoke(chat_id)
+        return status, res
+
+    async def _shared_load(self, chat_id, fetch) -> Tuple[int, Any]:
+        if self._refresh is None or self._refresh.done():
+            self._refresh = start_shared(self._load(chat_id, fetch))
+        # Every waiter gives up at its own deadline; the fetch carries on.
+        status, res = await wait_shared(self._refresh, lambda: (504, dict(OUT_OF_TIME)))
+        if status in (401, 403):
+            # Whoever started the shared fetch lost access; that says
+            # nothing about this chat, so ask for it directly.
+            return await self._load(chat_id, fetch)
+        return status, res
+
+    def _refresh_in_background(self, chat_id, fetch):
+        if self._refresh is not None and not self._refresh.done():
+            return
+        self._refresh = start_shared(self._load(chat_id, fetch))
+        self._refresh.add_done_callback(self._log_refresh_failure)
+
+    def _log_refresh_failure(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            self.logger.error("Background %s refresh failed", self.__class__.__name__, exc_info=exc)
+
+    async def get(self, chat_id, fetch: Callable[[Any], Awaitable[Tuple[int, Any]]]) -> Tuple[int, Any]:
+        now = self._clock()
+        if not self._is_authorized(chat_id, now):
+            return await self._load(chat_id, fetch)
+
+        if self._items is not None:
+            age = now - self._fetched_at
+            if age < self.ttl:
+                return 200, self._items
+            if age < self.ttl + self.stale_ttl:
+                self._refresh_in_background(chat_id, fetch)
+                return 200, self._items
+
+        return await self._shared_load(chat_id, fetch)
+
+    def _replace_item(self, match: Callable[[dict], bool], changes: dict) -> Optional[int]:
+        """Swap in a copy of the cached list with the first item matching
+        `match` updated by `changes`; returns its position, or None (and
+        drops the list) when it isn't cached.
+
+        Never patches in place: the old list may be the API client's
+        cached response body, which a later 304 hands back as the
+        server's copy. Like invalidate(), a fetch already in flight may
+        predate the change, so its response isn't kept.
+        """
+        if self._items is None:
+            return None
+        position = next((i for i, item in enumerate(self._items) if match(item)), None)
+        if position is None:
+            self.invalidate()
+            return None
+        items = list(self._items)
+        items[position] = {**items[position], **changes}
+        self._version += 1
+        self.generation += 1
+        self._items = items
+        return position
+
+    def invalidate(self):
+        """Drop the cached list (e.g. after a change it can't patch in). Known
+        admins stay known; their next read just refetches."""
+        self._version += 1
+        self.generation += 1
+        self._items = None
+        self._refresh = None
+
+
+class UserDirectoryCache(SharedListCache):
+    """The shared `/telegram/users` list, plus search indexes over it."""
+
+    # Chats can still hold a list from before the last refresh, so keep a
+    # few indexes around instead of rebuilding on every alternate search.
+    MAX_INDEXES = 4
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._indexes: "OrderedDict[int, UserSearchIndex]" = OrderedDict()
+
+    def search_index(self, users: list) -> UserSearchIndex:
+        """Return the search index for `users`, building it on first use.
+
+        Keyed on list identity: the cache hands out one shared list per
+        fetch, so every search against that fetch reuses one index (the
+        index holds a reference, so the id can't be recycled meanwhile).
+        """
+        key = id(users)
+        index = self._indexes.get(key)
+        if index is None or index.users is not users:
+            index = UserSearchIndex(users)
+            self._indexes[key] = index
+            while len(self._indexes) > self.MAX_INDEXES:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(key)
+        return index
+
+    def find(self, username: str) -> Optional[dict]:
+        """The cached user with this username, if the list is cached."""
+        if self._items is None:
+            return None
+        return next((user for user in self._items if user.get("username") == username), None)
+
+    def apply_balance(self, username: str, balance: float) -> bool:
+        """Write a user's new balance into the cached list after a recharge
+        or adjustment. The search index only covers names, so it carries
+        over to the patched list instead of being rebuilt (which takes
+        ~100 ms per 10k users, on the event loop)."""
+        old = self._items
+        position = self._replace_item(lambda user: user.get("username") == username, {"balance": balance})
+        if position is None:
+            return False
+        index = self._indexes.get(id(old))
+        if index is not None and index.users is old:
+            self._indexes[id(self._items)] = index.rebind(self._items)
+            while len(self._indexes) > self.MAX_INDEXES:
+                self._indexes.popitem(last=False)
+        return True
+
+
+class InventoryCache(SharedListCache):
+    """The shared `/telegram/inventory` list.
+
+    A successful stock adjustment returns the item's new state, which
+    `apply_adjustment` writes into a copy of the cached list (bumping the
+    generation) instead of dropping the list. Lookups by id and the
+    low-stock subset are memoized per generation.
+    """
+
+    def by_id(self, items: list) -> dict:
+        return self.derived("by_id", items, lambda items: {str(item["id"]): item for item in items})
+
+    def low_stock(self, items: list) -> list:
+        return self.derived("low_stock", items, lambda items: [item for item in items if item.get("is_low_stock")])
+
+    def apply_adjustment(self, item_name: str, res) -> bool:
+        """Update the cached item from an adjust_stock response (into a
+        copy of the list, see _replace_item). Returns False (and drops the
+        list) when the item isn't cached."""
+        if self._items is None or not isinstance(res, dict):
+            return False
+        name = res.get("name") or item_name
+        item = next((item for item in self._items if item.get("name") == name), None)
+        if item is None:
+            self.invalidate()
+            return False
+        self._replace_item(lambda candidate: candidate is item, {key: value for key, value in res.items() if key in item})
+        return True
+
+
+class RoleCache:
+    """Per-chat answer of `/telegram/me`, so /start doesn't ask every time.
+
+    Only definite answers are kept — 200 (admin) and 403 (not an admin) —
+    for `ttl` seconds, in an LRU of at most `max_chats` chats. Any 401/403
+    on an admin call drops the chat's entry (see UserService), so a
+    revoked admin is re-checked on the next /start rather than after the
+    TTL.
+
+    Also remembers which command set was last pushed to each chat with
+    set_my_commands, so an unchanged menu isn't pushed again.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_chats: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self._clock = clock
+        self._roles: "OrderedDict[Any, Tuple[float, int, Any]]" = OrderedDict()
+        self._commands: "OrderedDict[Any, int]" = OrderedDict()
+
+    def get(self, chat_id) -> Optional[Tuple[int, Any]]:
+        entry = self._roles.get(chat_id)
+        if entry is None:
+            return None
+        fetched_at, status, res = entry
+        if self._clock() - fetched_at >= self.ttl:
+            del self._roles[chat_id]
+            return None
+        self._roles.move_to_end(chat_id)
+        return status, res
+
+    def put(self, chat_id, status: int, res):
+        if status not in (200, 403) or self.ttl <= 0:
+            self._roles.pop(chat_id, None)
+            return
+        self._roles[chat_id] = (self._clock(), status, res)
+        self._roles.move_to_end(chat_id)
+        while len(self._roles) > self.max_chats:
+            self._roles.popitem(last=False)
+
+    def invalidate(self, chat_id):
+        self._roles.pop(chat_id, None)
+
+    def commands_pushed(self, chat_id, digest: int) -> bool:
+        return self._commands.get(chat_id) == digest
+
+    def mark_commands_pushed(self, chat_id, digest: int):
+        self._commands[chat_id] = digest
+        self._commands.move_to_end(chat_id)
+        while len(self._commands) > self.max_chats:
+            self._commands.popitem(last=False)
+
+
+class Submission:
+    __slots__ = ("idempotency_key", "started_at", "task", "succeeded")
+
+    def __init__(self, idempotency_key: str, started_at: float):
+        self.idempotency_key = idempotency_key
+        self.started_at = started_at
+        self.task: Optional[asyncio.Future] = None
+        self.succeeded = False
+
+    def track(self, task: asyncio.Future):
+        """Follow `task` (which resolves to (status, body)); `succeeded` is
+        settled when it finishes, whoever is (or isn't) still awaiting it.
+        A task that was cancelled or raised counts as a failed attempt."""
+        self.task = task
+        task.add_done_callback(self._settle)
+
+    def _settle(self, task: asyncio.Future):
+        self.succeeded = not task.cancelled() and task.exception() is None and task.result()[0] == 201
+
+
+class RecentSubmissions:
+    """Short-window memory of side-effecting submissions, by caller key.
+
+    For `window` seconds after a submission:
+    - a repeat of one that succeeded (or is still in flight) is a
+      duplicate the caller should not send again;
+    - a repeat of one that failed goes out again under the same
+      idempotency key, so if the failure was a lost response the backend
+      recognizes the resubmission instead of acting twice.
+    Bounded to `max_entries` keys, oldest first out.
+    """
+
+    def __init__(self, window: float = 60.0, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[Any, Submission]" = OrderedDict()
+
+    def get(self, key) -> Optional[Submission]:
+        submission = self._entries.get(key)
+        if submission is not None and self._clock() - submission.started_at >= self.window:
+            del self._entries[key]
+            return None
+        return submission
+
+    def start(self, key) -> Submission:
+        previous = self.get(key)
+        submission = Submission(previous.idempotency_key if previous is not None else uuid.uuid4().hex, self._clock())
+        self._entries[key] = submission
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return submission
+
+
 class UserService:
-    def __init__(self, client: APIClient, logger=None):
+    def __init__(
+        self,
+        client: APIClient,
+        logger=None,
+        user_directory: Optional[UserDirectoryCache] = None,
+        inventory: Optional[InventoryCache] = None,
+        roles: Optional[RoleCache] = None,
+        recent_requests: Optional[RecentSubmissions] = None,
+    ):
         self.client = client
         self.logger = logger or LOGGER_MANAGER.get_logger(self.__class__.__name__)
+        self.user_directory = user_directory or UserDirectoryCache()
+        self.inventory = inventory or InventoryCache(stale_ttl=0.0)
+        self.roles = roles or RoleCache()
+        # (chat_id, username, amount) of recent /request_recharge submissions
+        self.recent_requests = recent_requests or RecentSubmissions()
+
+    def _log_result(self, status: int, msg: str, *args):
+        # Successes are routine and sampled (LOG_SUCCESS_*); anything else
+        # is always logged.
+        if 200 <= status < 300:
+            log_success(self.logger, msg, *args)
+        else:
+            self.logger.info(msg, *args)
+
+    def _check_access(self, chat_id: int, status: int):
+        # Losing access anywhere means the cached role is out of date, and
+        # the shared lists mustn't keep serving this chat either.
+        if status in (401, 403):
+            self.roles.invalidate(chat_id)
+            self.user_directory.revoke(chat_id)
+            self.inventory.revoke(chat_id)
 
     async def get_me(self, chat_id: int) -> Tuple[int, dict]:
+        cached = self.roles.get(chat_id)
+        if cached is not None:
+            return cached
         status, res = await self.client.get_me(chat_id)
-        self.logger.info("get_me chat_id=%s status=%s", chat_id, status)
+        self.roles.put(chat_id, status, res)
+        self._log_result(status, "get_me chat_id=%s status=%s", chat_id, status)
         return status, res
 
     async def list_users(self, chat_id: int) -> Tuple[int, Union[list, dict, Any]]:
-        status, res = await self.client.get_users(chat_id)
-        self.logger.info("list_users chat_id=%s status=%s", chat_id, status)
+        status, res = await self.user_directory.get(chat_id, self.client.get_users)
+        self._check_access(chat_id, status)
+        self._log_result(status, "list_users chat_id=%s status=%s", chat_id, status)
         return status, res
 
     async def get_user(self, chat_id: int, username: str) -> Tuple[int, dict]:
         status, res = await self.client.get_user(chat_id, username)
-        self.logger.info("get_user chat_id=%s username=%s status=%s", chat_id, username, status)
+        self._check_access(chat_id, status)
+        self._log_result(status, "get_user chat_id=%s username=%s status=%s", chat_id, username, status)
         return status, res
 
+    def _apply_balance(self, username: str, res, expected: Callable[[dict], float]):
+        """Patch a changed balance into the cached user list (keeping its
+        search index) rather than dropping both. Uses the balance in the
+        response, else `expected(cached_user)`."""
+        balance = res.get("balance") if isinstance(res, dict) else None
+        if not isinstance(balance, (int, float)):
+            cached = self.user_directory.find(username)
+            if cached is None:
+                self.user_directory.invalidate()
+                return
+            balance = expected(cached)
+        self.user_directory.apply_balance(username, float(balance))
+
     async def recharge(self, chat_id: int, username: str, amount) -> Tuple[int, dict]:
-        try:
-            a = float(amount)
-        except Exception:
+        valid, a, error = validate_recharge_amount(amount)
+        if not valid:
             self.logger.warning("Invalid recharge amount: %s by chat_id=%s", amount, chat_id)
-            return 400, {"detail": "Amount must be a number"}
-
-        if a <= 0:
-            self.logger.warning("Non-positive recharge amount: %s by chat_id=%s", amount, chat_id)
-            return 400, {"detail": "Amount must be positive"}
+            return 400, {"detail": error}
 
-        status, res = await self.client.recharge_user(chat_id, username, a)
-        self.logger.info("recharge chat_id=%s username=%s amount=%s status=%s", chat_id, username, a, status)
+        # One key per operation, sent on every retry: a retry after a lost
+        # response can't recharge twice.
+        status, res = await self.client.recharge_user(chat_id, username, a, idempotency_key=uuid.uuid4().hex)
+        self._check_access(chat_id, status)
+        if status == 200:
+            self._apply_balance(username, res, lambda user: float(user.get("balance") or 0) + a)
+        self._log_result(status, "recharge chat_id=%s username=%s amount=%s status=%s", chat_id, username, a, status)
         return status, res
 
+    # Recharges in flight at once for a bulk recharge.
+    BULK_RECHARGE_CONCURRENCY = 8
+
+    async def recharge_many(self, chat_id: int, rows: list) -> list:
+        """Recharge every (username, amount) row (see parse_bulk_recharge),
+        at most BULK_RECHARGE_CONCURRENCY at a time. Each row succeeds or
+        fails on its own — except that once the backend refuses the caller
+        (401/403), rows not yet sent are skipped and reported as refused
+        too. Returns (username, amount, status, res) per row, in order."""
+        semaphore = asyncio.Semaphore(self.BULK_RECHARGE_CONCURRENCY)
+        refused = None
+
+        async def _one(username, amount):
+            nonlocal refused
+            async with semaphore:
+                if refused is not None:
+                    return username, amount, *refused
+                status, res = await self.recharge(chat_id, username, amount)
+            if status in (401, 403) and refused is None:
+                refused = (status, res)
+            return username, amount, status, res
+
+        return list(await asyncio.gather(*(_one(username, amount) for username, amount in rows)))
+
     async def adjust(self, chat_id: int, username: str, amount) -> Tuple[int, dict]:
         try:
             a = float(amount)
@@ -74,8 +695,11 @@ class UserService:
             self.logger.warning("Negative adjust target: %s by chat_id=%s", amount, chat_id)
             return 400, {"detail": "Balance target cannot be negative"}
 
-        status, res = await self.client.adjust_balance(chat_id, username, a)
-        self.logger.info("adjust chat_id=%s username=%s amount=%s status=%s", chat_id, username, a, status)
+        status, res = await self.client.adjust_balance(chat_id, username, a, idempotency_key=uuid.uuid4().hex)
+        self._check_access(chat_id, status)
+        if status == 200:
+            self._apply_balance(username, res, lambda user: a)
+        self._log_result(status, "adjust chat_id=%s username=%s amount=%s status=%s", chat_id, username, a, status)
         return status, res
 
     async def request_recharge(
@@ -98,7 +722,26 @@ class UserService:
             self.logger.warning("Non-positive recharge request amount: %s by chat_id=%s", amount, chat_id)
             return 400, {"detail": "Amount must be positive"}
 
-        status, res = await self.client.create_recharge_request(
+        # A double tap or a resent command shouldn't file (and announce) a
+        # second request.
+        key = (chat_id, str(username).strip().lower(), round(a, 2))
+        while True:
+            previous = self.recent_requests.get(key)
+            if previous is None or previous.task is None:
+                break
+            if not previous.task.done():
+                # wait() neither re-raises the attempt's error nor cancels
+                # it if this caller goes away; look again afterwards, since
+                # a failed attempt may have been resubmitted meanwhile.
+                await asyncio.wait([previous.task])
+                continue
+            if previous.succeeded:
+                self.logger.info("Duplicate recharge request chat_id=%s username=%s amount=%s", chat_id, username, a)
+                return 409, {"detail": DUPLICATE_RECHARGE_REQUEST}
+            break
+
+        submission = self.recent_requests.start(key)
+        submission.track(asyncio.ensure_future(self.client.create_recharge_request(
             chat_id,
             username,
             a,
@@ -106,13 +749,19 @@ class UserService:
             telegram_username=telegram_username,
             telegram_first_name=telegram_first_name,
             telegram_last_name=telegram_last_name,
-        )
-        self.logger.info("request_recharge chat_id=%s username=%s amount=%s status=%s", chat_id, username, a, status)
+            idempotency_key=submission.idempotency_key,
+        )))
+        # Shielded: a caller that gives up mustn't cancel the request that
+        # double taps are waiting on.
+        status, res = await asyncio.shield(submission.task)
+        self._log_result(status, "request_recharge chat_id=%s username=%s amount=%s status=%s", chat_id, username, a, status)
         return status, res
 
     async def resolve_recharge_request(self, chat_id: int, request_id: str, action: str) -> Tuple[int, dict]:
         status, res = await self.client.resolve_recharge_request(chat_id, request_id, action)
-        self.logger.info(
+        self._check_access(chat_id, status)
+        self._log_result(
+            status,
             "resolve_recharge_request chat_id=%s request_id=%s action=%s status=%s",
             chat_id,
             request_id,
@@ -123,7 +772,9 @@ class UserService:
 
     async def resolve_product_purchase(self, chat_id: int, purchase_id: str, action: str) -> Tuple[int, dict]:
         status, res = await self.client.resolve_product_purchase(chat_id, purchase_id, action)
-        self.logger.info(
+        self._check_access(chat_id, status)
+        self._log_result(
+            status,
             "resolve_product_purchase chat_id=%s purchase_id=%s action=%s status=%s",
             chat_id,
             purchase_id,
@@ -133,8 +784,9 @@ class UserService:
         return status, res
 
     async def list_inventory(self, chat_id: int) -> Tuple[int, Union[list, dict, Any]]:
-        status, res = await self.client.get_inventory(chat_id)
-        self.logger.info("list_inventory chat_id=%s status=%s", chat_id, status)
+        status, res = await self.inventory.get(chat_id, self.client.get_inventory)
+        self._check_access(chat_id, status)
+        self._log_result(status, "list_inventory chat_id=%s status=%s", chat_id, status)
         return status, res
 
     async def adjust_stock(self, chat_id: int, item_name: str, delta) -> Tuple[int, dict]:
@@ -148,12 +800,34 @@ class UserService:
             self.logger.warning("Zero stock delta by chat_id=%s", chat_id)
             return 400, {"detail": "Amount cannot be zero"}
 
-        status, res = await self.client.adjust_stock(chat_id, item_name, d)
-        self.logger.info(
+        status, res = await self.client.adjust_stock(chat_id, item_name, d, idempotency_key=uuid.uuid4().hex)
+        self._check_access(chat_id, status)
+        if status == 200:
+            self.inventory.apply_adjustment(item_name, res)
+        self._log_result(
+            status,
             "adjust_stock chat_id=%s item_name=%s delta=%s status=%s", chat_id, item_name, d, status
         )
         return status, res
 
+    # Concurrent PATCHes per stock batch; the backend has no bulk endpoint.
+    STOCK_BATCH_CONCURRENCY = 4
+
+    async def adjust_stock_many(self, chat_id: int, adjustments: list) -> list:
+        """Apply several (item_name, delta) stock adjustments concurrently.
+
+        Each one is its own request and succeeds or fails on its own;
+        returns (item_name, delta, status, res) per adjustment, in order.
+        """
+        semaphore = asyncio.Semaphore(self.STOCK_BATCH_CONCURRENCY)
+
+        async def _one(item_name, delta):
+            async with semaphore:
+                status, res = await self.adjust_stock(chat_id, item_name, delta)
+            return item_name, delta, status, res
+
+        return list(await asyncio.gather(*(_one(item_name, delta) for item_name, delta in adjustments)))
+
     async def create_expense(self, chat_id: int, category, amount, description: str | None = None) -> Tuple[int, dict]:
         ok, normalized_category, a, error = validate_expense_input(category, amount)
         if not ok:
@@ -162,8 +836,12 @@ class UserService:
             )
             return 400, {"detail": error}
 
-        status, res = await self.client.create_expense(chat_id, normalized_category, a, description)
-        self.logger.info(
+        status, res = await self.client.create_expense(
+            chat_id, normalized_category, a, description, idempotency_key=uuid.uuid4().hex
+        )
+        self._check_access(chat_id, status)
+        self._log_result(
+            status,
             "create_expense chat_id=%s category=%s amount=%s status=%s", chat_id, normalized_category, a, status
         )
         return status, res
@@ -172,9 +850,38 @@ class UserService:
 def create_services(client: Optional[APIClient] = None):
     cfg = get_config()
     if client is None:
-        client = APIClient(base_url=cfg.API_BASE_URL, secret=cfg.TELEGRAM_SECRET, timeout=cfg.API_TIMEOUT)
-    user = UserService(client)
+        client = APIClient(
+            base_url=cfg.API_BASE_URL,
+            secret=cfg.TELEGRAM_SECRET,
+            timeout=cfg.API_TIMEOUT,
+            max_connections=cfg.API_MAX_CONNECTIONS,
+            max_keepalive_connections=cfg.API_MAX_KEEPALIVE,
+            keepalive_expiry=cfg.API_KEEPALIVE_EXPIRY,
+            http2=cfg.API_HTTP2,
+            breaker_failure_threshold=cfg.API_BREAKER_FAILURES,
+            breaker_reset_timeout=cfg.API_BREAKER_RESET,
+            retry_budget_ratio=cfg.API_RETRY_BUDGET,
+            cache_max_entries=cfg.API_CACHE_MAX_ENTRIES,
+            cache_max_bytes=cfg.API_CACHE_MAX_BYTES,
+        )
+    user_directory = UserDirectoryCache(ttl=cfg.USER_CACHE_TTL, stale_ttl=cfg.USER_CACHE_STALE_TTL)
+    inventory = InventoryCache(ttl=cfg.INVENTORY_CACHE_TTL, stale_ttl=0.0)
+    roles = RoleCache(ttl=cfg.ROLE_CACHE_TTL)
+    user = UserService(
+        client,
+        user_directory=user_directory,
+        inventory=inventory,
+        roles=roles,
+        recent_requests=RecentSubmissions(window=cfg.RECHARGE_REQUEST_DEDUP_WINDOW),
+    )
     return {
         "user": user,
         "client": client,
+        "user_directory": user_directory,
+        "inventory": inventory,
+        "roles": roles,
+        # One dispatcher per process, so Telegram's flood limits are
+        # tracked across every fan-out rather than per call.
+        "notifier": NotificationDispatcher(),
+        "notification_store": NotificationStore(cfg.NOTIFICATION_STORE_PATH, ttl=cfg.NOTIFICATION_TTL),
     }
@@ -0,0 +1,152 @@
+"""`python -m src.main --profile-startup`: where cold start time goes.
+
+Import times come from a child interpreter run with `-X importtime` (so
+they're measured from a clean module cache), grouped by top-level
+package; init times are measured in-process for the steps main() runs
+before the first update: config, BotApp() and build(). The SQLite stores
+BotApp() opens are pointed at a temporary directory, so profiling leaves
+no files behind.
+"""
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from typing import Callable, Optional
+
+ImportTiming = namedtuple("ImportTiming", "module self_us cumulative_us depth")
+
+# Stdlib and site modules are lumped together; they're not ours to trim.
+_OTHER = "(stdlib/other)"
+_TRACKED = ("src", "telegram", "httpx", "httpcore", "tornado", "dotenv", "certifi", "anyio", "h11")
+
+
+def parse_importtime(output: str) -> list:
+    """Parse `-X importtime` stderr into ImportTiming rows, in the order
+    Python printed them (children before their parent)."""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header row
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        timings.append(ImportTiming(stripped, int(fields[0]), int(fields[1]), depth))
+    return timings
+
+
+def breakdown_by_package(timings: list) -> dict:
+    """Self time (µs) summed per top-level package, largest first."""
+    totals: dict = {}
+    for timing in timings:
+        root = timing.module.split(".", 1)[0]
+        key = root if root in _TRACKED else _OTHER
+        totals[key] = totals.get(key, 0) + timing.self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+# What a normal start imports: main, then bot_app once the config is valid.
+STARTUP_MODULES = ("src.main", "src.bot_app")
+
+
+def measure_imports(modules=STARTUP_MODULES) -> list:
+    """Import `modules` in a fresh interpreter with `-X importtime`."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return parse_importtime(result.stderr)
+
+
+def _timed(step: Callable):
+    start = time.perf_counter()
+    value = step()
+    return value, (time.perf_counter() - start) * 1000
+
+
+# Stores BotApp() opens on disk; an empty value (disabled) is left alone.
+_STORE_PATHS = {"PERSISTENCE_PATH": "persistence.sqlite3", "NOTIFICATION_STORE_PATH": "notifications.sqlite3"}
+
+
+@contextlib.contextmanager
+def _scratch_stores():
+    """Point the SQLite stores at a temporary directory (removed on exit)
+    instead of the real ones under data/."""
+    saved = {name: os.environ.get(name) for name in _STORE_PATHS}
+    with tempfile.TemporaryDirectory(prefix="printbot-profile-") as scratch:
+        for name, filename in _STORE_PATHS.items():
+            if saved[name] != "":
+                os.environ[name] = os.path.join(scratch, filename)
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def _close_stores(bot):
+    if bot.persistence is not None:
+        asyncio.run(bot.persistence.flush())
+    store = bot.services.get("notification_store")
+    if store is not None:
+        store.close()
+
+
+def measure_init() -> dict:
+    """Milliseconds spent on each init step main() runs before polling.
+
+    Steps after a failing one are skipped (e.g. no token configured) and
+    the error is reported instead.
+    """
+    steps: dict = {}
+    bot = None
+    with _scratch_stores():
+        try:
+            from .config import get_config
+
+            cfg, steps["config"] = _timed(get_config)
+            _, steps["config.validate"] = _timed(cfg.validate)
+
+            from .bot_app import BotApp
+
+            bot, steps["BotApp()"] = _timed(BotApp)
+            _, steps["BotApp.build()"] = _timed(bot.build)
+        except Exception as e:
+            steps["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            if bot is not None:
+                _close_stores(bot)
+    return steps
+
+
+def format_report(timings: list, init_steps: dict, top: int = 10) -> str:
+    total_ms = sum(t.self_us for t in timings) / 1000
+    lines = [f"Imports: {total_ms:.1f} ms total ({len(timings)} modules)"]
+    for package, us in breakdown_by_package(timings).items():
+        lines.append(f"  {package:<16} {us / 1000:8.1f} ms")
+    lines.append(f"Slowest modules (self time, top {top}):")
+    for timing in sorted(timings, key=lambda t: t.self_us, reverse=True)[:top]:
+        lines.append(f"  {timing.module:<40} {timing.self_us / 1000:8.1f} ms")
+    lines.append("Init:")
+    for step, value in init_steps.items():
+        lines.append(f"  {step:<16} {value:8.1f} ms" if isinstance(value, float) else f"  {step}: {value}")
+    return "\n".join(lines)
+
+
+def profile_startup(out: Optional[Callable[[str], None]] = None) -> str:
+    report = format_report(measure_imports(), measure_init())
+    (out or print)(report)
+    return report
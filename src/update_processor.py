@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from .deadline import mark_arrival, reset_arrival
+from .logger import get_logger
+from .metrics import UPDATE_QUEUE_WAIT, UPDATES_DROPPED
+
+logger = get_logger(__name__)
+
+
+def _chat_key(update: object):
+    """Chat an update belongs to (the user for inline queries, which have
+    no chat); None for the rare update with neither."""
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, "effective_user", None)
+    return user.id if user is not None else None
+
+
+class FairUpdateProcessor(BaseUpdateProcessor):
+    """Runs updates concurrently across chats, but one at a time per chat.
+
+    - At most `concurrency` handlers run at once, across all chats.
+    - A chat's updates run strictly in arrival order, so conversation
+      flows never see two of their own updates mutate chat_data at once.
+    - Free slots go round-robin to the chats that have something queued,
+      so one busy chat can't starve the rest.
+    - Each chat has a token bucket (`chat_rate` updates per second, bursts
+      of `chat_burst`); a chat over its rate waits, and once it has
+      `max_chat_queue` updates waiting, further ones are dropped.
+
+    PTB's own semaphore (`max_concurrent_updates`) only bounds how many
+    updates can be admitted — queued or running — so a chat waiting its
+    turn doesn't hold one of the `concurrency` slots.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 32,
+        chat_rate: float = 2.0,
+        chat_burst: int = 10,
+        max_chat_queue: int = 20,
+        max_admitted: int = 4096,
+        max_buckets: int = 4096,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(max_admitted)
+        if concurrency < 1:
+            raise ValueError("concurrency must be a positive integer")
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chat_queue = max_chat_queue
+        self.max_buckets = max_buckets
+        self._clock = clock
+        self.running = 0
+        self.dropped = 0
+        # chat -> futures of its queued updates, oldest first
+        self._queues: dict = {}
+        # chats with queued updates and nothing running, in turn order
+        self._waiting: "OrderedDict[Any, None]" = OrderedDict()
+        self._active: set = set()
+        # chat -> [tokens, refilled_at]; an evicted chat just starts full again
+        self._buckets: "OrderedDict[Any, list]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "chats_waiting": len(self._waiting),
+            "dropped": self.dropped,
+        }
+
+    def _take_token(self, key, now: float) -> float:
+        """Take one of the chat's tokens; returns 0, or the seconds until
+        it will have one."""
+        if self.chat_rate <= 0:
+            return 0.0
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.chat_burst), now]
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        bucket[0] = min(float(self.chat_burst), bucket[0] + (now - bucket[1]) * self.chat_rate)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.chat_rate
+
+    def _dispatch(self):
+        now = self._clock()
+        wake = None
+        for key in list(self._waiting):
+            if self.running >= self.concurrency:
+                break
+            queue = self._queues[key]
+            while queue and queue[0][0].done():
+                queue.popleft()  # cancelled while waiting
+            if not queue:
+                del self._waiting[key]
+                del self._queues[key]
+                continue
+            delay = self._take_token(key, now)
+            if delay:
+                wake = delay if wake is None else min(wake, delay)
+                continue
+            future, _ = queue.popleft()
+            del self._waiting[key]
+            self._active.add(key)
+            self.running += 1
+            future.set_result(now)
+        if wake is not None:
+            self._schedule(wake)
+
+    def _schedule(self, delay: float):
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._timer is not None:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _release(self, key):
+        self.running -= 1
+        self._active.discard(key)
+        if self._queues.get(key):
+            # Back of the line: the other waiting chats go first.
+            self._waiting[key] = None
+        else:
+            self._queues.pop(key, None)
+        self._dispatch()
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        key = _chat_key(update)
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self.max_chat_queue:
+            self.dropped += 1
+            UPDATES_DROPPED.inc()
+            logger.warning("Dropping update %s: chat %s already has %s waiting", getattr(update, "update_id", "?"), key, len(queue))
+            coroutine.close()
+            return
+
+        # Handlers count their deadline from here, not from when they get
+        # a slot (see safe_handler).
+        arrival = mark_arrival()
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = self._clock()
+        queue.append((future, enqueued_at))
+        if key not in self._active:
+            self._waiting.setdefault(key, None)
+        self._dispatch()
+
+        try:
+            started_at = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(key)  # granted a slot, then cancelled
+            else:
+                future.cancel()
+                self._dispatch()
+            reset_arrival(arrival)
+            coroutine.close()
+            raise
+
+        UPDATE_QUEUE_WAIT.observe(started_at - enqueued_at)
+        try:
+            await coroutine
+        finally:
+            reset_arrival(arrival)
+            self._release(key)
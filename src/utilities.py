@@ -1,22 +1,48 @@
 import functools
-from .logger import LOGGER_MANAGER
+import time
+import uuid
+from .config import get_config
+from .deadline import arrived_at, reset_deadline, set_deadline
+from .logger import LOGGER_MANAGER, bind_log_context, log_success, reset_log_context
+from .metrics import HANDLER_ERRORS, HANDLER_LATENCY
 
 
 logger = LOGGER_MANAGER.get_logger(__name__)
 
 
+def _correlation_id(update) -> str:
+    """Telegram's update_id where there is one, so a log line can be
+    matched to the update; a random ID otherwise."""
+    update_id = getattr(update, "update_id", None)
+    return str(update_id) if isinstance(update_id, int) else uuid.uuid4().hex[:12]
+
+
+_CONFIGURED = object()
+
+
 class safe_handler:
     """Decorator class (descriptor) to wrap handlers.
 
     Implemented as a descriptor so it binds correctly when used on
     instance methods and also supports plain functions. It logs the
     update context and catches exceptions to keep the bot alive.
+
+    Each update also gets a deadline (UPDATE_DEADLINE seconds from its
+    arrival, see deadline.py) that backend calls made while handling it
+    respect;
+    `@safe_handler.with_deadline(seconds)` overrides it for handlers
+    that are expected to run long (None: no deadline).
     """
 
-    def __init__(self, func):
+    def __init__(self, func, deadline=_CONFIGURED):
         self.func = func
+        self.deadline = deadline
         functools.update_wrapper(self, func)
 
+    @classmethod
+    def with_deadline(cls, seconds):
+        return lambda func: cls(func, deadline=seconds)
+
     def __get__(self, instance, owner):
         # When accessed on an instance, return a partial that injects the instance
         if instance is None:
@@ -41,6 +67,12 @@ class safe_handler:
 
         chat_id = None
         cmd = None
+        start = time.perf_counter()
+        log_context = None
+        deadline = get_config().UPDATE_DEADLINE if self.deadline is _CONFIGURED else self.deadline
+        # Counted from arrival: time spent queued behind the chat's earlier
+        # updates has already been spent from the user's point of view.
+        deadline_token = set_deadline(deadline, since=arrived_at())
         try:
             if update and getattr(update, "effective_chat", None):
                 chat = update.effective_chat
@@ -50,10 +82,17 @@ class safe_handler:
                 msg_obj = getattr(update, "message", None)
                 cmd = getattr(msg_obj, "text", None) if msg_obj is not None else None
 
-            logger.info("Handling %s for chat_id=%s", self.func.__name__, chat_id)
+            # Everything logged while this update is handled — services,
+            # API client — carries its chat_id and correlation ID.
+            log_context = bind_log_context(chat_id=chat_id, correlation_id=_correlation_id(update))
+            log_success(logger, "Handling %s for chat_id=%s", self.func.__name__, chat_id, extra={"handler": self.func.__name__})
             return await self.func(*args, **kwargs)
         except Exception:
-            logger.exception("Unhandled exception in handler %s for chat_id=%s cmd=%s", self.func.__name__, chat_id, cmd)
+            HANDLER_ERRORS.inc(self.func.__name__)
+            logger.exception(
+                "Unhandled exception in handler %s for chat_id=%s cmd=%s", self.func.__name__, chat_id, cmd,
+                extra={"handler": self.func.__name__, "latency_ms": round((time.perf_counter() - start) * 1000, 1)},
+            )
             try:
                 if update and getattr(update, "effective_message", None):
                     await update.effective_message.reply_text(  # type: ignore
@@ -61,3 +100,8 @@ class safe_handler:
                     )
             except Exception:
                 logger.exception("Failed to notify user about handler error for chat_id=%s", chat_id)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, self.func.__name__)
+            if log_context is not None:
+                reset_log_context(log_context)
+            reset_deadline(deadline_token)
@@ -7,6 +7,8 @@ class FakeAPIClient:
     def __init__(self, response=(200, {})):
         self.response = response
         self.calls = []
+        # Idempotency keys sent with mutations, in call order.
+        self.idempotency_keys = []
 
     async def _record(self, name, *args, **kwargs):
         self.calls.append((name, args, kwargs))
@@ -21,10 +23,12 @@ class FakeAPIClient:
     async def get_user(self, chat_id, username):
         return await self._record("get_user", chat_id, username)
 
-    async def recharge_user(self, chat_id, username, amount):
+    async def recharge_user(self, chat_id, username, amount, idempotency_key=None):
+        self.idempotency_keys.append(idempotency_key)
         return await self._record("recharge_user", chat_id, username, amount)
 
-    async def adjust_balance(self, chat_id, username, amount):
+    async def adjust_balance(self, chat_id, username, amount, idempotency_key=None):
+        self.idempotency_keys.append(idempotency_key)
         return await self._record("adjust_balance", chat_id, username, amount)
 
     async def create_recharge_request(self, chat_id, username, amount, **kwargs):
@@ -39,10 +43,12 @@ class FakeAPIClient:
     async def get_inventory(self, chat_id):
         return await self._record("get_inventory", chat_id)
 
-    async def adjust_stock(self, chat_id, item_name, delta):
+    async def adjust_stock(self, chat_id, item_name, delta, idempotency_key=None):
+        self.idempotency_keys.append(idempotency_key)
         return await self._record("adjust_stock", chat_id, item_name, delta)
 
-    async def create_expense(self, chat_id, category, amount, description=None):
+    async def create_expense(self, chat_id, category, amount, description=None, idempotency_key=None):
+        self.idempotency_keys.append(idempotency_key)
         return await self._record("create_expense", chat_id, category, amount, description)
 
 
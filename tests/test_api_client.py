@@ -1,9 +1,14 @@
+import asyncio
 import logging
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
 
+import httpx
 import pytest
 
-from src.api_client import APIClient
+from src.api_client import APIClient, RetryPolicy
+from src.deadline import set_deadline, time_remaining
+from src.utilities import safe_handler
 
 
 def make_client():
@@ -66,11 +71,13 @@ async def test_adjust_stock_calls_expected_path():
     client = make_client()
     client._patch = AsyncMock(return_value=(200, {}))
 
-    status, res = await client.adjust_stock(123, "A4 Paper", -50.0)
+    status, res = await client.adjust_stock(123, "A4 Paper", -50.0, idempotency_key="op-1")
 
     assert status == 200
     client._patch.assert_awaited_once_with(
-        "/telegram/stock-adjust", json={"chat_id": "123", "item_name": "A4 Paper", "delta": -50.0}
+        "/telegram/stock-adjust",
+        json={"chat_id": "123", "item_name": "A4 Paper", "delta": -50.0},
+        headers={"Idempotency-Key": "op-1"},
     )
 
 
@@ -79,10 +86,622 @@ async def test_create_expense_calls_expected_path():
     client = make_client()
     client._post = AsyncMock(return_value=(201, {"success": True}))
 
-    status, res = await client.create_expense(123, "toner", 15.5, "cartridge")
+    status, res = await client.create_expense(123, "toner", 15.5, "cartridge", idempotency_key="op-1")
 
     assert status == 201
     client._post.assert_awaited_once_with(
         "/telegram/expenses",
         json={"chat_id": "123", "category": "toner", "amount": 15.5, "description": "cartridge"},
+        headers={"Idempotency-Key": "op-1"},
     )
+
+
+def make_transport_client(handler):
+    client = make_client()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+class TestRequestCoalescing:
+    @pytest.mark.asyncio
+    async def test_identical_concurrent_gets_share_one_call(self):
+        seen = []
+        release = asyncio.Event()
+
+        async def handler(request):
+            seen.append(request)
+            await release.wait()
+            return httpx.Response(200, json=[{"username": "alice"}])
+
+        client = make_transport_client(handler)
+        pending = asyncio.gather(*(client.get_users(123) for _ in range(3)))
+        await asyncio.sleep(0)
+        release.set()
+        results = await pending
+
+        assert len(seen) == 1
+        assert results == [(200, [{"username": "alice"}])] * 3
+        assert client.coalescing_stats() == {"hits": 2, "misses": 1, "in_flight": 0}
+
+    @pytest.mark.asyncio
+    async def test_different_bodies_are_not_coalesced(self):
+        seen = []
+
+        async def handler(request):
+            seen.append(request)
+            await asyncio.sleep(0)
+            return httpx.Response(200, json=[])
+
+        client = make_transport_client(handler)
+        await asyncio.gather(client.get_users(1), client.get_users(2))
+
+        assert len(seen) == 2
+        assert client.coalesce_hits == 0
+
+    @pytest.mark.asyncio
+    async def test_mutating_calls_are_never_coalesced(self):
+        seen = []
+
+        async def handler(request):
+            seen.append(request)
+            await asyncio.sleep(0)
+            return httpx.Response(200, json={})
+
+        client = make_transport_client(handler)
+        await asyncio.gather(client.recharge_user(1, "alice", 5.0), client.recharge_user(1, "alice", 5.0))
+
+        assert len(seen) == 2
+        assert client.coalescing_stats() == {"hits": 0, "misses": 0, "in_flight": 0}
+
+    @pytest.mark.asyncio
+    async def test_sequential_gets_each_go_out(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json=[])
+
+        client = make_transport_client(handler)
+        await client.get_inventory(1)
+        await client.get_inventory(1)
+
+        assert len(seen) == 2
+        assert client.coalesce_misses == 2
+
+
+class TestConnectionPool:
+    @pytest.mark.asyncio
+    async def test_warm_up_opens_requested_connections(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request.method)
+            return httpx.Response(404)
+
+        client = make_transport_client(handler)
+        await client.warm_up(3)
+
+        assert seen == ["HEAD", "HEAD", "HEAD"]
+
+    @pytest.mark.asyncio
+    async def test_warm_up_failure_is_only_logged(self, caplog):
+        def handler(request):
+            raise httpx.ConnectError("refused")
+
+        client = make_transport_client(handler)
+        with caplog.at_level(logging.WARNING):
+            await client.warm_up(1)
+
+        assert "warm-up failed" in caplog.text
+
+    def test_http2_falls_back_without_h2(self, monkeypatch, caplog):
+        monkeypatch.setattr("src.api_client._h2_available", lambda: False)
+
+        with caplog.at_level(logging.WARNING):
+            client = APIClient(base_url="http://example.test", secret="secret", http2=True)
+
+        assert client.http2 is False
+        assert "h2" in caplog.text
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_resilient_client(handler, clock=None, **kwargs):
+    kwargs.setdefault("backoff", 0)
+    client = APIClient(base_url="http://example.test", secret="secret", clock=clock or FakeClock(), **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+class TestCircuitBreaker:
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast_without_calling_backend(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            raise httpx.ConnectError("refused")
+
+        client = make_resilient_client(handler, retries=0, breaker_failure_threshold=3)
+        for _ in range(3):
+            await client.get_inventory(1)
+        status, res = await client.get_inventory(1)
+
+        assert len(seen) == 3
+        assert status == 503
+        assert res == {"detail": "Could not reach the server. Please try again later."}
+        assert client.resilience_stats()["circuits"] == {"/telegram/inventory": "open"}
+        assert client.short_circuited == 1
+
+    @pytest.mark.asyncio
+    async def test_circuits_are_per_endpoint(self):
+        def handler(request):
+            if request.url.path == "/telegram/inventory":
+                return httpx.Response(502, json={})
+            return httpx.Response(200, json=[])
+
+        client = make_resilient_client(handler, retries=0, breaker_failure_threshold=1)
+        await client.get_inventory(1)
+        status, _ = await client.get_user(1, "alice")
+
+        assert status == 200
+        assert client.resilience_stats()["circuits"] == {"/telegram/inventory": "open", "/telegram/user": "closed"}
+
+    @pytest.mark.asyncio
+    async def test_half_open_probe_closes_circuit_on_success(self):
+        clock = FakeClock()
+        healthy = False
+
+        def handler(request):
+            return httpx.Response(200, json=[]) if healthy else httpx.Response(503, json={})
+
+        client = make_resilient_client(handler, clock=clock, retries=0, breaker_failure_threshold=1, breaker_reset_timeout=30)
+        await client.get_inventory(1)
+        assert client.resilience_stats()["circuits"]["/telegram/inventory"] == "open"
+
+        clock.now = 30
+        assert client.resilience_stats()["circuits"]["/telegram/inventory"] == "half_open"
+        healthy = True
+        status, _ = await client.get_inventory(1)
+
+        assert status == 200
+        assert client.resilience_stats()["circuits"]["/telegram/inventory"] == "closed"
+
+    @pytest.mark.asyncio
+    async def test_probe_that_raises_unexpectedly_frees_its_slot(self):
+        clock = FakeClock()
+        outcome = "503"
+
+        def handler(request):
+            if outcome == "boom":
+                raise httpx.InvalidURL("bad url")
+            return httpx.Response(503, json={}) if outcome == "503" else httpx.Response(200, json=[])
+
+        client = make_resilient_client(handler, clock=clock, retries=0, breaker_failure_threshold=1, breaker_reset_timeout=30)
+        await client.get_inventory(1)
+        clock.now = 30
+        outcome = "boom"
+        with pytest.raises(httpx.InvalidURL):
+            await client.get_inventory(1)
+
+        assert client.resilience_stats()["circuits"]["/telegram/inventory"] == "half_open"
+        outcome = "200"
+        status, _ = await client.get_inventory(1)
+
+        assert status == 200
+        assert client.resilience_stats()["circuits"]["/telegram/inventory"] == "closed"
+
+    @pytest.mark.asyncio
+    async def test_straggler_from_before_the_circuit_opened_does_not_move_it(self):
+        clock = FakeClock()
+        gates = {}
+        seen = []
+
+        async def handler(request):
+            user = request.url.path.rsplit("/", 1)[-1]
+            seen.append(user)
+            gate = gates.get(user)
+            if gate is not None:
+                await gate.wait()
+                return httpx.Response(gate.status, json={})
+            return httpx.Response(503, json={})
+
+        def gated(user, status):
+            gate = gates[user] = asyncio.Event()
+            gate.status = status
+            return gate
+
+        client = make_resilient_client(handler, clock=clock, retries=0, breaker_failure_threshold=1, breaker_reset_timeout=30)
+        slow_ok = gated("slow_ok", 200)
+        slow_fail = gated("slow_fail", 503)
+        stragglers = [asyncio.ensure_future(client.get_user(1, name)) for name in ("slow_ok", "slow_fail")]
+        await asyncio.sleep(0.01)
+        await client.get_user(1, "trip")
+        assert client.resilience_stats()["circuits"]["/telegram/user"] == "open"
+
+        # A success sent before the circuit opened doesn't close it.
+        slow_ok.set()
+        await stragglers[0]
+        assert client.resilience_stats()["circuits"]["/telegram/user"] == "open"
+
+        clock.now = 30
+        probe_gate = gated("probe", 200)
+        probe = asyncio.ensure_future(client.get_user(1, "probe"))
+        await asyncio.sleep(0.01)
+        # Nor does a failure sent before it opened free the probe's slot.
+        slow_fail.set()
+        await stragglers[1]
+        assert (await client.get_user(1, "second_probe"))[0] == 503
+        assert "second_probe" not in seen
+
+        probe_gate.set()
+        assert (await probe)[0] == 200
+        assert client.resilience_stats()["circuits"]["/telegram/user"] == "closed"
+
+    @pytest.mark.asyncio
+    async def test_failed_probe_reopens_circuit(self):
+        clock = FakeClock()
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(503, json={})
+
+        client = make_resilient_client(handler, clock=clock, retries=3, breaker_failure_threshold=1, breaker_reset_timeout=30)
+        await client.get_inventory(1)
+        clock.now = 30
+        await client.get_inventory(1)
+        status, _ = await client.get_inventory(1)
+
+        # One call to trip the breaker, one probe, and the probe's retry
+        # is refused by the re-opened circuit.
+        assert len(seen) == 2
+        assert status == 503
+        assert client.resilience_stats()["circuits"]["/telegram/inventory"] == "open"
+
+    @pytest.mark.asyncio
+    async def test_4xx_does_not_count_as_failure(self):
+        def handler(request):
+            return httpx.Response(403, json={"detail": "nope"})
+
+        client = make_resilient_client(handler, breaker_failure_threshold=1)
+        await client.get_inventory(1)
+        status, _ = await client.get_inventory(1)
+
+        assert status == 403
+        assert client.resilience_stats()["circuits"]["/telegram/inventory"] == "closed"
+
+
+class TestRetryBudget:
+    @pytest.mark.asyncio
+    async def test_retries_a_transient_failure(self):
+        responses = iter([httpx.Response(502, json={}), httpx.Response(200, json=[{"username": "alice"}])])
+
+        client = make_resilient_client(lambda request: next(responses))
+        status, res = await client.get_users(1)
+
+        assert status == 200
+        assert client.retries_sent == 1
+
+    @pytest.mark.asyncio
+    async def test_budget_caps_retries_during_an_outage(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(503, json={})
+
+        client = make_resilient_client(handler, retries=3, retry_budget_ratio=0.25, breaker_failure_threshold=1000)
+        client.retry_budget._balance = 0
+        for chat_id in range(20):
+            await client.get_users(chat_id)
+
+        # 20 requests earn 5 retries at a 25% budget, not 20 * 3.
+        assert len(seen) == 25
+        assert client.retries_sent == 5
+        assert client.retries_denied == 20  # every request ends on a denied retry
+
+    @pytest.mark.asyncio
+    async def test_backoff_is_jittered_below_the_exponential_cap(self, monkeypatch):
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+
+        monkeypatch.setattr("src.api_client.asyncio.sleep", fake_sleep)
+        monkeypatch.setattr("src.api_client.random.uniform", lambda low, high: high / 2)
+
+        client = make_resilient_client(lambda request: httpx.Response(503, json={}), retries=3, backoff=0.4)
+        await client.get_users(1)
+
+        assert sleeps == [0.2, 0.4, 0.8]
+
+
+class TestConditionalGets:
+    @pytest.mark.asyncio
+    async def test_not_modified_reuses_the_cached_body(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, json=[{"id": 1, "current_stock": 3}], headers={"ETag": '"v1"'})
+
+        client = make_resilient_client(handler)
+        first = await client.get_inventory(1)
+        second = await client.get_inventory(1)
+
+        assert "If-None-Match" not in seen[0].headers
+        assert seen[1].headers["If-None-Match"] == '"v1"'
+        assert second == (200, [{"id": 1, "current_stock": 3}])
+        assert second[1] is first[1]
+        assert client.cache_stats()["not_modified"] == 1
+
+    @pytest.mark.asyncio
+    async def test_validators_are_kept_per_chat(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json=[], headers={"Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"})
+
+        client = make_resilient_client(handler)
+        await client.get_users(1)
+        await client.get_users(2)
+
+        assert "If-Modified-Since" not in seen[1].headers
+
+    @pytest.mark.asyncio
+    async def test_error_response_drops_the_entry(self):
+        responses = [
+            httpx.Response(200, json=[], headers={"ETag": '"v1"'}),
+            httpx.Response(403, json={"detail": "Forbidden"}),
+            httpx.Response(200, json=[]),
+        ]
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return responses[len(seen) - 1]
+
+        client = make_resilient_client(handler)
+        for _ in range(3):
+            await client.get_users(1)
+
+        assert "If-None-Match" not in seen[2].headers
+        assert client.cache_stats()["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cache_is_bounded_by_entries_and_bytes(self):
+        def handler(request):
+            return httpx.Response(200, json={"pad": "x" * 100}, headers={"ETag": '"v"'})
+
+        client = make_resilient_client(handler, cache_max_entries=3)
+        for chat_id in range(5):
+            await client.get_me(chat_id)
+        assert client.cache_stats()["entries"] == 3
+        assert client.cache_stats()["evictions"] == 2
+
+        small = make_resilient_client(handler, cache_max_bytes=200)
+        await small.get_me(1)
+        assert small.cache_stats() == {"entries": 0, "bytes": 0, "not_modified": 0, "evictions": 0}
+
+
+class TestIdempotencyKey:
+    @pytest.mark.asyncio
+    async def test_retries_reuse_the_recharge_request_key(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            if len(seen) == 1:
+                raise httpx.ReadTimeout("slow")
+            return httpx.Response(201, json={"id": "r1"})
+
+        client = make_resilient_client(handler, retries=2)
+        status, _ = await client.create_recharge_request(1, "alice", 5.0)
+
+        assert status == 201
+        keys = [request.headers.get("Idempotency-Key") for request in seen]
+        assert len(keys) == 2 and keys[0] and keys[0] == keys[1]
+
+    @pytest.mark.asyncio
+    async def test_given_key_is_sent_as_is(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(201, json={})
+
+        client = make_resilient_client(handler)
+        await client.create_recharge_request(1, "alice", 5.0, idempotency_key="abc")
+        await client.create_recharge_request(1, "alice", 5.0)
+
+        assert seen[0].headers["Idempotency-Key"] == "abc"
+        assert seen[1].headers["Idempotency-Key"] != "abc"
+
+
+class TestRetryPolicy:
+    @pytest.mark.asyncio
+    async def test_unkeyed_mutation_is_not_retried_once_sent(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            if request.url.path == "/telegram/recharge":
+                raise httpx.ReadTimeout("slow")
+            return httpx.Response(503, json={})
+
+        client = make_resilient_client(handler, retries=3)
+        status, _ = await client.recharge_user(1, "alice", 5.0)
+        await client.adjust_balance(1, "alice", 5.0)
+
+        assert status == 503
+        assert len(seen) == 2
+
+    @pytest.mark.asyncio
+    async def test_unkeyed_mutation_is_retried_when_never_sent(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            if len(seen) == 1:
+                raise httpx.ConnectError("refused")
+            return httpx.Response(200, json={})
+
+        client = make_resilient_client(handler, retries=3)
+        status, _ = await client.recharge_user(1, "alice", 5.0)
+
+        assert status == 200
+        assert len(seen) == 2
+
+    @pytest.mark.asyncio
+    async def test_keyed_mutation_retries_with_the_same_key(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            if len(seen) == 1:
+                raise httpx.ReadTimeout("slow")
+            if len(seen) == 2:
+                return httpx.Response(502, json={})
+            return httpx.Response(200, json={})
+
+        client = make_resilient_client(handler, retries=3)
+        status, _ = await client.recharge_user(1, "alice", 5.0, idempotency_key="op-1")
+
+        assert status == 200
+        assert [request.headers["Idempotency-Key"] for request in seen] == ["op-1"] * 3
+
+    @pytest.mark.asyncio
+    async def test_policy_can_override_attempts_per_method(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(503, json={})
+
+        client = make_resilient_client(
+            handler, retries=3, retry_policies={"GET": RetryPolicy(after_send=True, retries=1)}
+        )
+        await client.get_users(1)
+
+        assert len(seen) == 2
+
+
+# Each test runs in its own task, so a deadline set in one can't leak
+# into the next.
+class TestDeadline:
+    @pytest.mark.asyncio
+    async def test_attempt_timeout_shrinks_to_the_time_left(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request.extensions["timeout"])
+            return httpx.Response(200, json={})
+
+        client = make_resilient_client(handler)
+        await client.recharge_user(1, "alice", 5.0, idempotency_key="op-1")
+        set_deadline(2.0)
+        await client.recharge_user(1, "alice", 5.0, idempotency_key="op-2")
+
+        assert seen[0]["read"] == 5
+        assert 1.5 < seen[1]["read"] <= 2.0
+
+    @pytest.mark.asyncio
+    async def test_no_retry_that_could_not_finish_in_time(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(503, json={})
+
+        client = make_resilient_client(handler, retries=3, backoff=0.3)
+        set_deadline(0.5)
+        status, _ = await client.recharge_user(1, "alice", 5.0, idempotency_key="op-1")
+
+        assert status == 503
+        assert len(seen) == 1
+        assert client.resilience_stats()["past_deadline"] == 1
+
+    @pytest.mark.asyncio
+    async def test_spent_deadline_sends_nothing(self):
+        seen = []
+        client = make_resilient_client(lambda request: seen.append(request) or httpx.Response(200, json={}))
+        set_deadline(0.1)
+
+        status, res = await client.recharge_user(1, "alice", 5.0, idempotency_key="op-1")
+
+        assert status == 504
+        assert "too long" in res["detail"]
+        assert seen == []
+
+    @pytest.mark.asyncio
+    async def test_timeout_at_the_deadline_does_not_trip_the_breaker(self):
+        def handler(request):
+            raise httpx.ReadTimeout("slow")
+
+        client = make_resilient_client(handler, retries=0, breaker_failure_threshold=1)
+        set_deadline(1.0)
+        status, _ = await client.recharge_user(1, "alice", 5.0, idempotency_key="op-1")
+
+        assert status == 504
+        assert client.resilience_stats()["circuits"] == {"/telegram/recharge": "closed"}
+
+    @pytest.mark.asyncio
+    async def test_shared_get_is_not_bound_by_the_first_callers_deadline(self):
+        release = asyncio.Event()
+        seen = []
+
+        async def handler(request):
+            seen.append(request.extensions["timeout"])
+            await release.wait()
+            return httpx.Response(200, json=[{"username": "alice"}])
+
+        client = make_resilient_client(handler)
+
+        async def hurried():
+            set_deadline(0.3)
+            return await client.get_users(1)
+
+        async def patient():
+            set_deadline(5.0)
+            return await client.get_users(1)
+
+        first = asyncio.ensure_future(hurried())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(patient())
+        assert (await first)[0] == 504
+        release.set()
+
+        assert await second == (200, [{"username": "alice"}])
+        # One request, sent with the full timeout, not the hurried caller's 0.3s.
+        assert len(seen) == 1 and seen[0]["read"] == 5
+        assert client.resilience_stats()["past_deadline"] == 1
+
+    @pytest.mark.asyncio
+    async def test_safe_handler_scopes_the_deadline_to_the_update(self):
+        seen = {}
+
+        @safe_handler
+        async def handler(update, context):
+            seen["default"] = time_remaining()
+
+        @safe_handler.with_deadline(None)
+        async def bulk(update, context):
+            seen["bulk"] = time_remaining()
+
+        update = SimpleNamespace(update_id=1, effective_chat=SimpleNamespace(id=1))
+        await handler(update, SimpleNamespace())
+        await bulk(update, SimpleNamespace())
+
+        assert 9 < seen["default"] <= 10
+        assert seen["bulk"] is None
+        assert time_remaining() is None
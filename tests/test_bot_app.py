@@ -0,0 +1,192 @@
+import asyncio
+import socket
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+from telegram import User
+from telegram.ext import ExtBot
+
+from src import bot_app as bot_app_module
+from src import services as services_module
+from src.bot_app import BotApp
+from src.config import Config
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_config(**overrides):
+    values = {
+        "TELEGRAM_TOKEN": "123:abc",
+        "TELEGRAM_SECRET": "secret",
+        "BOT_MODE": "webhook",
+        "WEBHOOK_LISTEN": "127.0.0.1",
+        "WEBHOOK_PORT": free_port(),
+        "WEBHOOK_PATH": "/telegram/",
+        "WEBHOOK_URL": "https://bot.example.test/telegram",
+        "WEBHOOK_SECRET_TOKEN": "hook-secret",
+        "NOTIFICATION_STORE_PATH": ":memory:",
+        "PERSISTENCE_PATH": None,
+    }
+    values.update(overrides)
+    return Config(**values)
+
+
+def use_config(monkeypatch, cfg):
+    monkeypatch.setattr(bot_app_module, "get_config", lambda: cfg)
+    monkeypatch.setattr(services_module, "get_config", lambda: cfg)
+
+
+# A recorded /myid update, as Telegram POSTs it to the webhook.
+MYID_UPDATE = {
+    "update_id": 1001,
+    "message": {
+        "message_id": 7,
+        "date": 1700000000,
+        "chat": {"id": 4242, "type": "private", "first_name": "Ana"},
+        "from": {"id": 4242, "is_bot": False, "first_name": "Ana"},
+        "text": "/myid",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+    },
+}
+
+
+@pytest.fixture
+def fake_bot_api(monkeypatch):
+    """Stub out every Bot API call the webhook path makes, so nothing
+    leaves localhost."""
+    bot_user = User(1, "PrintBuddy", True, username="print_bot")
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = bot_user
+        return bot_user
+
+    monkeypatch.setattr(ExtBot, "get_me", get_me)
+    monkeypatch.setattr(ExtBot, "set_webhook", AsyncMock(return_value=True))
+    monkeypatch.setattr(ExtBot, "delete_webhook", AsyncMock(return_value=True))
+    send_message = AsyncMock()
+    monkeypatch.setattr(ExtBot, "send_message", send_message)
+    return send_message
+
+
+def test_validate_requires_webhook_url_in_webhook_mode():
+    with pytest.raises(ValueError, match="WEBHOOK_URL"):
+        make_config(WEBHOOK_URL=None).validate()
+
+
+def test_validate_rejects_unknown_mode():
+    with pytest.raises(ValueError, match="BOT_MODE"):
+        make_config(BOT_MODE="carrier-pigeon").validate()
+
+
+def test_webhook_options_come_from_config(monkeypatch):
+    cfg = make_config(WEBHOOK_PORT=8443)
+    use_config(monkeypatch, cfg)
+
+    options = BotApp().webhook_options()
+
+    assert options["listen"] == "127.0.0.1"
+    assert options["port"] == 8443
+    assert options["url_path"] == "telegram"
+    assert options["webhook_url"] == "https://bot.example.test/telegram"
+    assert options["secret_token"] == "hook-secret"
+
+
+def test_updates_go_through_the_fair_processor(monkeypatch):
+    cfg = make_config(UPDATE_CONCURRENCY=4, UPDATE_CHAT_RATE=1.0)
+    use_config(monkeypatch, cfg)
+
+    bot = BotApp()
+    app = bot.build()
+
+    assert app.update_processor is bot.update_processor
+    assert (bot.update_processor.concurrency, bot.update_processor.chat_rate) == (4, 1.0)
+
+
+@pytest.mark.asyncio
+async def test_webhook_feeds_posted_update_to_application(monkeypatch, fake_bot_api):
+    cfg = make_config()
+    use_config(monkeypatch, cfg)
+    bot_app = BotApp()
+    app = bot_app.build()
+    options = bot_app.webhook_options()
+
+    async with app:
+        await app.updater.start_webhook(**options)
+        await app.start()
+        try:
+            async with httpx.AsyncClient() as client:
+                res = await client.post(
+                    f"http://127.0.0.1:{cfg.WEBHOOK_PORT}/telegram",
+                    json=MYID_UPDATE,
+                    headers={"X-Telegram-Bot-Api-Secret-Token": "hook-secret"},
+                )
+            assert res.status_code == 200
+
+            for _ in range(100):
+                if fake_bot_api.await_count:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await app.updater.stop()
+            await app.stop()
+
+    fake_bot_api.assert_awaited_once()
+    _, kwargs = fake_bot_api.call_args
+    assert kwargs["chat_id"] == 4242
+    assert "4242" in kwargs["text"]
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret_token(monkeypatch, fake_bot_api):
+    cfg = make_config()
+    use_config(monkeypatch, cfg)
+    bot_app = BotApp()
+    app = bot_app.build()
+
+    async with app:
+        await app.updater.start_webhook(**bot_app.webhook_options())
+        await app.start()
+        try:
+            async with httpx.AsyncClient() as client:
+                res = await client.post(
+                    f"http://127.0.0.1:{cfg.WEBHOOK_PORT}/telegram",
+                    json=MYID_UPDATE,
+                    headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+                )
+        finally:
+            await app.updater.stop()
+            await app.stop()
+
+    assert res.status_code == 403
+    fake_bot_api.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_low_stock_alerts_are_scheduled_on_the_job_queue(monkeypatch):
+    cfg = make_config(LOW_STOCK_ALERT_CHAT_IDS=(111,), LOW_STOCK_CHECK_INTERVAL=120.0)
+    use_config(monkeypatch, cfg)
+    bot_app = BotApp(post_init=AsyncMock())
+    app = bot_app.build()
+
+    await bot_app._post_init(app)
+
+    assert bot_app.low_stock_monitor is not None
+    assert bot_app.low_stock_monitor.chat_ids == [111]
+    assert [job.name for job in app.job_queue.jobs()] == ["low_stock_alerts"]
+
+
+@pytest.mark.asyncio
+async def test_low_stock_alerts_stay_off_without_chat_ids(monkeypatch):
+    use_config(monkeypatch, make_config())
+    bot_app = BotApp(post_init=AsyncMock())
+    app = bot_app.build()
+
+    await bot_app._post_init(app)
+
+    assert bot_app.low_stock_monitor is None
+    assert app.job_queue.jobs() == ()
@@ -5,6 +5,7 @@ from unittest.mock import AsyncMock
 import pytest
 
 from src.bot_handlers import (
+    UserListPages,
     BotHandlers,
     STOCK_CHOOSE_ITEM,
     STOCK_ADJUST_DELTA,
@@ -172,6 +173,64 @@ async def test_button_callback_purchase_already_resolved_shows_alert():
     assert context.bot.edit_message_text.await_count == 0
 
 
+class TestListUsers:
+    USERS = [{"username": f"u{i:03d}", "name": f"Name{i:03d}", "surname": "S", "balance": 1.0} for i in range(120)]
+
+    def test_pages_fit_telegram_message_limit(self):
+        users = [{"username": f"u{i}", "name": "N" * 200, "surname": "S", "balance": 0} for i in range(40)]
+        pages = UserListPages(users, page_size=50)
+
+        assert len(pages.pages) > 1
+        assert all(len(pages.page_text(i)) <= 4096 for i in range(len(pages.pages)))
+        assert sum(end - start for start, end in pages.pages) == 40
+
+    @pytest.mark.asyncio
+    async def test_first_page_has_next_and_export_buttons(self):
+        fake_client = FakeAPIClient(response=(200, list(reversed(self.USERS))))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, context, message = make_command_update()
+
+        await handlers.list_users(update, context)
+
+        text = message.reply_text.call_args.args[0]
+        assert text.startswith("👥 Users (120) — page 1/3\n\nName000 S (u000)")
+        keyboard = message.reply_text.call_args.kwargs["reply_markup"].inline_keyboard
+        assert [b.callback_data for row in keyboard for b in row] == ["users:page:1", "users:export"]
+
+    @pytest.mark.asyncio
+    async def test_page_buttons_edit_in_place_without_refetching(self):
+        fake_client = FakeAPIClient(response=(200, self.USERS))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, context, message = make_command_update()
+        await handlers.list_users(update, context)
+        pages = handlers._users_pages
+
+        query = make_query("users:page:2")
+        await handlers.users_page_callback(SimpleNamespace(callback_query=query), SimpleNamespace())
+
+        assert [name for name, *_ in fake_client.calls] == ["get_users"]
+        assert handlers._users_pages is pages
+        text = query.message.edit_text.call_args.args[0]
+        assert "page 3/3" in text and "(u119)" in text
+        keyboard = query.message.edit_text.call_args.kwargs["reply_markup"].inline_keyboard
+        assert [b.callback_data for b in keyboard[0]] == ["users:page:1"]
+
+    @pytest.mark.asyncio
+    async def test_export_sends_csv_document(self):
+        fake_client = FakeAPIClient(response=(200, self.USERS))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        query = make_query("users:export")
+        context = SimpleNamespace(bot=SimpleNamespace(send_document=AsyncMock()))
+
+        await handlers.users_page_callback(SimpleNamespace(callback_query=query), context)
+
+        kwargs = context.bot.send_document.call_args.kwargs
+        assert kwargs["filename"] == "users.csv"
+        lines = kwargs["document"].decode().splitlines()
+        assert lines[0] == "username,name,surname,balance"
+        assert len(lines) == 121
+
+
 class TestStockFlow:
     @pytest.mark.asyncio
     async def test_entry_fallback_args_applies_immediately(self):
@@ -195,9 +254,35 @@ class TestStockFlow:
         result = await handlers.stock_entry(update, context)
 
         assert result == STOCK_CHOOSE_ITEM
-        assert context.chat_data["stock_items"] == {"item1": items[0]}
+        assert "stock_items" not in context.chat_data
         message.reply_text.assert_awaited_once()
 
+    @pytest.mark.asyncio
+    async def test_entry_reuses_inventory_and_keyboard_until_stock_changes(self):
+        items = [
+            {"id": "item1", "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets", "is_low_stock": False},
+            {"id": "item2", "name": "Toner", "current_stock": 1.0, "unit": "pcs", "is_low_stock": True},
+        ]
+        fake_client = FakeAPIClient(response=(200, items))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, context, message = make_command_update(args=[])
+
+        await handlers.stock_entry(update, context)
+        await handlers.stock_entry(update, context)
+
+        first, second = message.reply_text.call_args_list
+        assert first.args[0].startswith("⚠️ 1 item(s) low on stock.")
+        assert first.kwargs["reply_markup"] is second.kwargs["reply_markup"]
+
+        fake_client.response = (200, {"name": "Toner", "current_stock": 21.0, "unit": "pcs", "is_low_stock": False})
+        await handlers.user_service.adjust_stock(123, "Toner", 20)
+        await handlers.stock_entry(update, context)
+
+        third = message.reply_text.call_args
+        assert third.args[0] == "📦 Select an item to adjust:"
+        assert "Toner (21 pcs)" in [row[0].text for row in third.kwargs["reply_markup"].inline_keyboard]
+        assert [name for name, *_ in fake_client.calls] == ["get_inventory", "adjust_stock"]
+
     @pytest.mark.asyncio
     async def test_entry_forbidden_ends_conversation(self):
         fake_client = FakeAPIClient(response=(403, {"detail": "nope"}))
@@ -209,13 +294,33 @@ class TestStockFlow:
         assert result == ConversationHandler.END
 
     @pytest.mark.asyncio
-    async def test_choose_item_stores_target_and_shows_stepper(self):
-        fake_client = FakeAPIClient(response=(200, {}))
+    async def test_entry_drops_batch_left_by_an_abandoned_session(self):
+        paper = {"id": "item1", "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets", "is_low_stock": False}
+        toner = {"id": "item2", "name": "Toner", "current_stock": 5.0, "unit": "pcs", "is_low_stock": False}
+        fake_client = FakeAPIClient(response=(200, [paper, toner]))
         handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, context, _ = make_command_update(args=[])
+        context.chat_data.update({"stock_batch": {"item1": {"item": paper, "delta": 50.0}}, "stock_delta": 7.0})
+
+        await handlers.stock_entry(update, context)
+        query = make_query("stock:item:item2")
+        await handlers.stock_choose_item(SimpleNamespace(callback_query=query), context)
+
+        assert "stock_batch" not in context.chat_data
+        assert context.chat_data["stock_delta"] == 0.0
+        text = query.message.edit_text.call_args.args[0]
+        buttons = [b.text for row in query.message.edit_text.call_args.kwargs["reply_markup"].inline_keyboard for b in row]
+        assert "A4 Paper" not in text
+        assert not any(label.startswith("✅ Confirm all") for label in buttons)
+
+    @pytest.mark.asyncio
+    async def test_choose_item_stores_target_and_shows_stepper(self):
         item = {"id": "item1", "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets"}
+        fake_client = FakeAPIClient(response=(200, [item]))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
         query = make_query("stock:item:item1")
         update = SimpleNamespace(callback_query=query)
-        context = SimpleNamespace(chat_data={"stock_items": {"item1": item}})
+        context = SimpleNamespace(chat_data={})
 
         result = await handlers.stock_choose_item(update, context)
 
@@ -278,7 +383,7 @@ class TestStockFlow:
         item = {"id": "item1", "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets"}
         query = make_query("stock:confirm")
         update = SimpleNamespace(callback_query=query)
-        context = SimpleNamespace(chat_data={"stock_target": item, "stock_delta": -30.0, "stock_items": {}})
+        context = SimpleNamespace(chat_data={"stock_target": item, "stock_delta": -30.0})
 
         result = await handlers.stock_confirm(update, context)
 
@@ -288,13 +393,88 @@ class TestStockFlow:
         assert "stock_delta" not in context.chat_data
         query.message.edit_text.assert_awaited_once()
 
+    @pytest.mark.asyncio
+    async def test_add_more_parks_item_in_batch_and_returns_to_picker(self):
+        paper = {"id": "item1", "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets"}
+        toner = {"id": "item2", "name": "Toner", "current_stock": 3.0, "unit": "pcs"}
+        fake_client = FakeAPIClient(response=(200, [paper, toner]))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        query = make_query("stock:more")
+        update = SimpleNamespace(callback_query=query)
+        context = SimpleNamespace(chat_data={"stock_target": paper, "stock_delta": 50.0})
+
+        result = await handlers.stock_add_more(update, context)
+
+        assert result == STOCK_CHOOSE_ITEM
+        assert context.chat_data["stock_batch"] == {"item1": {"item": paper, "delta": 50.0}}
+        assert "stock_target" not in context.chat_data
+        assert fake_client.calls == [("get_inventory", (123,), {})]
+        assert "A4 Paper: +50" in query.message.edit_text.call_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_choosing_a_batched_item_resumes_its_delta(self):
+        paper = {"id": "item1", "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets"}
+        fake_client = FakeAPIClient(response=(200, [paper]))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        query = make_query("stock:item:item1")
+        update = SimpleNamespace(callback_query=query)
+        context = SimpleNamespace(chat_data={"stock_batch": {"item1": {"item": paper, "delta": 50.0}}})
+
+        result = await handlers.stock_choose_item(update, context)
+
+        assert result == STOCK_ADJUST_DELTA
+        assert context.chat_data["stock_delta"] == 50.0
+        assert context.chat_data["stock_batch"] == {}
+
+    @pytest.mark.asyncio
+    async def test_confirm_applies_whole_batch_once_and_summarizes(self):
+        fake_client = FakeAPIClient(response=(200, {"name": "x", "current_stock": 1.0, "unit": "pcs"}))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        paper = {"id": "item1", "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets"}
+        toner = {"id": "item2", "name": "Toner", "current_stock": 3.0, "unit": "pcs"}
+        query = make_query("stock:confirm")
+        update = SimpleNamespace(callback_query=query)
+        context = SimpleNamespace(chat_data={
+            "stock_target": toner, "stock_delta": -1.0,
+            "stock_batch": {"item1": {"item": paper, "delta": 50.0}},
+        })
+
+        result = await handlers.stock_confirm(update, context)
+
+        assert result == ConversationHandler.END
+        assert sorted(fake_client.calls) == [
+            ("adjust_stock", (123, "A4 Paper", 50.0), {}),
+            ("adjust_stock", (123, "Toner", -1.0), {}),
+        ]
+        assert context.chat_data == {}
+        query.message.edit_text.assert_awaited_once()
+        assert "2 adjustments applied" in query.message.edit_text.call_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_confirm_batch_reports_partial_failure(self):
+        fake_client = FakeAPIClient(response=(404, {"detail": "Item not found"}))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        paper = {"id": "item1", "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets"}
+        toner = {"id": "item2", "name": "Toner", "current_stock": 3.0, "unit": "pcs"}
+        query = make_query("stock:confirm")
+        update = SimpleNamespace(callback_query=query)
+        context = SimpleNamespace(chat_data={
+            "stock_target": toner, "stock_delta": 0.0,
+            "stock_batch": {"item1": {"item": paper, "delta": 50.0}, "item2": {"item": toner, "delta": 2.0}},
+        })
+
+        await handlers.stock_confirm(update, context)
+
+        assert query.answer.call_args.kwargs.get("show_alert") is True
+        assert "2 of 2 adjustments failed" in query.message.edit_text.call_args.args[0]
+
     @pytest.mark.asyncio
     async def test_cancel_clears_state(self):
         fake_client = FakeAPIClient(response=(200, {}))
         handlers = BotHandlers(services={"user": UserService(fake_client)})
         query = make_query("stock:cancel")
         update = SimpleNamespace(callback_query=query)
-        context = SimpleNamespace(chat_data={"stock_target": {}, "stock_items": {}, "stock_delta": 5.0})
+        context = SimpleNamespace(chat_data={"stock_target": {}, "stock_delta": 5.0})
 
         result = await handlers.stock_cancel(update, context)
 
@@ -579,6 +759,19 @@ class TestRechargeFlow:
         assert result == RECHARGE_SEARCH
         message.reply_text.assert_awaited_once()
 
+    @pytest.mark.asyncio
+    async def test_search_refetches_user_list_missing_after_restart(self):
+        # Persistence restores the flow state but not the cached list.
+        fake_client = FakeAPIClient(response=(200, USERS))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, context, message = make_text_update("alice", chat_data={})
+
+        result = await handlers.recharge_search(update, context)
+
+        assert result == RECHARGE_AWAIT_AMOUNT
+        assert fake_client.calls == [("get_users", (123,), {})]
+        assert context.chat_data["recharge_all_users"] == USERS
+
     @pytest.mark.asyncio
     async def test_choose_user_moves_to_amount(self):
         fake_client = FakeAPIClient(response=(200, {}))
@@ -632,6 +825,140 @@ class TestRechargeFlow:
         assert context.chat_data == {}
 
 
+class TestBulkRecharge:
+    @staticmethod
+    def admin_service(fake_client):
+        service = UserService(fake_client)
+        service.roles.put(123, 200, {"name": "Ana"})
+        return service
+
+    @pytest.mark.asyncio
+    async def test_non_admin_is_refused_before_any_recharge(self):
+        fake_client = FakeAPIClient(response=(403, {"detail": "Forbidden"}))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, context, message = make_text_update("/bulk_recharge\nalice,10\nbob,5")
+
+        await handlers.bulk_recharge(update, context)
+
+        assert [name for name, *_ in fake_client.calls] == ["get_me"]
+        message.reply_text.assert_awaited_once_with("❌ You are not authorized to recharge users.")
+
+    @pytest.mark.asyncio
+    async def test_pasted_list_recharges_every_row_and_summarizes(self):
+        fake_client = FakeAPIClient(response=(200, {}))
+        handlers = BotHandlers(services={"user": self.admin_service(fake_client)})
+        update, context, message = make_text_update("/bulk_recharge\nalice,10\nbob,5")
+
+        await handlers.bulk_recharge(update, context)
+
+        assert sorted(fake_client.calls) == [
+            ("recharge_user", (123, "alice", 10.0), {}),
+            ("recharge_user", (123, "bob", 5.0), {}),
+        ]
+        progress = message.reply_text.return_value
+        progress.edit_text.assert_awaited_once_with("💰 Recharged 2 of 2 users, 15.00€ in total.")
+
+    @pytest.mark.asyncio
+    async def test_any_invalid_row_recharges_nobody(self):
+        fake_client = FakeAPIClient(response=(200, {}))
+        handlers = BotHandlers(services={"user": self.admin_service(fake_client)})
+        update, context, message = make_text_update("/bulk_recharge alice,10\nbob,-5")
+
+        await handlers.bulk_recharge(update, context)
+
+        assert fake_client.calls == []
+        text = message.reply_text.call_args.args[0]
+        assert "Nothing was recharged" in text
+        assert "Line 2 (bob): Amount must be positive" in text
+
+    @pytest.mark.asyncio
+    async def test_csv_document_is_downloaded_and_failures_listed(self):
+        fake_client = FakeAPIClient(response=(404, {"detail": "User not found"}))
+        handlers = BotHandlers(services={"user": self.admin_service(fake_client)})
+        file = SimpleNamespace(download_as_bytearray=AsyncMock(return_value=bytearray("\ufeffusername,amount\nghost,3\n".encode())))
+        document = SimpleNamespace(file_size=40, get_file=AsyncMock(return_value=file))
+        message = SimpleNamespace(document=document, caption="/bulk_recharge", reply_text=AsyncMock())
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=123), message=message)
+
+        await handlers.bulk_recharge(update, SimpleNamespace(args=[], chat_data={}))
+
+        assert fake_client.calls == [("recharge_user", (123, "ghost", 3.0), {})]
+        summary = message.reply_text.return_value.edit_text.call_args.args[0]
+        assert summary.startswith("💰 Recharged 0 of 1 users")
+        assert "• ghost: ⚠️ User not found." in summary
+
+    @pytest.mark.asyncio
+    async def test_without_rows_shows_usage(self):
+        handlers = BotHandlers(services={"user": self.admin_service(FakeAPIClient())})
+        update, context, message = make_text_update("/bulk_recharge")
+
+        await handlers.bulk_recharge(update, context)
+
+        message.reply_text.assert_awaited_once_with(BotHandlers.BULK_RECHARGE_USAGE)
+
+
+class TestInlineUserLookup:
+    USERS = [
+        {"username": f"user{i:02d}", "name": "Ana", "surname": f"Smith{i:02d}", "balance": float(i)} for i in range(30)
+    ] + [{"username": "ana", "name": "Ana", "surname": "Zed", "balance": 1.5}]
+
+    def make_inline_update(self, query, offset="", user_id=123):
+        inline_query = SimpleNamespace(query=query, offset=offset, from_user=SimpleNamespace(id=user_id), answer=AsyncMock())
+        return SimpleNamespace(inline_query=inline_query), inline_query
+
+    @pytest.mark.asyncio
+    async def test_answers_ranked_first_page_with_next_offset(self):
+        fake_client = FakeAPIClient(response=(200, self.USERS))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, inline_query = self.make_inline_update("ana")
+
+        await handlers.inline_user_lookup(update, SimpleNamespace())
+
+        results = inline_query.answer.call_args.args[0]
+        kwargs = inline_query.answer.call_args.kwargs
+        assert len(results) == BotHandlers.INLINE_PAGE_SIZE
+        assert results[0].id == "ana"
+        assert "Balance: 1.50€" in results[0].description
+        assert kwargs["next_offset"] == "20"
+        assert kwargs["is_personal"] is True
+        assert kwargs["cache_time"] == int(handlers.user_service.user_directory.ttl)
+
+    @pytest.mark.asyncio
+    async def test_pages_and_keystrokes_share_one_backend_fetch(self):
+        fake_client = FakeAPIClient(response=(200, self.USERS))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+
+        for query, offset in (("a", ""), ("an", ""), ("ana", ""), ("ana", "20")):
+            update, inline_query = self.make_inline_update(query, offset)
+            await handlers.inline_user_lookup(update, SimpleNamespace())
+
+        assert [name for name, *_ in fake_client.calls] == ["get_users"]
+        assert len(inline_query.answer.call_args.args[0]) == 11
+        assert inline_query.answer.call_args.kwargs["next_offset"] == ""
+
+    @pytest.mark.asyncio
+    async def test_non_admin_gets_no_results(self):
+        fake_client = FakeAPIClient(response=(403, {"detail": "nope"}))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, inline_query = self.make_inline_update("ana")
+
+        await handlers.inline_user_lookup(update, SimpleNamespace())
+
+        assert inline_query.answer.call_args.args[0] == []
+
+    @pytest.mark.asyncio
+    async def test_non_admin_keystrokes_cost_one_backend_call(self):
+        fake_client = FakeAPIClient(response=(403, {"detail": "nope"}))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+
+        for query in ("a", "an", "ana"):
+            update, inline_query = self.make_inline_update(query)
+            await handlers.inline_user_lookup(update, SimpleNamespace())
+
+        assert [name for name, *_ in fake_client.calls] == ["get_users"]
+        assert inline_query.answer.call_args.args[0] == []
+
+
 class TestAdjustFlow:
     @pytest.mark.asyncio
     async def test_entry_fallback_args_applies_immediately(self):
@@ -718,6 +1045,72 @@ class TestAdjustFlow:
         assert context.chat_data == {}
 
 
+class TestRequestRecharge:
+    @pytest.mark.asyncio
+    async def test_resent_request_notifies_admins_once(self):
+        fake_client = FakeAPIClient(response=(201, {"id": "r1", "username": "alice", "amount": 5.0}))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        handlers._notify_admins_of_request = AsyncMock()
+        update, context, message = make_command_update(args=["alice", "5"])
+        update.effective_user = SimpleNamespace(username="ana", first_name="Ana", last_name=None)
+
+        await handlers.request_recharge(update, context)
+        await handlers.request_recharge(update, context)
+
+        handlers._notify_admins_of_request.assert_awaited_once()
+        assert len(fake_client.calls) == 1
+        assert message.reply_text.call_args.args[0].startswith("ℹ️ You already sent this request")
+
+
+class TestStartCommand:
+    @pytest.mark.asyncio
+    async def test_repeat_start_skips_role_check_and_command_push(self):
+        fake_client = FakeAPIClient(response=(200, {"name": "Ana"}))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, context, message = make_command_update()
+        context.bot = SimpleNamespace(set_my_commands=AsyncMock())
+
+        await handlers.start(update, context)
+        await handlers.start(update, context)
+
+        assert [name for name, *_ in fake_client.calls] == ["get_me"]
+        context.bot.set_my_commands.assert_awaited_once()
+        assert message.reply_text.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_lost_admin_access_pushes_user_commands(self):
+        fake_client = FakeAPIClient(response=(200, {"name": "Ana"}))
+        service = UserService(fake_client)
+        handlers = BotHandlers(services={"user": service})
+        update, context, _ = make_command_update()
+        context.bot = SimpleNamespace(set_my_commands=AsyncMock())
+        await handlers.start(update, context)
+
+        fake_client.response = (403, {"detail": "Forbidden"})
+        await service.list_inventory(123)
+        await handlers.start(update, context)
+
+        assert [name for name, *_ in fake_client.calls] == ["get_me", "get_inventory", "get_me"]
+        pushed = [call.args[0] for call in context.bot.set_my_commands.await_args_list]
+        assert len(pushed) == 2
+        assert [c.command for c in pushed[1]] == ["start", "myid", "request_recharge"]
+
+    @pytest.mark.asyncio
+    async def test_admin_help_lists_every_admin_command(self):
+        fake_client = FakeAPIClient(response=(200, {"name": "Ana"}))
+        handlers = BotHandlers(services={"user": UserService(fake_client)})
+        update, context, message = make_command_update()
+        context.bot = SimpleNamespace(set_my_commands=AsyncMock())
+
+        await handlers.start(update, context)
+
+        help_text = message.reply_text.call_args.args[0]
+        menu = context.bot.set_my_commands.await_args.args[0]
+        # /start is how they got here; /request_recharge is the users' side.
+        missing = [c.command for c in menu if c.command not in ("start", "request_recharge") and f"/{c.command} " not in help_text]
+        assert missing == []
+
+
 class TestCancelCommand:
     @pytest.mark.asyncio
     async def test_clears_all_flow_state(self):
@@ -725,7 +1118,7 @@ class TestCancelCommand:
         handlers = BotHandlers(services={"user": UserService(fake_client)})
         update, context, message = make_command_update(args=[])
         context.chat_data.update({
-            "stock_target": {}, "stock_items": {}, "stock_delta": 5.0,
+            "stock_target": {}, "stock_delta": 5.0,
             "pending_expense": {}, "recharge_target": {}, "recharge_all_users": [],
             "adjust_target": {}, "adjust_all_users": [],
         })
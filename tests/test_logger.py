@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import logging.handlers
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import logger as logger_module
+from src.logger import (
+    ContextFilter,
+    JsonFormatter,
+    SuccessLogSampler,
+    bind_log_context,
+    get_log_context,
+    log_success,
+    reset_log_context,
+    setup_logging,
+    stop_logging,
+)
+from src.services import UserService
+from src.utilities import safe_handler
+from tests.conftest import FakeAPIClient
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield root
+    stop_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def make_record(**extra):
+    record = logging.LogRecord("src.api_client", logging.INFO, __file__, 1, "GET %s -> %s", ("/telegram/users", 200), None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_lifts_structured_fields():
+    line = JsonFormatter().format(make_record(chat_id=42, handler="list_users", path="/telegram/users", latency_ms=12.5))
+
+    entry = json.loads(line)
+    assert entry["message"] == "GET /telegram/users -> 200"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "src.api_client"
+    assert entry["chat_id"] == 42
+    assert entry["handler"] == "list_users"
+    assert entry["path"] == "/telegram/users"
+    assert entry["latency_ms"] == 12.5
+
+
+def test_json_formatter_includes_traceback():
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logging.LogRecord("x", logging.ERROR, __file__, 1, "failed", None, exc_info=sys.exc_info())
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert "RuntimeError: boom" in entry["exc"]
+
+
+def test_records_reach_the_file_through_the_background_thread(restore_root_logger, tmp_path):
+    logfile = tmp_path / "bot.log"
+    setup_logging(logfile=str(logfile), fmt="json")
+
+    logging.getLogger("src.test").info("Handling %s", "myid", extra={"chat_id": 7, "handler": "myid"})
+    stop_logging()
+
+    entry = json.loads(logfile.read_text().strip())
+    assert entry["message"] == "Handling myid"
+    assert entry["chat_id"] == 7
+
+
+def test_reconfiguring_does_not_stack_pipelines(restore_root_logger, tmp_path):
+    before = len(restore_root_logger.handlers)
+    setup_logging(logfile=str(tmp_path / "a.log"))
+    setup_logging(logfile=str(tmp_path / "b.log"))
+
+    assert len(restore_root_logger.handlers) == before + 1
+
+
+def test_slow_log_file_does_not_block_the_caller(restore_root_logger, tmp_path, monkeypatch):
+    original_emit = logging.handlers.RotatingFileHandler.emit
+
+    def slow_emit(self, record):
+        time.sleep(0.02)
+        original_emit(self, record)
+
+    monkeypatch.setattr(logging.handlers.RotatingFileHandler, "emit", slow_emit)
+    setup_logging(logfile=str(tmp_path / "bot.log"))
+    logger = logging.getLogger("src.test")
+
+    start = time.perf_counter()
+    for i in range(50):
+        logger.info("update %s handled", i)
+    elapsed = time.perf_counter() - start
+    stop_logging()
+
+    # 50 writes take >= 1s in the sink; the callers only paid for queue puts.
+    assert elapsed < 0.2
+    assert len((tmp_path / "bot.log").read_text().splitlines()) == 50
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def sampler(monkeypatch):
+    clock = FakeClock()
+    sampler = SuccessLogSampler(clock=clock)
+    sampler.clock = clock
+    monkeypatch.setattr(logger_module, "SUCCESS_SAMPLER", sampler)
+    return sampler
+
+
+def test_context_filter_stamps_bound_fields():
+    record = make_record()
+    token = bind_log_context(chat_id=42, correlation_id="1001")
+    try:
+        ContextFilter().filter(record)
+    finally:
+        reset_log_context(token)
+
+    assert (record.chat_id, record.correlation_id) == (42, "1001")
+    unbound = make_record()
+    ContextFilter().filter(unbound)
+    assert (unbound.chat_id, unbound.correlation_id) == ("-", "-")
+
+
+@pytest.mark.asyncio
+async def test_safe_handler_binds_chat_and_update_id_per_update():
+    seen = {}
+
+    @safe_handler
+    async def handler(update, context):
+        await asyncio.sleep(0)
+        seen[update.update_id] = dict(get_log_context())
+
+    def update(update_id, chat_id):
+        return SimpleNamespace(update_id=update_id, effective_chat=SimpleNamespace(id=chat_id))
+
+    await asyncio.gather(handler(update(1, 111), SimpleNamespace()), handler(update(2, 222), SimpleNamespace()))
+
+    assert seen == {1: {"chat_id": 111, "correlation_id": "1"}, 2: {"chat_id": 222, "correlation_id": "2"}}
+    assert get_log_context() == {}
+
+
+def test_success_lines_are_capped_per_template_per_minute(sampler, caplog):
+    sampler.per_minute = 2
+    log = logging.getLogger("src.test")
+
+    with caplog.at_level(logging.INFO):
+        for i in range(5):
+            log_success(log, "list_users chat_id=%s status=%s", i, 200)
+        sampler.clock.now = 61
+        log_success(log, "list_users chat_id=%s status=%s", 9, 200)
+
+    assert [r.getMessage() for r in caplog.records] == [
+        "list_users chat_id=0 status=200",
+        "list_users chat_id=1 status=200",
+        "list_users chat_id=9 status=200",
+    ]
+    assert caplog.records[-1].suppressed == 3
+
+
+def test_sample_rate_zero_drops_successes(sampler, caplog):
+    sampler.rate = 0.0
+
+    with caplog.at_level(logging.INFO):
+        log_success(logging.getLogger("src.test"), "Handling %s", "myid")
+
+    assert caplog.records == []
+
+
+@pytest.mark.asyncio
+async def test_service_failures_are_never_sampled(sampler, caplog):
+    sampler.rate = 0.0
+    service = UserService(FakeAPIClient(response=(403, {"detail": "nope"})))
+
+    with caplog.at_level(logging.INFO):
+        await service.get_me(1)
+        service.client.response = (200, {})
+        await service.get_me(2)
+
+    assert [r.getMessage() for r in caplog.records] == ["get_me chat_id=1 status=403"]
@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from telegram.error import Forbidden
+
+from src.low_stock import LowStockMonitor
+from src.notification_store import NotificationStore
+from src.notifications import NotificationDispatcher
+from src.services import InventoryCache, UserService
+from tests.conftest import FakeAPIClient
+
+pytestmark = pytest.mark.asyncio
+
+
+def inventory(**stock):
+    """Items 1..n named after the kwargs; low below 10."""
+    return [
+        {"id": i, "name": name, "current_stock": float(level), "unit": "pcs", "is_low_stock": level < 10}
+        for i, (name, level) in enumerate(stock.items(), start=1)
+    ]
+
+
+def make_monitor(store=None, chat_ids=(111, 222), **stock):
+    client = FakeAPIClient(response=(200, inventory(**stock)))
+    # ttl=0: every check refetches, as it would with a poll interval > TTL.
+    service = UserService(client, inventory=InventoryCache(ttl=0.0, stale_ttl=0.0))
+    monitor = LowStockMonitor(
+        service, store if store is not None else NotificationStore(), NotificationDispatcher(per_chat_interval=0), chat_ids, interval=60
+    )
+    bot = SimpleNamespace(send_message=AsyncMock())
+    return monitor, client, bot
+
+
+async def test_items_going_low_get_one_consolidated_alert():
+    monitor, client, bot = make_monitor(Paper=50, Toner=2, Staples=1)
+
+    sent = await monitor.check(bot)
+
+    assert [item["name"] for item in sent] == ["Toner", "Staples"]
+    assert bot.send_message.await_count == 2  # one message per admin, not per item
+    text = bot.send_message.call_args.kwargs["text"]
+    assert "2 item(s) just went low" in text and "Staples: 1 pcs" in text and "Toner: 2 pcs" in text
+
+
+async def test_unchanged_low_items_are_not_alerted_again():
+    monitor, client, bot = make_monitor(Paper=50, Toner=2)
+    await monitor.check(bot)
+
+    assert await monitor.check(bot) == []
+    assert bot.send_message.await_count == 2
+
+
+async def test_restart_does_not_repeat_alerts(tmp_path):
+    path = str(tmp_path / "notifications.sqlite3")
+    monitor, _, bot = make_monitor(NotificationStore(path), Paper=50, Toner=2)
+    await monitor.check(bot)
+    monitor.store.close()
+
+    restarted, _, bot = make_monitor(NotificationStore(path), Paper=50, Toner=2, Ink=0)
+    sent = await restarted.check(bot)
+
+    assert [item["name"] for item in sent] == ["Ink"]
+
+
+async def test_recovered_item_alerts_again_when_it_drops_back():
+    monitor, client, bot = make_monitor(Toner=2)
+    await monitor.check(bot)
+    client.response = (200, inventory(Toner=40))
+    await monitor.check(bot)
+    client.response = (200, inventory(Toner=3))
+
+    sent = await monitor.check(bot)
+
+    assert [item["name"] for item in sent] == ["Toner"]
+    assert monitor.store.low_stock_alerted() == {"1"}
+
+
+async def test_undelivered_alert_is_retried_next_poll():
+    monitor, client, bot = make_monitor(chat_ids=(111,), Toner=2)
+    bot.send_message.side_effect = Forbidden("blocked")
+    assert await monitor.check(bot) == []
+
+    bot.send_message.side_effect = None
+    sent = await monitor.check(bot)
+
+    assert [item["name"] for item in sent] == ["Toner"]
+
+
+async def test_interval_backs_off_while_idle_and_resets_on_change():
+    monitor, client, bot = make_monitor(Paper=50)
+    await monitor.check(bot)
+    assert monitor.next_interval == 60
+
+    for expected in (120, 240, 360, 360):
+        await monitor.check(bot)
+        assert monitor.next_interval == expected
+
+    client.response = (200, inventory(Paper=45))
+    await monitor.check(bot)
+    assert monitor.next_interval == 60
+
+    client.response = (503, {"detail": "down"})
+    await monitor.check(bot)
+    assert monitor.next_interval == 120
+
+
+async def test_skips_the_diff_while_the_cached_inventory_is_unchanged():
+    client = FakeAPIClient(response=(200, inventory(Toner=2)))
+    service = UserService(client, inventory=InventoryCache(ttl=600.0, stale_ttl=0.0))
+    monitor = LowStockMonitor(service, NotificationStore(), NotificationDispatcher(per_chat_interval=0), [111], interval=60)
+    bot = SimpleNamespace(send_message=AsyncMock())
+    await monitor.check(bot)
+    low_stock = service.inventory.low_stock
+
+    service.inventory.low_stock = lambda items: pytest.fail("diffed an unchanged inventory")
+    await monitor.check(bot)
+    service.inventory.low_stock = low_stock
+
+    assert len(client.calls) == 1
+    assert monitor.next_interval == 120
@@ -0,0 +1,113 @@
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+from src.api_client import APIClient
+from src.bot_app import BotApp
+from src.config import Config
+from src.metrics import (
+    BACKEND_RESPONSES,
+    HANDLER_ERRORS,
+    HANDLER_LATENCY,
+    TELEGRAM_REQUESTS,
+    InstrumentedHTTPXRequest,
+    MetricsRegistry,
+    MetricsServer,
+)
+from src.utilities import safe_handler
+from tests.test_bot_app import use_config
+
+pytestmark = pytest.mark.asyncio
+
+
+async def scrape(port: int, path: str = "/metrics") -> httpx.Response:
+    async with httpx.AsyncClient() as client:
+        return await client.get(f"http://127.0.0.1:{port}{path}")
+
+
+async def test_render_uses_prometheus_text_format():
+    registry = MetricsRegistry()
+    counter = registry.counter("calls_total", "Calls.", ["path"])
+    histogram = registry.histogram("latency_seconds", "Latency.", ["path"], buckets=(0.1, 1.0))
+    counter.inc("/a")
+    counter.inc("/a")
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+
+    text = registry.render()
+
+    assert "# TYPE calls_total counter" in text
+    assert 'calls_total{path="/a"} 2' in text
+    assert 'latency_seconds_bucket{path="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{path="/a",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{path="/a",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{path="/a"} 2' in text
+
+
+async def test_server_answers_scrapes_on_localhost():
+    registry = MetricsRegistry()
+    registry.counter("up_total", "Up.").inc()
+    server = MetricsServer(registry, port=0)
+    await server.start()
+    try:
+        res = await scrape(server.port)
+        missing = await scrape(server.port, "/nope")
+    finally:
+        await server.stop()
+
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert "up_total 1" in res.text
+    assert missing.status_code == 404
+
+
+async def test_safe_handler_records_latency_and_errors():
+    @safe_handler
+    async def flaky_metrics_handler(update, context):
+        raise RuntimeError("boom")
+
+    await flaky_metrics_handler(None, None)
+
+    assert HANDLER_LATENCY.count("flaky_metrics_handler") == 1
+    assert HANDLER_ERRORS.value("flaky_metrics_handler") == 1
+
+
+async def test_api_client_records_backend_status():
+    client = APIClient(base_url="http://example.test", secret="secret")
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(404, json={})))
+    before = BACKEND_RESPONSES.value("GET", "/telegram/user", "404")
+
+    await client.get_user(1, "ghost")
+
+    assert BACKEND_RESPONSES.value("GET", "/telegram/user", "404") == before + 1
+
+
+async def test_bot_api_calls_are_counted_per_method():
+    request = InstrumentedHTTPXRequest()
+    request._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda req: httpx.Response(200, json={"ok": True})))
+    before = TELEGRAM_REQUESTS.value("editMessageText", "200")
+
+    await request.do_request("https://api.telegram.org/bot123:abc/editMessageText", "POST")
+
+    assert TELEGRAM_REQUESTS.value("editMessageText", "200") == before + 1
+
+
+async def test_bot_app_serves_metrics_when_port_is_set(monkeypatch):
+    cfg = Config(
+        TELEGRAM_TOKEN="123:abc", TELEGRAM_SECRET="secret", METRICS_PORT=0, NOTIFICATION_STORE_PATH=":memory:", PERSISTENCE_PATH=None
+    )
+    use_config(monkeypatch, cfg)
+    custom_post_init = AsyncMock()
+    bot_app = BotApp(post_init=custom_post_init)
+
+    await bot_app._post_init(None)
+    try:
+        res = await scrape(bot_app.metrics_server.port)
+    finally:
+        await bot_app._post_shutdown(None)
+
+    custom_post_init.assert_awaited_once()
+    assert res.status_code == 200
+    assert "printbot_handler_duration_seconds" in res.text
+    assert bot_app.metrics_server is None
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.bot_handlers import BotHandlers
+from src.notification_store import NotificationStore
+from src.services import UserService
+from tests.conftest import FakeAPIClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+MESSAGES = [{"chat_id": 111, "message_id": 222}, {"chat_id": 333, "message_id": 444}]
+
+
+def test_behaves_like_the_dict_it_replaces():
+    store = NotificationStore()
+    store["req1"] = MESSAGES
+
+    assert "req1" in store
+    assert store["req1"] == MESSAGES
+    assert len(store) == 1
+    assert store.pop("req1", []) == MESSAGES
+    assert store.pop("req1", []) == []
+    assert "req1" not in store
+
+
+def test_survives_reopening_the_file(tmp_path):
+    path = str(tmp_path / "data" / "notifications.sqlite3")
+    store = NotificationStore(path)
+    store["req1"] = MESSAGES
+    store.close()
+
+    reopened = NotificationStore(path)
+
+    assert reopened["req1"] == MESSAGES
+    assert reopened._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_expired_entries_are_ignored_and_evicted():
+    clock = FakeClock()
+    store = NotificationStore(ttl=60, clock=clock)
+    store["old"] = MESSAGES
+    clock.now += 30
+    store["new"] = MESSAGES
+    clock.now += 31
+
+    assert store.pop("old", []) == []
+    assert store.evict_expired() == 0  # "old" went with the pop above
+    assert store["new"] == MESSAGES
+
+    clock.now += 60
+    assert store.evict_expired() == 1
+    assert len(store) == 0
+
+
+def test_writes_periodically_evict_expired_entries():
+    clock = FakeClock()
+    store = NotificationStore(ttl=60, clock=clock)
+    store.EVICT_EVERY = 3
+    store["old"] = MESSAGES
+    clock.now += 120
+    store["a"] = MESSAGES
+    store["b"] = MESSAGES
+
+    count = store._db.execute("SELECT COUNT(*) FROM recharge_notifications").fetchone()[0]
+    assert count == 2
+
+
+@pytest.mark.asyncio
+async def test_every_admin_message_is_updated_after_a_restart(tmp_path):
+    path = str(tmp_path / "notifications.sqlite3")
+    payload = {"request": {"id": "req1", "amount": 5, "username": "alice"}, "admin_chat_ids": ["111", "333"]}
+
+    before = BotHandlers(services={"user": UserService(FakeAPIClient()), "notification_store": NotificationStore(path)})
+    send_message = AsyncMock(side_effect=lambda chat_id, **kwargs: SimpleNamespace(message_id=chat_id * 10))
+    await before._notify_admins_of_request(SimpleNamespace(bot=SimpleNamespace(send_message=send_message)), payload)
+    before.recharge_request_notifications.close()
+
+    after = BotHandlers(services={"user": UserService(FakeAPIClient()), "notification_store": NotificationStore(path)})
+    context = SimpleNamespace(bot=AsyncMock())
+    resolved = {"request": {"id": "req1", "status": "approved", "resolved_by_username": "bob"}, "user_name": "A", "user_surname": "B"}
+    await after._mark_request_messages_resolved(context, resolved)
+
+    edited = sorted((c.kwargs["chat_id"], c.kwargs["message_id"]) for c in context.bot.edit_message_text.await_args_list)
+    assert edited == [(111, 1110), (333, 3330)]
+    assert "req1" not in after.recharge_request_notifications
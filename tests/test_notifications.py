@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from telegram.error import Forbidden, RetryAfter
+
+from src.bot_handlers import BotHandlers
+from src.notifications import NotificationDispatcher
+from src.services import UserService
+from tests.conftest import FakeAPIClient
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeTime:
+    """Clock + sleep pair: sleeping just advances the clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_dispatcher(**kwargs):
+    fake_time = FakeTime()
+    dispatcher = NotificationDispatcher(clock=fake_time.clock, sleep=fake_time.sleep, **kwargs)
+    return dispatcher, fake_time
+
+
+class TestNotificationDispatcher:
+    async def test_runs_calls_concurrently_up_to_the_cap(self):
+        dispatcher = NotificationDispatcher(max_concurrency=3)
+        in_flight = 0
+        peak = 0
+
+        async def call(chat_id):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return chat_id
+
+        results = await dispatcher.send_all(range(10), call)
+
+        assert peak == 3
+        assert [r.value for r in results] == list(range(10))
+
+    async def test_reports_per_recipient_results_in_order(self):
+        dispatcher, _ = make_dispatcher()
+
+        async def call(chat_id):
+            if chat_id == 2:
+                raise Forbidden("bot was blocked by the user")
+            return f"sent-{chat_id}"
+
+        results = await dispatcher.send_all([1, 2, 3], call)
+
+        assert [r.target for r in results] == [1, 2, 3]
+        assert [r.ok for r in results] == [True, False, True]
+        assert isinstance(results[1].error, Forbidden)
+        assert results[1].attempts == 1
+
+    async def test_retries_after_flood_limit(self):
+        dispatcher, fake_time = make_dispatcher()
+        call = AsyncMock(side_effect=[RetryAfter(5), "ok"])
+
+        [result] = await dispatcher.send_all([1], call)
+
+        assert result.ok and result.value == "ok"
+        assert result.attempts == 2
+        assert fake_time.now >= 5
+
+    async def test_gives_up_after_max_retries(self):
+        dispatcher, _ = make_dispatcher(max_retries=2)
+        call = AsyncMock(side_effect=RetryAfter(1))
+
+        [result] = await dispatcher.send_all([1], call)
+
+        assert not result.ok
+        assert isinstance(result.error, RetryAfter)
+        assert call.await_count == 3
+
+    async def test_global_rate_spaces_out_a_large_fan_out(self):
+        dispatcher, fake_time = make_dispatcher(global_rate=10.0, global_burst=10, max_concurrency=50)
+
+        await dispatcher.send_all(range(30), AsyncMock())
+
+        # A 10-call burst goes out immediately, the other 20 at 10/s.
+        assert fake_time.now == pytest.approx(2.0, abs=0.2)
+
+    async def test_per_chat_interval_spaces_calls_to_the_same_chat(self):
+        dispatcher, fake_time = make_dispatcher(per_chat_interval=1.0)
+
+        await dispatcher.send_all([7, 7, 7], AsyncMock())
+
+        assert fake_time.now == pytest.approx(2.0)
+
+
+async def test_notify_admins_records_only_successful_sends(caplog):
+    handlers = BotHandlers(services={"user": UserService(FakeAPIClient())})
+
+    async def send_message(chat_id, **kwargs):
+        if chat_id == 222:
+            raise Forbidden("bot was blocked by the user")
+        return SimpleNamespace(message_id=chat_id * 10)
+
+    context = SimpleNamespace(bot=SimpleNamespace(send_message=send_message))
+    payload = {"request": {"id": "req1", "amount": 5, "username": "alice"}, "admin_chat_ids": ["111", "222", "333"]}
+
+    with caplog.at_level(logging.ERROR):
+        await handlers._notify_admins_of_request(context, payload)
+
+    assert handlers.recharge_request_notifications["req1"] == [
+        {"chat_id": 111, "message_id": 1110},
+        {"chat_id": 333, "message_id": 3330},
+    ]
+    assert "Failed to notify admin chat_id=222 about recharge request req1" in caplog.text
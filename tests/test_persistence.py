@@ -0,0 +1,162 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from telegram import Update, User
+from telegram.ext import ExtBot
+
+from src import bot_app as bot_app_module
+from src.bot_app import BotApp
+from src.bot_handlers import STOCK_ADJUST_DELTA, STOCK_CHOOSE_ITEM
+from src.persistence import SQLitePersistence
+from src.services import UserService
+from tests.conftest import FakeAPIClient
+from tests.test_bot_app import make_config, use_config
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+async def drain():
+    # let the write task scheduled by update_* run
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+async def test_chat_data_is_stored_without_cached_lists_and_loaded_lazily(tmp_path):
+    path = str(tmp_path / "persistence.sqlite3")
+    persistence = SQLitePersistence(path)
+    await persistence.update_chat_data(42, {
+        "recharge_all_users": [{"username": f"user{i}"} for i in range(1000)],
+        "stock_items": {"1": {"id": 1, "name": "Paper"}},
+        "recharge_target": {"username": "alice"},
+        "stock_delta": 10.0,
+    })
+    await persistence.flush()
+
+    restarted = SQLitePersistence(path)
+    assert await restarted.get_chat_data() == {}
+
+    chat_data = {}
+    await restarted.refresh_chat_data(42, chat_data)
+
+    assert chat_data == {"recharge_target": {"username": "alice"}, "stock_delta": 10.0}
+
+
+async def test_refresh_only_reads_a_chat_once():
+    persistence = SQLitePersistence()
+    await persistence.update_chat_data(42, {"stock_delta": 1.0})
+    await drain()
+
+    chat_data = {"stock_delta": 5.0}
+    await persistence.refresh_chat_data(42, chat_data)
+
+    assert chat_data == {"stock_delta": 5.0}
+
+
+async def test_one_round_of_updates_is_one_transaction():
+    persistence = SQLitePersistence()
+    statements = []
+    persistence._db.set_trace_callback(statements.append)
+
+    await asyncio.gather(
+        persistence.update_chat_data(1, {"stock_delta": 1.0}),
+        persistence.update_chat_data(2, {"stock_delta": 2.0}),
+        persistence.update_conversation("stock", (1, 1), STOCK_ADJUST_DELTA),
+        persistence.update_conversation("stock", (2, 2), STOCK_CHOOSE_ITEM),
+    )
+    await drain()
+
+    assert statements.count("BEGIN") == 1
+    assert await persistence.get_conversations("stock") == {(1, 1): STOCK_ADJUST_DELTA, (2, 2): STOCK_CHOOSE_ITEM}
+
+
+async def test_ended_conversations_and_dropped_chats_are_deleted():
+    persistence = SQLitePersistence()
+    await persistence.update_conversation("stock", (1, 1), STOCK_ADJUST_DELTA)
+    await persistence.update_chat_data(1, {"stock_delta": 1.0})
+    await drain()
+    await persistence.update_conversation("stock", (1, 1), None)
+    await persistence.drop_chat_data(1)
+    await drain()
+
+    assert await persistence.get_conversations("stock") == {}
+    assert persistence._db.execute("SELECT COUNT(*) FROM chat_data").fetchone()[0] == 0
+
+
+async def test_flows_older_than_max_age_do_not_come_back():
+    clock = FakeClock()
+    persistence = SQLitePersistence(max_age=300, clock=clock)
+    await persistence.update_conversation("stock", (1, 1), STOCK_ADJUST_DELTA)
+    await persistence.update_chat_data(1, {"stock_delta": 1.0})
+    await drain()
+    clock.now += 301
+
+    chat_data = {}
+    await persistence.refresh_chat_data(1, chat_data)
+
+    assert await persistence.get_conversations("stock") == {}
+    assert chat_data == {}
+
+
+def make_update(bot, update_id, **fields):
+    base = {"update_id": update_id}
+    base.update(fields)
+    return Update.de_json(base, bot)
+
+
+CHAT = {"id": 4242, "type": "private", "first_name": "Ana"}
+FROM = {"id": 4242, "is_bot": False, "first_name": "Ana"}
+INVENTORY = [{"id": 1, "name": "A4 Paper", "current_stock": 100, "unit": "sheets"}]
+
+
+@pytest.fixture
+def fake_bot_api(monkeypatch):
+    bot_user = User(1, "PrintBuddy", True, username="print_bot")
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = bot_user
+        return bot_user
+
+    monkeypatch.setattr(ExtBot, "get_me", get_me)
+    monkeypatch.setattr(ExtBot, "set_my_commands", AsyncMock(return_value=True))
+    monkeypatch.setattr(ExtBot, "send_message", AsyncMock())
+    monkeypatch.setattr(ExtBot, "answer_callback_query", AsyncMock(return_value=True))
+    edit = AsyncMock()
+    monkeypatch.setattr(ExtBot, "edit_message_text", edit)
+    return edit
+
+
+async def test_stock_flow_resumes_after_a_restart(monkeypatch, tmp_path, fake_bot_api):
+    cfg = make_config(BOT_MODE="polling", PERSISTENCE_PATH=str(tmp_path / "persistence.sqlite3"), API_POOL_WARM=0)
+    use_config(monkeypatch, cfg)
+    client = FakeAPIClient(response=(200, INVENTORY))
+    monkeypatch.setattr(bot_app_module, "create_services", lambda: {"user": UserService(client), "client": client})
+
+    before = BotApp().build()
+    async with before:
+        await before.process_update(make_update(before.bot, 1, message={
+            "message_id": 1, "date": 1700000000, "chat": CHAT, "from": FROM, "text": "/stock",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        }))
+        await before.update_persistence()
+
+    after = BotApp().build()
+    async with after:
+        await after.process_update(make_update(after.bot, 2, callback_query={
+            "id": "cb1", "chat_instance": "ci", "from": FROM, "data": "stock:item:1",
+            "message": {"message_id": 2, "date": 1700000000, "chat": CHAT, "text": "📦 Select an item to adjust:"},
+        }))
+
+    # The item list wasn't persisted; the restored flow re-fetched it and
+    # moved on to the stepper for the chosen item.
+    assert [name for name, *_ in client.calls] == ["get_inventory", "get_inventory"]
+    fake_bot_api.assert_awaited_once()
+    assert "A4 Paper" in fake_bot_api.call_args.kwargs["text"]
@@ -1,6 +1,19 @@
+import asyncio
+
 import pytest
 
-from src.services import UserService, validate_expense_input
+from src.deadline import set_deadline, time_remaining
+from src.services import (
+    InventoryCache,
+    RecentSubmissions,
+    RoleCache,
+    UserDirectoryCache,
+    UserSearchIndex,
+    UserService,
+    parse_bulk_recharge,
+    validate_expense_input,
+)
+from tests.conftest import FakeAPIClient
 
 pytestmark = pytest.mark.asyncio
 
@@ -24,6 +37,17 @@ class TestRecharge:
         assert status == 200
         assert fake_client.calls == [("recharge_user", (1, "alice", 5.50), {})]
 
+    async def test_each_operation_gets_its_own_idempotency_key(self, fake_client):
+        service = UserService(fake_client)
+        await service.recharge(1, "alice", 5)
+        await service.recharge(1, "alice", 5)
+        await service.adjust(1, "alice", 10)
+        await service.create_expense(1, "toner", 3)
+
+        keys = fake_client.idempotency_keys
+        assert len(keys) == 4 and all(keys)
+        assert len(set(keys)) == 4
+
 
 class TestAdjust:
     async def test_rejects_non_numeric_amount(self, fake_client):
@@ -53,6 +77,21 @@ class TestAdjust:
         assert fake_client.calls == [("adjust_balance", (1, "alice", 10.0), {})]
 
 
+class GatedRechargeRequestClient(FakeAPIClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gate = asyncio.Event()
+        self.fail_first = False
+
+    async def create_recharge_request(self, chat_id, username, amount, **kwargs):
+        self.calls.append(("create_recharge_request", (chat_id, username, amount), kwargs))
+        await self.gate.wait()
+        if self.fail_first:
+            self.fail_first = False
+            raise RuntimeError("connection reset")
+        return self.response
+
+
 class TestRequestRecharge:
     async def test_rejects_non_positive_amount(self, fake_client):
         service = UserService(fake_client)
@@ -67,6 +106,75 @@ class TestRequestRecharge:
         assert len(fake_client.calls) == 1
         assert fake_client.calls[0][0] == "create_recharge_request"
 
+    async def test_repeat_within_window_is_a_duplicate(self):
+        client = FakeAPIClient(response=(201, {"id": "r1"}))
+        clock = FakeClock()
+        service = UserService(client, recent_requests=RecentSubmissions(window=60.0, clock=clock))
+
+        assert (await service.request_recharge(1, "alice", "5"))[0] == 201
+        assert (await service.request_recharge(1, "Alice", "5.00"))[0] == 409
+        assert (await service.request_recharge(1, "alice", "6"))[0] == 201
+        assert (await service.request_recharge(2, "alice", "5"))[0] == 201
+        clock.now += 60
+        assert (await service.request_recharge(1, "alice", "5"))[0] == 201
+
+        assert len(client.calls) == 4
+
+    async def test_resend_after_failure_reuses_the_idempotency_key(self):
+        client = FakeAPIClient(response=(503, {"detail": "Could not reach the server."}))
+        service = UserService(client, recent_requests=RecentSubmissions(clock=FakeClock()))
+
+        await service.request_recharge(1, "alice", "5")
+        client.response = (201, {"id": "r1"})
+        await service.request_recharge(1, "alice", "5")
+        await service.request_recharge(1, "alice", "7")
+
+        keys = [kwargs["idempotency_key"] for _, _, kwargs in client.calls]
+        assert keys[0] == keys[1]
+        assert keys[2] != keys[0]
+
+    async def test_concurrent_double_tap_sends_once(self):
+        client = FakeAPIClient(response=(201, {"id": "r1"}))
+        service = UserService(client, recent_requests=RecentSubmissions(clock=FakeClock()))
+
+        results = await asyncio.gather(*(service.request_recharge(1, "alice", "5") for _ in range(2)))
+
+        assert sorted(status for status, _ in results) == [201, 409]
+        assert len(client.calls) == 1
+
+    async def test_first_caller_going_away_does_not_cancel_the_request(self):
+        client = GatedRechargeRequestClient(response=(201, {"id": "r1"}))
+        service = UserService(client, recent_requests=RecentSubmissions(clock=FakeClock()))
+
+        first = asyncio.ensure_future(service.request_recharge(1, "alice", "5"))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(service.request_recharge(1, "alice", "5"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        client.gate.set()
+
+        assert (await second)[0] == 409
+        assert first.cancelled()
+        assert len(client.calls) == 1
+
+    async def test_waiter_resubmits_when_the_first_attempt_raises(self):
+        client = GatedRechargeRequestClient(response=(201, {"id": "r1"}))
+        client.fail_first = True
+        service = UserService(client, recent_requests=RecentSubmissions(clock=FakeClock()))
+
+        first = asyncio.ensure_future(service.request_recharge(1, "alice", "5"))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(service.request_recharge(1, "alice", "5"))
+        await asyncio.sleep(0)
+        client.gate.set()
+
+        with pytest.raises(RuntimeError):
+            await first
+        assert (await second)[0] == 201
+        keys = [kwargs["idempotency_key"] for _, _, kwargs in client.calls]
+        assert len(keys) == 2 and keys[0] == keys[1]
+
 
 class TestAdjustStock:
     async def test_rejects_non_numeric_delta(self, fake_client):
@@ -136,3 +244,396 @@ class TestCreateExpense:
         status, res = await service.create_expense(1, "Toner", "15.5", "cartridge")
         assert status == 200
         assert fake_client.calls == [("create_expense", (1, "toner", 15.5, "cartridge"), {})]
+
+
+class TestParseBulkRecharge:
+    async def test_accepts_csv_with_header_and_pasted_separators(self):
+        rows, errors = parse_bulk_recharge("username,amount\nalice,10\n\nbob; 5.5\ncarol\t2\ndave 1")
+        assert errors == []
+        assert rows == [("alice", 10.0), ("bob", 5.5), ("carol", 2.0), ("dave", 1.0)]
+
+    async def test_reports_every_bad_row_with_its_line(self):
+        rows, errors = parse_bulk_recharge("alice,10\nbob,abc\ncarol,0\nalice,3\njust-a-name")
+        assert errors == [
+            "Line 2 (bob): Amount must be a number",
+            "Line 3 (carol): Amount must be positive",
+            "Line 4 (alice): duplicate of line 1",
+            "Line 5: expected `username,amount`",
+        ]
+
+    async def test_caps_row_count(self):
+        rows, errors = parse_bulk_recharge("\n".join(f"user{i},1" for i in range(501)))
+        assert len(errors) == 1
+        assert "At most 500 rows" in errors[0]
+
+
+class TestRechargeMany:
+    async def test_runs_rows_concurrently_up_to_the_limit(self):
+        in_flight, peak = 0, 0
+
+        class SlowClient(FakeAPIClient):
+            async def recharge_user(self, chat_id, username, amount, idempotency_key=None):
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+                return (404, {"detail": "User not found"}) if username == "ghost" else (200, {})
+
+        service = UserService(SlowClient())
+        rows = [(f"user{i}", 1.0) for i in range(20)] + [("ghost", 2.0)]
+
+        results = await service.recharge_many(1, rows)
+
+        assert peak == UserService.BULK_RECHARGE_CONCURRENCY
+        assert [username for username, *_ in results] == [username for username, _ in rows]
+        assert results[-1] == ("ghost", 2.0, 404, {"detail": "User not found"})
+
+    async def test_stops_sending_once_the_caller_is_refused(self):
+        client = FakeAPIClient(response=(403, {"detail": "Forbidden"}))
+        service = UserService(client)
+        rows = [(f"user{i}", 1.0) for i in range(50)]
+
+        results = await service.recharge_many(1, rows)
+
+        # Only rows already in flight when the first 403 came back were sent.
+        assert 1 <= len(client.calls) <= UserService.BULK_RECHARGE_CONCURRENCY
+        assert len(results) == 50
+        assert all(status == 403 for _, _, status, _ in results)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+USERS = [{"username": "alice", "name": "Alice", "surname": "P", "balance": 5.0}]
+
+
+def make_cached_service(response=(200, USERS), ttl=60.0, stale_ttl=300.0):
+    client = FakeAPIClient(response=response)
+    clock = FakeClock()
+    cache = UserDirectoryCache(ttl=ttl, stale_ttl=stale_ttl, clock=clock)
+    return UserService(client, user_directory=cache), client, clock
+
+
+def get_users_calls(client):
+    return [call for call in client.calls if call[0] == "get_users"]
+
+
+class TestUserDirectoryCache:
+    async def test_repeat_reads_within_ttl_hit_backend_once(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        clock.now += 30
+        status, res = await service.list_users(1)
+        assert status == 200
+        assert res == USERS
+        assert len(get_users_calls(client)) == 1
+
+    async def test_second_admin_is_served_after_their_own_first_check(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        await service.list_users(2)
+        await service.list_users(2)
+        await service.list_users(1)
+        assert get_users_calls(client) == [("get_users", (1,), {}), ("get_users", (2,), {})]
+
+    async def test_admin_check_expires_after_stale_window(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        clock.now += 361
+        await service.list_users(1)
+        assert len(get_users_calls(client)) == 2
+
+    async def test_forbidden_response_is_not_cached(self):
+        service, client, clock = make_cached_service(response=(403, {"detail": "nope"}))
+        status, _ = await service.list_users(1)
+        assert status == 403
+        status, _ = await service.list_users(1)
+        assert status == 403
+        assert len(get_users_calls(client)) == 2
+
+    async def test_access_is_reconfirmed_after_the_ttl(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        clock.now += 61
+        client.response = (200, USERS + [{"username": "bruno"}])
+
+        # Past the TTL the chat's own access has lapsed: no stale copy, it
+        # waits for its own fetch.
+        status, res = await service.list_users(1)
+        assert len(res) == 2
+        assert len(get_users_calls(client)) == 2
+
+    async def test_refused_admin_call_stops_serving_the_shared_lists(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        await service.list_inventory(1)
+
+        client.response = (403, {"detail": "Forbidden"})
+        await service.recharge(1, "alice", 5)
+        users_status, _ = await service.list_users(1)
+        inventory_status, _ = await service.list_inventory(1)
+
+        assert (users_status, inventory_status) == (403, 403)
+        assert len(get_users_calls(client)) == 2
+
+    async def test_concurrent_expired_reads_share_one_fetch(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        await service.list_users(2)
+        client.calls.clear()
+        service.user_directory.invalidate()
+
+        release = asyncio.Event()
+        original = client.get_users
+
+        async def slow_get_users(chat_id):
+            await release.wait()
+            return await original(chat_id)
+
+        client.get_users = slow_get_users
+        pending = asyncio.gather(service.list_users(1), service.list_users(1), service.list_users(2))
+        await asyncio.sleep(0)
+        release.set()
+        results = await pending
+
+        assert [status for status, _ in results] == [200, 200, 200]
+        assert len(get_users_calls(client)) == 1
+
+    async def test_shared_fetch_outlives_a_hurried_callers_deadline(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        await service.list_users(2)
+        service.user_directory.invalidate()
+
+        release = asyncio.Event()
+        original = client.get_users
+        remaining = []
+
+        async def slow_get_users(chat_id):
+            remaining.append(time_remaining())
+            await release.wait()
+            return await original(chat_id)
+
+        client.get_users = slow_get_users
+
+        async def list_users(chat_id, deadline):
+            set_deadline(deadline)
+            return await service.list_users(chat_id)
+
+        hurried = asyncio.ensure_future(list_users(1, 0.05))
+        await asyncio.sleep(0)
+        patient = asyncio.ensure_future(list_users(2, 5.0))
+
+        assert (await hurried)[0] == 504
+        release.set()
+        assert await patient == (200, USERS)
+        assert remaining == [None]
+        assert len(get_users_calls(client)) == 3
+
+    async def test_successful_recharge_patches_the_cached_balance(self):
+        service, client, clock = make_cached_service()
+        _, before = await service.list_users(1)
+        index = service.user_directory.search_index(before)
+        client.response = (200, {})
+        await service.recharge(1, "alice", "5")
+        _, after = await service.list_users(1)
+
+        assert after[0]["balance"] == 10.0
+        assert before[0]["balance"] == 5.0
+        assert len(get_users_calls(client)) == 1
+        # Names didn't change, so the index carries over rather than being rebuilt.
+        patched = service.user_directory.search_index(after)
+        assert patched.users is after and patched._haystacks is index._haystacks
+        assert patched.search("ali") == after
+
+    async def test_adjust_takes_the_balance_from_the_response(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        client.response = (200, {"username": "alice", "name": "Alice", "balance": 2.5})
+        await service.adjust(1, "alice", "2")
+        _, users = await service.list_users(1)
+
+        assert users[0]["balance"] == 2.5
+        assert len(get_users_calls(client)) == 1
+
+    async def test_recharge_of_an_uncached_user_refetches(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        client.response = (200, {})
+        await service.recharge(1, "bruno", "5")
+        client.response = (200, USERS)
+        await service.list_users(1)
+        assert len(get_users_calls(client)) == 2
+
+    async def test_failed_adjust_keeps_cache(self):
+        service, client, clock = make_cached_service()
+        await service.list_users(1)
+        client.response = (404, {"detail": "not found"})
+        await service.adjust(1, "ghost", "5")
+        client.response = (200, USERS)
+        await service.list_users(1)
+        assert len(get_users_calls(client)) == 1
+
+    async def test_authorized_chats_are_bounded(self):
+        client = FakeAPIClient(response=(200, USERS))
+        cache = UserDirectoryCache(max_chats=2, clock=FakeClock())
+        service = UserService(client, user_directory=cache)
+        for chat_id in (1, 2, 3):
+            await service.list_users(chat_id)
+        assert list(cache._authorized) == [2, 3]
+
+
+DIRECTORY = [
+    {"username": "anap", "name": "Ana", "surname": "Pérez"},
+    {"username": "ana", "name": "Ana", "surname": "Soto"},
+    {"username": "mariana", "name": "Mariana", "surname": "Díaz"},
+    {"username": "jose_m", "name": "José", "surname": "Muñoz"},
+    {"username": "bruno", "name": "Bruno", "surname": "Ana"},
+]
+
+
+def make_inventory():
+    return [
+        {"id": 1, "name": "A4 Paper", "current_stock": 100.0, "unit": "sheets", "is_low_stock": False},
+        {"id": 2, "name": "Toner", "current_stock": 1.0, "unit": "pcs", "is_low_stock": True},
+    ]
+
+
+class TestInventoryCache:
+    def make_service(self):
+        client = FakeAPIClient(response=(200, make_inventory()))
+        cache = InventoryCache(ttl=60.0, stale_ttl=0.0, clock=FakeClock())
+        return UserService(client, inventory=cache), client, cache
+
+    async def test_admins_share_one_fetch_and_derived_views(self):
+        service, client, cache = self.make_service()
+        _, first = await service.list_inventory(1)
+        _, second = await service.list_inventory(1)
+
+        assert first is second
+        assert len(client.calls) == 1
+        assert cache.by_id(first) is cache.by_id(second)
+        assert [item["name"] for item in cache.low_stock(first)] == ["Toner"]
+
+    async def test_adjustment_updates_a_copy_of_the_cached_item(self):
+        service, client, cache = self.make_service()
+        _, items = await service.list_inventory(1)
+        by_id = cache.by_id(items)
+        generation = cache.generation
+
+        client.response = (200, {"name": "Toner", "current_stock": 11.0, "unit": "pcs", "is_low_stock": False})
+        await service.adjust_stock(1, "Toner", 10)
+        client.response = (200, make_inventory())
+        _, after = await service.list_inventory(1)
+
+        # The fetched list may be the API client's cached body; it stays as
+        # the server sent it.
+        assert items[1]["current_stock"] == 1.0
+        assert after is not items and after[0] is items[0]
+        assert after[1]["current_stock"] == 11.0
+        assert cache.generation == generation + 1
+        assert cache.low_stock(after) == []
+        assert cache.by_id(after) is not by_id
+        assert [name for name, *_ in client.calls] == ["get_inventory", "adjust_stock"]
+
+    async def test_not_modified_refresh_keeps_derived_views(self):
+        service, client, cache = self.make_service()
+        _, items = await service.list_inventory(1)
+        by_id = cache.by_id(items)
+        generation = cache.generation
+
+        # What APIClient returns on a 304: the same parsed list as before.
+        client.response = (200, items)
+        cache._clock.now += 61
+        await service.list_inventory(1)
+
+        assert len(client.calls) == 2
+        assert cache.generation == generation
+        assert cache.by_id(items) is by_id
+
+    async def test_adjustment_of_unknown_item_drops_the_list(self):
+        service, client, cache = self.make_service()
+        await service.list_inventory(1)
+
+        client.response = (200, {"name": "Staples", "current_stock": 5.0})
+        await service.adjust_stock(1, "Staples", 5)
+        client.response = (200, make_inventory())
+        await service.list_inventory(1)
+
+        assert [name for name, *_ in client.calls] == ["get_inventory", "adjust_stock", "get_inventory"]
+
+
+class TestRoleCache:
+    async def test_start_reuses_the_role_until_ttl(self):
+        client = FakeAPIClient(response=(200, {"name": "Ana"}))
+        clock = FakeClock()
+        service = UserService(client, roles=RoleCache(ttl=300.0, clock=clock))
+
+        assert await service.get_me(1) == (200, {"name": "Ana"})
+        assert await service.get_me(1) == (200, {"name": "Ana"})
+        clock.now += 300
+        await service.get_me(1)
+
+        assert [name for name, *_ in client.calls] == ["get_me", "get_me"]
+
+    async def test_refused_admin_call_drops_the_role(self):
+        client = FakeAPIClient(response=(200, {"name": "Ana"}))
+        service = UserService(client, roles=RoleCache(clock=FakeClock()))
+        await service.get_me(1)
+
+        client.response = (403, {"detail": "Forbidden"})
+        await service.get_user(1, "bob")
+        status, _ = await service.get_me(1)
+
+        assert status == 403
+        assert [name for name, *_ in client.calls] == ["get_me", "get_user", "get_me"]
+
+    async def test_errors_are_not_cached(self):
+        client = FakeAPIClient(response=(500, {"detail": "boom"}))
+        service = UserService(client, roles=RoleCache(clock=FakeClock()))
+        await service.get_me(1)
+        await service.get_me(1)
+
+        assert len(client.calls) == 2
+
+
+class TestUserSearchIndex:
+    async def test_ranks_exact_then_prefix_then_substring(self):
+        index = UserSearchIndex(DIRECTORY)
+        usernames = [u["username"] for u in index.search("ana")]
+        assert usernames[0] == "ana"
+        assert set(usernames[1:3]) == {"anap", "bruno"}
+        assert usernames[3] == "mariana"
+
+    async def test_folds_accents_and_case(self):
+        index = UserSearchIndex(DIRECTORY)
+        assert [u["username"] for u in index.search("JOSE")] == ["jose_m"]
+        assert [u["username"] for u in index.search("munoz")] == ["jose_m"]
+        assert [u["username"] for u in index.search("pérez")] == ["anap"]
+
+    async def test_matches_across_name_and_surname(self):
+        index = UserSearchIndex(DIRECTORY)
+        assert [u["username"] for u in index.search("ana soto")] == ["ana"]
+
+    async def test_incremental_typing_matches_a_fresh_search(self):
+        typed = UserSearchIndex(DIRECTORY)
+        for query in ("ma", "mar", "mari", "marian"):
+            typed.search(query)
+        fresh = UserSearchIndex(DIRECTORY)
+        assert typed.search("mariana") == fresh.search("mariana")
+        assert typed.search("marx") == []
+
+    async def test_skips_ranking_above_rank_limit(self):
+        index = UserSearchIndex(DIRECTORY)
+        assert [u["username"] for u in index.search("an", rank_limit=2)] == ["anap", "ana", "mariana", "bruno"]
+
+    async def test_cache_reuses_index_for_the_same_list(self):
+        cache = UserDirectoryCache()
+        assert cache.search_index(DIRECTORY) is cache.search_index(DIRECTORY)
+        assert cache.search_index(list(DIRECTORY)) is not cache.search_index(DIRECTORY)
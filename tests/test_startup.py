@@ -0,0 +1,141 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src import bot_app as bot_app_module
+from src.bot_app import BotApp
+from src.startup_profile import breakdown_by_package, format_report, parse_importtime
+from tests.test_bot_app import make_config, use_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold start (imports + BotApp() + build()) measures ~0.5s locally; the
+# budget leaves room for slow CI runners while still catching an eager
+# import or blocking init sneaking back in.
+STARTUP_BUDGET_SECONDS = 3.0
+
+IMPORTTIME_SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:      3000 |       3120 |   telegram._bot
+import time:       500 |       3620 | telegram
+import time:       800 |        800 |   src.config
+import time:       200 |       1000 | src.main
+"""
+
+
+def run_python(code, **env):
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+def test_parse_importtime_reads_rows_and_depth():
+    timings = parse_importtime(IMPORTTIME_SAMPLE)
+
+    assert [(t.module, t.self_us, t.depth) for t in timings] == [
+        ("_io", 120, 2), ("telegram._bot", 3000, 1), ("telegram", 500, 0), ("src.config", 800, 1), ("src.main", 200, 0),
+    ]
+    assert breakdown_by_package(timings) == {"telegram": 3500, "src": 1000, "(stdlib/other)": 120}
+
+
+def test_report_includes_breakdown_and_init_steps():
+    report = format_report(parse_importtime(IMPORTTIME_SAMPLE), {"BotApp()": 12.5, "error": "ValueError: nope"})
+
+    assert "telegram" in report and "3.5 ms" in report
+    assert "BotApp()" in report and "12.5 ms" in report
+    assert "error: ValueError: nope" in report
+
+
+def test_cold_start_fits_the_budget():
+    result = run_python(
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import src.main\n"
+        "from src.bot_app import BotApp\n"
+        "BotApp().build()\n"
+        "print(json.dumps({'elapsed': time.perf_counter() - start, 'persistence': 'src.persistence' in sys.modules}))\n",
+        TELEGRAM_TOKEN="123:abc", TELEGRAM_SECRET="secret", PERSISTENCE_PATH="", NOTIFICATION_STORE_PATH=":memory:",
+    )
+    assert result.returncode == 0, result.stderr
+
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    assert measured["elapsed"] < STARTUP_BUDGET_SECONDS
+    # Persistence is switched off here, so it must not have been imported.
+    assert measured["persistence"] is False
+
+
+def test_default_config_skips_the_optional_subsystems(tmp_path):
+    # Persistence is on by default (and the notification store needs
+    # sqlite3 regardless); low-stock alerts and the metrics endpoint are
+    # off unless configured, and must stay unloaded / unstarted.
+    result = run_python(
+        "import asyncio, json, sys\n"
+        "from src.bot_app import BotApp\n"
+        "bot_app = BotApp(post_init=lambda app: asyncio.sleep(0))\n"
+        "asyncio.run(bot_app._post_init(bot_app.build()))\n"
+        "print(json.dumps({\n"
+        "    'persistence': 'src.persistence' in sys.modules,\n"
+        "    'low_stock': 'src.low_stock' in sys.modules,\n"
+        "    'metrics_server': bot_app.metrics_server is not None,\n"
+        "}))\n",
+        TELEGRAM_TOKEN="123:abc", TELEGRAM_SECRET="secret", ADMIN_CHAT_ID="", LOW_STOCK_ALERT_CHAT_IDS="", METRICS_PORT="",
+        PERSISTENCE_PATH=str(tmp_path / "persistence.sqlite3"), NOTIFICATION_STORE_PATH=":memory:",
+    )
+    assert result.returncode == 0, result.stderr
+
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == {"persistence": True, "low_stock": False, "metrics_server": False}
+
+
+def test_init_profiling_leaves_no_store_files_behind(tmp_path):
+    env = {**os.environ, "PYTHONPATH": ROOT, "TELEGRAM_TOKEN": "123:abc", "TELEGRAM_SECRET": "secret"}
+    for name in ("PERSISTENCE_PATH", "NOTIFICATION_STORE_PATH"):
+        env.pop(name, None)
+    result = subprocess.run(
+        [sys.executable, "-c", "import json\nfrom src.startup_profile import measure_init\nprint(json.dumps(measure_init()))\n"],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+
+    steps = json.loads(result.stdout.strip().splitlines()[-1])
+    assert "error" not in steps and "BotApp()" in steps
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_invalid_config_exits_before_loading_telegram():
+    result = run_python(
+        "import sys\n"
+        "from src import main\n"
+        "try:\n"
+        "    main.main([])\n"
+        "except SystemExit as e:\n"
+        "    print(e.code, 'telegram.ext' in sys.modules)\n",
+        TELEGRAM_TOKEN="", TELEGRAM_SECRET="",
+    )
+
+    assert result.stdout.strip().splitlines()[-1] == "1 False"
+
+
+def test_missing_token_fails_before_services_are_built(monkeypatch):
+    use_config(monkeypatch, make_config(TELEGRAM_TOKEN=""))
+
+    def fail():
+        raise AssertionError("services built before the token check")
+
+    monkeypatch.setattr(bot_app_module, "create_services", fail)
+
+    with pytest.raises(ValueError, match="TELEGRAM_TOKEN is required"):
+        BotApp()
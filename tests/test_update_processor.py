@@ -0,0 +1,147 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.deadline import time_remaining
+from src.update_processor import FairUpdateProcessor
+from src.utilities import safe_handler
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_update(update_id, chat_id):
+    return SimpleNamespace(update_id=update_id, effective_chat=SimpleNamespace(id=chat_id))
+
+
+class Recorder:
+    def __init__(self):
+        self.log = []
+        self.running = 0
+        self.peak = 0
+        self.gates: dict = {}
+
+    async def handle(self, name, chat_id):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.log.append(("start", name))
+        gate = self.gates.get(name)
+        if gate is not None:
+            await gate.wait()
+        await asyncio.sleep(0)
+        self.log.append(("end", name))
+        self.running -= 1
+
+
+async def test_updates_from_one_chat_run_one_at_a_time_in_order():
+    processor = FairUpdateProcessor(concurrency=8, chat_rate=0)
+    recorder = Recorder()
+
+    await asyncio.gather(*(
+        processor.process_update(make_update(i, 1), recorder.handle(f"a{i}", 1)) for i in range(4)
+    ))
+
+    assert recorder.peak == 1
+    assert recorder.log == [(edge, f"a{i}") for i in range(4) for edge in ("start", "end")]
+
+
+async def test_free_slots_go_round_robin_across_chats():
+    processor = FairUpdateProcessor(concurrency=1, chat_rate=0)
+    recorder = Recorder()
+
+    updates = [("a0", 1), ("a1", 1), ("a2", 1), ("b0", 2), ("c0", 3)]
+    await asyncio.gather(*(
+        processor.process_update(make_update(i, chat_id), recorder.handle(name, chat_id))
+        for i, (name, chat_id) in enumerate(updates)
+    ))
+
+    started = [name for edge, name in recorder.log if edge == "start"]
+    assert started == ["a0", "b0", "c0", "a1", "a2"]
+    assert recorder.peak == 1
+
+
+async def test_global_cap_bounds_handlers_across_chats():
+    processor = FairUpdateProcessor(concurrency=3, chat_rate=0)
+    recorder = Recorder()
+
+    await asyncio.gather(*(
+        processor.process_update(make_update(i, i), recorder.handle(f"u{i}", i)) for i in range(10)
+    ))
+
+    assert recorder.peak == 3
+    assert processor.stats() == {"running": 0, "queued": 0, "chats_waiting": 0, "dropped": 0}
+
+
+async def test_chat_over_its_rate_waits_for_tokens():
+    processor = FairUpdateProcessor(concurrency=8, chat_rate=50, chat_burst=1)
+    recorder = Recorder()
+
+    start = time.monotonic()
+    await asyncio.gather(*(
+        processor.process_update(make_update(i, 1), recorder.handle(f"a{i}", 1)) for i in range(3)
+    ))
+
+    # burst of 1, then one token every 20ms
+    assert time.monotonic() - start >= 0.035
+
+
+async def test_backlog_past_the_limit_is_dropped():
+    processor = FairUpdateProcessor(concurrency=1, chat_rate=0, max_chat_queue=2)
+    recorder = Recorder()
+    recorder.gates["a0"] = gate = asyncio.Event()
+
+    first = asyncio.ensure_future(processor.process_update(make_update(0, 1), recorder.handle("a0", 1)))
+    await asyncio.sleep(0)
+    waiting = [
+        asyncio.ensure_future(processor.process_update(make_update(i, 1), recorder.handle(f"a{i}", 1))) for i in (1, 2)
+    ]
+    await asyncio.sleep(0)
+    assert processor.stats()["queued"] == 2
+
+    await processor.process_update(make_update(3, 1), recorder.handle("a3", 1))
+    gate.set()
+    await asyncio.gather(first, *waiting)
+
+    assert processor.dropped == 1
+    assert [name for edge, name in recorder.log if edge == "start"] == ["a0", "a1", "a2"]
+
+
+async def test_cancelled_waiter_gives_up_its_place():
+    processor = FairUpdateProcessor(concurrency=1, chat_rate=0)
+    recorder = Recorder()
+    recorder.gates["a0"] = gate = asyncio.Event()
+
+    first = asyncio.ensure_future(processor.process_update(make_update(0, 1), recorder.handle("a0", 1)))
+    await asyncio.sleep(0)
+    doomed = asyncio.ensure_future(processor.process_update(make_update(1, 2), recorder.handle("b0", 2)))
+    later = asyncio.ensure_future(processor.process_update(make_update(2, 3), recorder.handle("c0", 3)))
+    await asyncio.sleep(0)
+    doomed.cancel()
+    gate.set()
+    await asyncio.gather(first, later)
+
+    assert [name for edge, name in recorder.log if edge == "start"] == ["a0", "c0"]
+    assert processor.running == 0
+
+
+async def test_deadline_counts_the_time_spent_queued():
+    processor = FairUpdateProcessor(concurrency=1, chat_rate=0)
+    gate = asyncio.Event()
+    remaining = []
+
+    @safe_handler.with_deadline(10)
+    async def handler(update, context):
+        if update.update_id == 0:
+            await gate.wait()
+        remaining.append(time_remaining())
+
+    first = asyncio.ensure_future(processor.process_update(make_update(0, 1), handler(make_update(0, 1), None)))
+    second = asyncio.ensure_future(processor.process_update(make_update(1, 2), handler(make_update(1, 2), None)))
+    await asyncio.sleep(0.2)
+    gate.set()
+    await asyncio.gather(first, second)
+
+    # The second update waited ~0.2s for the slot before its handler ran.
+    assert remaining[1] < 9.85
+    assert time_remaining() is None